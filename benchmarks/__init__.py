@@ -0,0 +1 @@
+"""Benchmarks for the CLI (python3 -m benchmarks)."""
@@ -0,0 +1,269 @@
+"""Benchmarks and regression checks for the CLI's own hot paths.
+
+    python3 -m benchmarks                  # run, check budgets and baseline
+    python3 -m benchmarks --save-baseline  # record this machine's baseline
+    python3 -m benchmarks --only status,tune --runs 3
+
+Commands run end to end (`python3 -m cli ...`, as ./masuite does) in a
+throwaway install, against a fake `docker` on PATH (fake_docker.py) and a
+fake Keycloak (fake_keycloak.py), both answering with realistic delays
+and output sizes. For each command:
+
+- wall time: median of --runs runs, after one warm-up run;
+- docker calls: docker invocations of one run, from the fake's log;
+- import time: total of `-X importtime` over all imported modules.
+
+Hot functions (registry loading, .env building and parsing, Caddyfile
+generation, compose model loading) are timed in-process.
+
+The run fails when a command makes more docker calls or spends more time
+importing than budgets.json allows, or when any timing regresses by more
+than the threshold against the saved baseline (benchmarks/.baseline.json,
+machine-specific and not committed).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from .fake_keycloak import FakeKeycloak
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BUDGETS = os.path.join(HERE, "budgets.json")
+BASELINE = os.path.join(HERE, ".baseline.json")
+APPS = "docs,drive,meet"
+
+
+def _wizard_answer(prompt):
+    """Default answer to every question, but re-run on an existing install and don't start the stack."""
+    if "Overwrite?" in prompt:
+        return "y"
+    return "n" if "Start MaSuite now" in prompt else ""
+
+
+# name: (argv, answer(prompt) for interactive commands)
+COMMANDS = {
+    "help": (["--help"], None),
+    "setup": (["setup", "--mode", "local", "--apps", APPS], _wizard_answer),
+    "status": (["status"], None),
+    "tune": (["tune", "--dry-run"], None),
+    "logs": (["logs", "--app", "docs", "--level", "error"], None),
+    "user-list": (["user", "list"], None),
+    "traffic": (["traffic"], None),
+}
+
+
+class Fixture:
+    """A throwaway install: the repository's code and service definitions, its own config and state."""
+
+    def __init__(self, latency_scale):
+        self.root = tempfile.mkdtemp(prefix="masuite-bench-")
+        for name in ("cli", "services", "docker-compose.yml", "versions.env"):
+            os.symlink(os.path.join(ROOT, name), os.path.join(self.root, name))
+        shutil.copytree(os.path.join(ROOT, "config"), os.path.join(self.root, "config"))
+        self.docker_log = os.path.join(self.root, "docker-calls.log")
+        self.env = {
+            # A typical server, whatever the caller's bytecode settings
+            **{k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"},
+            "PATH": os.path.join(HERE, "fakes") + os.pathsep + os.environ.get("PATH", ""),
+            "FAKE_DOCKER_LOG": self.docker_log,
+            "FAKE_DOCKER_LATENCY_SCALE": str(latency_scale),
+            # Bytecode of this install only, as ./masuite keeps it in .masuite/
+            "PYTHONPYCACHEPREFIX": os.path.join(self.root, ".masuite", "pycache"),
+        }
+
+    def run(self, argv, answer=None, importtime=False):
+        """Run a CLI command, answering its prompts with `answer`. Returns (seconds, docker calls, stderr)."""
+        open(self.docker_log, "w").close()
+        cmd = [sys.executable, *(["-X", "importtime"] if importtime else []), "-m", "cli", *argv]
+        with tempfile.TemporaryFile("w+") as stderr:
+            started = time.perf_counter()
+            proc = subprocess.Popen(cmd, cwd=self.root, env=self.env, stdin=subprocess.PIPE,
+                                    stdout=subprocess.PIPE, stderr=stderr)
+            _converse(proc, answer)
+            returncode = proc.wait()
+            elapsed = time.perf_counter() - started
+            stderr.seek(0)
+            errors = stderr.read()
+        if returncode not in (0, 1):
+            raise RuntimeError(f"{' '.join(argv)} exited with {returncode}:\n{errors[-2000:]}")
+        with open(self.docker_log) as f:
+            calls = sum(1 for _ in f)
+        return elapsed, calls, errors
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _converse(proc, answer):
+    """Read the command's output, answering each `input()` prompt (output ending in ": ")."""
+    if not answer:
+        proc.stdin.close()
+    tail = b""
+    while True:
+        chunk = os.read(proc.stdout.fileno(), 65536)
+        if not chunk:
+            break
+        tail = (tail + chunk)[-400:]
+        if answer and tail.endswith(b": "):
+            reply = answer(tail.decode(errors="replace").splitlines()[-1])
+            proc.stdin.write(reply.encode() + b"\n")
+            proc.stdin.flush()
+            tail = b""
+    proc.stdout.close()
+    if answer:
+        proc.stdin.close()
+
+
+def import_ms(stderr):
+    """Total import time from `-X importtime` output, in milliseconds."""
+    total = 0
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            self_us = line.split(":", 1)[1].split("|")[0].strip()
+            if self_us.isdigit():
+                total += int(self_us)
+    return total / 1000
+
+
+def bench_commands(fixture, names, runs):
+    results = {}
+    for name in names:
+        argv, answer = COMMANDS[name]
+        fixture.run(argv, answer)  # warm-up: bytecode, compose and registry caches, state files
+        times = []
+        for _ in range(runs):
+            elapsed, calls, _ = fixture.run(argv, answer)
+            times.append(elapsed)
+        imports = [import_ms(fixture.run(argv, answer, importtime=True)[2]) for _ in range(runs)]
+        results[name] = {
+            "wall_ms": round(1000 * statistics.median(times), 1),
+            "docker_calls": calls,
+            "import_ms": round(statistics.median(imports), 1),
+        }
+        print(f"  {name:<12} {results[name]['wall_ms']:>9.1f} {calls:>7} {results[name]['import_ms']:>10.1f}",
+              flush=True)
+    return results
+
+
+def bench_functions(fixture):
+    """Time hot functions in-process: {name: microseconds per call}."""
+    sys.path.insert(0, fixture.root)
+    from cli import compose, env, registry, setup_wizard
+
+    # What the wizard collects with every question answered by default
+    config = {
+        "root_dir": fixture.root, "mode": "local", "domain": "localhost",
+        "enabled_apps": set(APPS.split(",")), "host": {"ram_mb": 16384, "cpus": 8},
+        "drive_editor": "collabora", "pgbouncer": True, "keycloak_admin_password": "benchmark",
+    }
+    cases = {
+        "load_service_registry": lambda: registry.load(fixture.root),
+        "load_cached_registry": lambda: registry.load_cached(fixture.root),
+        "build_env": lambda: setup_wizard.build_env(config),
+        "generate_caddyfile": lambda: setup_wizard.generate_caddyfile(config),
+        "load_env": lambda: env.load_env(fixture.root),
+        "compose_load": lambda: (compose._models.clear(), compose.load(fixture.root)),
+    }
+    results = {}
+    for name, fn in cases.items():
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=5, number=number)) / number
+        results[name] = round(best * 1e6, 1)
+        print(f"  {name:<24} {results[name]:>10.1f} us", flush=True)
+    return results
+
+
+def check(results, budgets, baseline, threshold):
+    """Failures against the budgets and the baseline."""
+    failures = []
+    for name, stats in results["commands"].items():
+        budget = budgets.get("commands", {}).get(name, {})
+        for key in ("docker_calls", "import_ms"):
+            if key in budget and stats[key] > budget[key]:
+                failures.append(f"{name}: {key} {stats[key]} over budget {budget[key]}")
+    if baseline:
+        pairs = [(f"{name} {key}", stats[key], baseline.get("commands", {}).get(name, {}).get(key))
+                 for name, stats in results["commands"].items() for key in ("wall_ms", "import_ms")]
+        pairs += [(name, us, baseline.get("functions", {}).get(name)) for name, us in results["functions"].items()]
+        for label, value, before in pairs:
+            if before and value > before * (1 + threshold):
+                failures.append(f"{label}: {value} vs baseline {before} (+{value / before - 1:.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--only", help=f"Comma-separated commands ({', '.join(COMMANDS)})")
+    parser.add_argument("--runs", type=int, default=5, help="Measured runs per command (default: 5)")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiplier of the fake docker delays (default: 1, realistic)")
+    parser.add_argument("--threshold", type=float, help="Allowed regression against the baseline (default: budgets.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as this machine's baseline")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(COMMANDS)
+    unknown = [n for n in names if n not in COMMANDS]
+    if unknown:
+        parser.error(f"unknown command: {', '.join(unknown)}")
+    with open(BUDGETS) as f:
+        budgets = json.load(f)
+    threshold = args.threshold if args.threshold is not None else budgets.get("threshold", 0.25)
+
+    keycloak = FakeKeycloak().start()
+    fixture = Fixture(args.latency_scale)
+    try:
+        # Setup first: the other commands need its .env
+        fixture.run(*COMMANDS["setup"])
+        cache = os.path.join(fixture.root, ".masuite", "cache")
+        os.makedirs(cache, exist_ok=True)
+        with open(os.path.join(cache, "keycloak.json"), "w") as f:
+            json.dump({"url": keycloak.url, "discovered_at": int(time.time())}, f)
+
+        print(f"  {'Command':<12} {'Wall ms':>9} {'Docker':>7} {'Import ms':>10}")
+        results = {"commands": bench_commands(fixture, names, args.runs)}
+        print()
+        results["functions"] = bench_functions(fixture)
+    finally:
+        fixture.close()
+        keycloak.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    if args.save_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline saved to {os.path.relpath(BASELINE, ROOT)}")
+        return
+
+    baseline = None
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    failures = check(results, budgets, baseline, threshold)
+    print()
+    if not baseline:
+        print("No baseline on this machine (--save-baseline): only budgets checked.")
+    if failures:
+        print("Regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Fake `docker` executable for the CLI benchmarks.
+
+Answers the docker and docker compose calls the CLI makes with output of
+realistic size, after a realistic delay (scaled by
+FAKE_DOCKER_LATENCY_SCALE). The services come from
+services/*/metadata.json, so the output follows the repository.
+
+Every invocation is appended to FAKE_DOCKER_LOG (one JSON argv per line),
+which the runner uses to count subprocesses per command.
+"""
+
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Typical wall time of each call on a small server, in seconds
+LATENCY = {
+    "compose version": 0.06,
+    "compose config": 0.45,
+    "compose ps": 0.15,
+    "compose exec": 0.25,
+    "compose logs": 0.10,
+    "compose other": 0.20,
+    "stats": 2.0,
+    "inspect": 0.04,
+    "image": 0.04,
+    "info": 0.08,
+    "logs": 0.05,
+    "other": 0.05,
+}
+# Services outside any profile in _base are always on; these need one
+BASE_PROFILES = {"postgres-replica": ["replica"], "pgbouncer": ["pgbouncer"]}
+# compose global options taking a value
+COMPOSE_OPTIONS = {"--project-directory", "-f", "--file", "-p", "--project-name", "--env-file", "--profile"}
+LOG_LINES = 2000
+
+
+def _registry():
+    registry = {}
+    services_dir = os.path.join(ROOT, "services")
+    for entry in sorted(os.listdir(services_dir)):
+        path = os.path.join(services_dir, entry, "metadata.json")
+        if os.path.isfile(path):
+            with open(path) as f:
+                registry[entry] = json.load(f)
+    return registry
+
+
+def _services():
+    """{service: profiles}"""
+    services = {}
+    for svc_id, meta in _registry().items():
+        for service in meta.get("services", []):
+            services[service] = BASE_PROFILES.get(service, []) if svc_id == "_base" else [svc_id]
+    return services
+
+
+def _profiles(project_dir):
+    try:
+        with open(os.path.join(project_dir or ".", ".env")) as f:
+            for line in f:
+                if line.startswith("COMPOSE_PROFILES="):
+                    return {p.strip() for p in line.split("=", 1)[1].split(",") if p.strip()}
+    except OSError:
+        pass
+    return set()
+
+
+def _active(project_dir):
+    profiles = _profiles(project_dir)
+    return [s for s, p in _services().items() if not p or set(p) & profiles]
+
+
+def _config():
+    services = {}
+    for service, profiles in _services().items():
+        services[service] = {
+            "image": f"registry.example/{service}:1.0.0",
+            "profiles": profiles,
+            "restart": "unless-stopped",
+            "environment": {f"SETTING_{i}": f"value-{service}-{i}" for i in range(40)},
+            "networks": {"default": None},
+            "volumes": [{"type": "bind", "source": f"/srv/masuite/data/{service}", "target": "/data"}],
+            "deploy": {"resources": {"limits": {"memory": "536870912"}}},
+        }
+    return {"name": "masuite", "services": services, "networks": {"default": {"name": "masuite_default"}}}
+
+
+def _compose(args):
+    project_dir = None
+    i = 0
+    while i < len(args) and args[i].startswith("-"):
+        if args[i] == "--project-directory":
+            project_dir = args[i + 1]
+        i += 2 if args[i] in COMPOSE_OPTIONS else 1
+    command = args[i] if i < len(args) else ""
+    rest = args[i + 1:]
+    if command == "version":
+        return "compose version", "Docker Compose version v2.29.7\n"
+    if command == "config":
+        return "compose config", json.dumps(_config()) + "\n"
+    if command == "ps":
+        wanted = [a for n, a in enumerate(rest) if not a.startswith("-") and rest[n - 1] != "--format"]
+        lines = []
+        for service in _active(project_dir):
+            if wanted and service not in wanted:
+                continue
+            lines.append(json.dumps({
+                "ID": f"{abs(hash(service)):012x}", "Name": f"masuite-{service}-1", "Service": service,
+                "State": "running", "Status": "Up 3 days (healthy)", "Health": "healthy",
+                "Image": f"registry.example/{service}:1.0.0", "Project": "masuite",
+                "Publishers": [], "Labels": "com.docker.compose.project=masuite",
+            }))
+        return "compose ps", "\n".join(lines) + "\n"
+    if command == "logs":
+        return "compose logs", _log_lines(rest[-1] if rest else "service")
+    if command == "exec":
+        return "compose exec", ""
+    return "compose other", ""
+
+
+def _log_lines(name):
+    return "".join(f"2026-10-19T04:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}000Z "
+                   f"[{'ERROR' if i % 50 == 0 else 'INFO'}] {name}: handled request {i} in 12ms\n"
+                   for i in range(LOG_LINES))
+
+
+def main(argv):
+    log = os.environ.get("FAKE_DOCKER_LOG")
+    if log:
+        with open(log, "a") as f:
+            f.write(json.dumps(argv) + "\n")
+    command = argv[0] if argv else ""
+    if command == "compose":
+        kind, out = _compose(argv[1:])
+    elif command == "stats":
+        names = [a for a in argv[1:] if not a.startswith("-") and "{{" not in a]
+        kind = "stats"
+        out = "".join(f"{n}\t{(i % 7) * 1.3:.2f}%\t{100 + i * 3}.5MiB / 512MiB\t{(i % 9) * 2.1:.2f}%\n"
+                      for i, n in enumerate(names))
+    elif command == "inspect":
+        kind, out = "inspect", "127.0.0.1\n"
+    elif command == "image":
+        kind, out = "image", "sha256:" + "0" * 64 + "\n"
+    elif command == "info":
+        kind, out = "info", "Server Version: 27.3.1\n"
+    elif command == "logs":
+        kind, out = "logs", _log_lines(argv[-1])
+    else:
+        kind, out = "other", ""
+    time.sleep(LATENCY[kind] * float(os.environ.get("FAKE_DOCKER_LATENCY_SCALE", "1")))
+    sys.stdout.write(out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
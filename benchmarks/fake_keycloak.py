@@ -0,0 +1,97 @@
+"""Fake Keycloak for the CLI benchmarks.
+
+Serves the token endpoint and the admin user endpoints the CLI uses
+(paginated user lists, counts, lookups) over a generated realm, with a
+fixed per-request delay.
+"""
+
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REALM_PATH = "/admin/realms/masuite"
+
+
+def generate_users(count):
+    return [{
+        "id": f"00000000-0000-0000-0000-{i:012d}",
+        "username": f"user{i:05d}@example.com",
+        "email": f"user{i:05d}@example.com",
+        "firstName": f"First{i}",
+        "lastName": f"Last{i}",
+        "enabled": i % 10 != 0,
+        "emailVerified": True,
+        "createdTimestamp": 1700000000000 + i * 60000,
+    } for i in range(count)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, data=None):
+        body = json.dumps(data).encode() if data is not None else b""
+        self.server.wait()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.endswith("/protocol/openid-connect/token"):
+            self._send(200, {"access_token": "fake-token", "expires_in": 300,
+                             "refresh_token": "fake-refresh", "refresh_expires_in": 1800})
+        else:
+            self._send(201)
+
+    def do_GET(self):
+        parts = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        users = self.server.users
+        search = query.get("search") or query.get("username")
+        if search:
+            users = [u for u in users if search.lower() in u["username"]]
+        if "enabled" in query:
+            users = [u for u in users if u["enabled"] == (query["enabled"] == "true")]
+        if parts.path == f"{REALM_PATH}/users/count":
+            self._send(200, len(users))
+        elif parts.path == f"{REALM_PATH}/users":
+            first = int(query.get("first", 0))
+            self._send(200, users[first:first + int(query.get("max", 100))])
+        elif parts.path.startswith(f"{REALM_PATH}/clients"):
+            self._send(200, [{"id": "client-id", "clientId": query.get("clientId", "masuite")}])
+        else:
+            self._send(404, {"error": "not found"})
+
+
+class FakeKeycloak(ThreadingHTTPServer):
+    """Start with `start()`; `url` is its base URL."""
+
+    daemon_threads = True
+
+    def __init__(self, users=500, latency=0.015):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.users = generate_users(users)
+        self.latency = latency
+        self._stop = threading.Event()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def wait(self):
+        self._stop.wait(self.latency)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.shutdown()
+        self.server_close()
@@ -9,7 +9,8 @@ ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 def get_compose_cmd():
-    return ["docker", "compose", "--project-directory", ROOT_DIR]
+    from . import compose
+    return compose.compose_cmd(ROOT_DIR)
 
 
 def _require_env():
@@ -29,6 +30,9 @@ def cmd_start(args):
     _require_env()
     from . import docker_utils
     docker_utils.require_docker()
+    # Fetch missing images in parallel rather than one by one in `up`
+    from . import images
+    images.prefetch(ROOT_DIR, missing_only=True)
     subprocess.run([*get_compose_cmd(), "up", "-d"], check=True)
     # Run Django migrations for each enabled app
     _run_migrations()
@@ -39,31 +43,31 @@ def cmd_start(args):
 
 def _run_migrations():
     """Run Django migrations for each enabled app after start."""
-    from .setup_wizard import APP_REGISTRY
+    from .registry import APP_REGISTRY
+    from . import compose, pgbouncer
+    from .env import load_env, enabled_apps
     django_services = {
         k: v["backend_service"]
         for k, v in APP_REGISTRY.items() if v["is_django"]
     }
 
-    # Read enabled apps from .env
-    env_path = os.path.join(ROOT_DIR, ".env")
-    profiles = set()
-    if os.path.exists(env_path):
-        with open(env_path) as f:
-            for line in f:
-                if line.startswith("COMPOSE_PROFILES="):
-                    profiles = {p.strip() for p in line.split("=", 1)[1].strip().split(",")}
+    env = load_env(ROOT_DIR)
+    profiles = enabled_apps(env)
+    model = compose.load(ROOT_DIR)
 
     ran_any = False
     for app_id, service in django_services.items():
         if app_id not in profiles:
             continue
+        if model and not model.is_active(service, profiles):
+            continue
         if not ran_any:
             print("Running migrations...", flush=True)
             ran_any = True
         print(f"  {app_id}...", end=" ", flush=True)
         result = subprocess.run(
-            [*get_compose_cmd(), "exec", "-T", "-u", "root", service,
+            [*get_compose_cmd(), "exec", "-T", "-u", "root",
+             *pgbouncer.direct_db_env(env, app_id), service,
              "python", "manage.py", "migrate", "--noinput"],
             capture_output=True, text=True,
         )
@@ -103,6 +107,39 @@ def cmd_backup(args):
     backup.run(ROOT_DIR)
 
 
+def cmd_restore(args):
+    _require_env()
+    from . import docker_utils
+    docker_utils.require_docker()
+    from . import backup
+    backup.restore(ROOT_DIR, args.backup, args.apps)
+
+
+def cmd_db(args):
+    _require_env()
+    from . import docker_utils
+    docker_utils.require_docker()
+    from . import postgres
+    if args.db_action == "move":
+        postgres.move(ROOT_DIR, args.app)
+
+
+def cmd_images(args):
+    # A new host can load a bundle before running setup
+    if args.images_action != "import":
+        _require_env()
+    from . import docker_utils
+    docker_utils.require_docker()
+    from . import images
+    if args.images_action == "prefetch":
+        if not images.prefetch(ROOT_DIR, args.workers, missing_only=args.missing):
+            sys.exit(1)
+    elif args.images_action == "export":
+        images.export(ROOT_DIR, args.bundle, args.workers)
+    elif args.images_action == "import":
+        images.import_bundle(ROOT_DIR, args.bundle)
+
+
 def cmd_status(args):
     _require_env()
     from . import docker_utils
@@ -111,14 +148,94 @@ def cmd_status(args):
     status.run(ROOT_DIR, get_compose_cmd())
 
 
+def cmd_scale(args):
+    _require_env()
+    if args.specs:
+        from . import docker_utils
+        docker_utils.require_docker()
+    from . import scale
+    scale.run(ROOT_DIR, args.specs)
+
+
+def cmd_tune(args):
+    _require_env()
+    from . import tune
+    tune.run(ROOT_DIR, dry_run=args.dry_run)
+
+
 def cmd_logs(args):
     _require_env()
     from . import docker_utils
     docker_utils.require_docker()
-    cmd = [*get_compose_cmd(), "logs", "--tail=100", "-f"]
-    if args.service:
-        cmd.append(args.service)
-    subprocess.run(cmd)
+    from . import compose
+    model = compose.load(ROOT_DIR)
+    services = list(args.service)
+    unknown = [s for s in services if model and s not in model.services]
+    if unknown:
+        print(f"Unknown service: {', '.join(unknown)}")
+        print(f"Available: {', '.join(model.active_services())}")
+        sys.exit(1)
+    if args.app:
+        from .registry import APP_REGISTRY
+        if args.app not in APP_REGISTRY:
+            print(f"Unknown app: {args.app}")
+            sys.exit(1)
+        from . import postgres, redis
+        # Its dedicated database and Redis instances too, when it has them
+        extra = [postgres.instance(args.app, [args.app]), redis.service_name(args.app)]
+        services += APP_REGISTRY[args.app].get("services", [])
+        services += [s for s in extra if model and s in model.services]
+    if args.grep or args.level or args.since or args.json:
+        from . import logs
+        if not services and model:
+            services = model.active_services()
+        logs.run(get_compose_cmd(), sorted(set(services)), since=args.since, grep=args.grep,
+                 ignore_case=args.ignore_case, level=args.level, as_json=args.json)
+        return
+    subprocess.run([*get_compose_cmd(), "logs", "--tail=100", "-f", *services])
+
+
+def cmd_traffic(args):
+    _require_env()
+    from . import traffic
+    try:
+        hours = traffic.parse_window(args.since)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    traffic.run(ROOT_DIR, hours=hours, app=args.app, routes=args.routes, slow=args.slow,
+                top=args.top, min_requests=args.min_requests)
+
+
+def cmd_bench(args):
+    _require_env()
+    from . import bench
+    from .env import load_env
+    if args.list:
+        offered = bench.available(load_env(ROOT_DIR))
+        for name, scenario in bench.SCENARIOS.items():
+            note = "" if name in offered else f"  ({scenario.app} not enabled)"
+            print(f"  {name:<10} {scenario.description}{note}")
+        return
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()] if args.scenarios else None
+    bench.run(ROOT_DIR, scenarios=scenarios, concurrency=args.concurrency, duration=args.duration,
+              ramp_up=args.ramp_up, upload_kb=args.upload_kb, output=args.output,
+              compare=args.compare, insecure=args.insecure)
+
+
+def cmd_seed(args):
+    _require_env()
+    from . import docker_utils
+    docker_utils.require_docker()
+    from . import seed
+    if args.purge:
+        seed.purge(ROOT_DIR, workers=args.workers)
+        return
+    if args.users < 1:
+        print("--users must be at least 1")
+        sys.exit(1)
+    seed.run(ROOT_DIR, args.users, docs_per_user=args.docs_per_user, drive_gb=args.drive_gb,
+             seed=args.seed, workers=args.workers)
 
 
 def cmd_user(args):
@@ -129,7 +246,40 @@ def cmd_user(args):
     if args.user_action == "create":
         user.create(ROOT_DIR, args.email, args.password)
     elif args.user_action == "list":
-        user.list_users(ROOT_DIR)
+        enabled = None if args.enabled is None else args.enabled == "true"
+        try:
+            created_since = user.parse_since(args.created_since) if args.created_since else None
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        user.list_users(
+            ROOT_DIR, search=args.search, enabled=enabled,
+            created_since=created_since, fmt=args.format, count=args.count,
+            local=args.local, sync=args.sync,
+        )
+    elif args.user_action == "sync":
+        from . import user_index
+        if not user_index.sync(ROOT_DIR, full=args.full):
+            sys.exit(1)
+    elif args.user_action == "find":
+        user.find(ROOT_DIR, args.email, sync=args.sync)
+    elif args.user_action == "bulk":
+        from . import user_bulk
+        user_bulk.run(
+            ROOT_DIR, args.action, group=args.group, mail_domain=args.mail_domain,
+            file=args.file, search=args.search, member_of=args.member_of,
+            dry_run=args.dry_run, yes=args.yes, workers=args.workers, rate=args.rate,
+            create_group=args.create_group,
+        )
+    elif args.user_action == "inactive":
+        user.inactive(ROOT_DIR, args.days, fmt=args.format, sync=args.sync)
+    elif args.user_action == "import":
+        from . import user_import
+        user_import.run(
+            ROOT_DIR, args.file, fmt=args.format, mode=args.mode,
+            batch_size=args.batch_size, workers=args.workers, update=args.update,
+            generate_passwords=args.generate_passwords, report=args.report,
+        )
 
 
 def main():
@@ -147,17 +297,115 @@ def main():
     sub.add_parser("restart", help="Restart all services")
     sub.add_parser("update", help="Pull updates and restart")
     sub.add_parser("backup", help="Run backup now")
+    restore_parser = sub.add_parser("restore", help="Restore app databases from a backup")
+    restore_parser.add_argument("backup", help="Backup directory, or its name in backups/ (e.g. 2026-02-21_030000)")
+    restore_parser.add_argument("apps", nargs="*", metavar="APP", help="Apps to restore (default: every dump in the backup)")
+    db_parser = sub.add_parser("db", help="Manage PostgreSQL instances")
+    db_sub = db_parser.add_subparsers(dest="db_action", required=True)
+    move_parser = db_sub.add_parser("move", help="Move an app's database to its own PostgreSQL instance")
+    move_parser.add_argument("app", help="App id (e.g. drive)")
     sub.add_parser("status", help="Show service status")
+    images_parser = sub.add_parser("images", help="Prefetch images, or move them to offline hosts")
+    images_sub = images_parser.add_subparsers(dest="images_action", required=True)
+    prefetch_parser = images_sub.add_parser("prefetch", help="Pull the enabled services' images in parallel")
+    prefetch_parser.add_argument("--missing", action="store_true", help="Only pull images not present locally")
+    export_parser = images_sub.add_parser("export", help="Write an image bundle for the enabled services")
+    export_parser.add_argument("bundle", help="Bundle directory to create")
+    for action_parser in (prefetch_parser, export_parser):
+        action_parser.add_argument("--workers", type=int, default=4, help="Concurrent pulls (default: 4)")
+    images_import_parser = images_sub.add_parser("import", help="Load an image bundle")
+    images_import_parser.add_argument("bundle", help="Bundle directory written by export")
+    scale_parser = sub.add_parser("scale", help="Set replica counts of app services")
+    scale_parser.add_argument("specs", nargs="*", metavar="SERVICE=N",
+                              help="e.g. drive-backend=3 docs-celery=2 (none: show current counts)")
+    tune_parser = sub.add_parser("tune", help="Recompute host-aware service tuning")
+    tune_parser.add_argument("--dry-run", action="store_true", help="Show the settings without writing .env")
 
     logs_parser = sub.add_parser("logs", help="Tail service logs")
-    logs_parser.add_argument("service", nargs="?", help="Service name (optional)")
+    logs_parser.add_argument("service", nargs="*", help="Service names (default: all)")
+    logs_parser.add_argument("--app", help="All services of an app (e.g. docs)")
+    logs_parser.add_argument("--grep", metavar="PATTERN", help="Only lines matching this regular expression")
+    logs_parser.add_argument("-i", "--ignore-case", action="store_true", help="Case-insensitive --grep")
+    logs_parser.add_argument("--since", help="Only lines since a duration (e.g. 1h, 30m) or timestamp")
+    logs_parser.add_argument("--level", choices=["debug", "info", "warning", "error", "critical"],
+                             help="Only lines at this level or above")
+    logs_parser.add_argument("--json", action="store_true", help="Print JSON Lines records")
+
+    traffic_parser = sub.add_parser("traffic", help="Request rates, status mix and latency per app (access logs)")
+    traffic_parser.add_argument("--since", default="1h", help="Window in hours or days (e.g. 6h, 2d; default: 1h)")
+    traffic_parser.add_argument("--app", help="Only this site (e.g. docs, keycloak, homepage)")
+    traffic_parser.add_argument("--routes", action="store_true", help="Also show the busiest routes")
+    traffic_parser.add_argument("--slow", action="store_true", help="Also show the slowest routes by p95")
+    traffic_parser.add_argument("--top", type=int, default=20, help="Routes shown (default: 20)")
+    traffic_parser.add_argument("--min-requests", type=int, default=10,
+                                help="Minimum requests for a route to count in --slow (default: 10)")
+
+    bench_parser = sub.add_parser("bench", help="Load-test the running stack")
+    bench_parser.add_argument("--scenarios", help="Comma-separated scenarios (default: all available)")
+    bench_parser.add_argument("--list", action="store_true", help="List the scenarios")
+    bench_parser.add_argument("-c", "--concurrency", type=int, default=10, help="Virtual users (default: 10)")
+    bench_parser.add_argument("-d", "--duration", type=int, default=30, help="Measured seconds (default: 30)")
+    bench_parser.add_argument("--ramp-up", type=int, default=5,
+                              help="Seconds to start the users over, not measured (default: 5)")
+    bench_parser.add_argument("--upload-kb", type=int, default=256, help="Drive upload size in KiB (default: 256)")
+    bench_parser.add_argument("--output", help="Results file (default: .masuite/bench/<time>.json)")
+    bench_parser.add_argument("--compare", metavar="FILE", help="Compare with saved results (a file, or 'last')")
+    bench_parser.add_argument("--insecure", action="store_true", help="Don't verify TLS certificates")
+
+    seed_parser = sub.add_parser("seed", help="Create synthetic users and content for performance tests")
+    seed_parser.add_argument("--users", type=int, default=100, help="Seeded users (default: 100)")
+    seed_parser.add_argument("--docs-per-user", type=int, default=0, help="Docs documents per user")
+    seed_parser.add_argument("--drive-gb", type=float, default=0.0, help="Drive data in GiB, spread over the users")
+    seed_parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same data")
+    seed_parser.add_argument("--workers", type=int, default=16, help="Users seeded concurrently (default: 16)")
+    seed_parser.add_argument("--purge", action="store_true", help="Delete the seeded content and users")
 
     user_parser = sub.add_parser("user", help="Manage users")
     user_sub = user_parser.add_subparsers(dest="user_action", required=True)
     create_parser = user_sub.add_parser("create", help="Create a user")
     create_parser.add_argument("email", help="User email")
     create_parser.add_argument("--password", help="Password (generated if omitted)")
-    user_sub.add_parser("list", help="List users")
+    list_parser = user_sub.add_parser("list", help="List users")
+    list_parser.add_argument("--search", help="Match username, email, first or last name")
+    list_parser.add_argument("--enabled", choices=["true", "false"], help="Only enabled or disabled users")
+    list_parser.add_argument("--created-since", help="Only users created since YYYY-MM-DD or a relative age (e.g. 30d)")
+    list_parser.add_argument("--format", choices=["table", "csv", "json"], default="table", help="Output format")
+    list_parser.add_argument("--count", action="store_true", help="Only print the number of matching users")
+    list_parser.add_argument("--local", action="store_true", help="Answer from the local user index")
+    list_parser.add_argument("--sync", action="store_true", help="Refresh the local user index first (implies --local)")
+    sync_parser = user_sub.add_parser("sync", help="Refresh the local user index from Keycloak")
+    sync_parser.add_argument("--full", action="store_true", help="Rescan all users instead of replaying events")
+    find_parser = user_sub.add_parser("find", help="Look up a user in the local index")
+    find_parser.add_argument("email", help="Email or username")
+    find_parser.add_argument("--sync", action="store_true", help="Refresh the local user index first")
+    bulk_parser = user_sub.add_parser("bulk", help="Apply an action to many users at once")
+    bulk_parser.add_argument("action", choices=["enable", "disable", "delete", "add-group", "remove-group"])
+    bulk_parser.add_argument("group", nargs="?", help="Group path for add-group/remove-group (e.g. /staff)")
+    bulk_parser.add_argument("--mail-domain", help="Use the Messages mail-domain group (/maildomain-<domain>)")
+    selector = bulk_parser.add_mutually_exclusive_group(required=True)
+    selector.add_argument("--file", help="File of emails (CSV/JSON email column, or one per line)")
+    selector.add_argument("--search", help="Keycloak search query")
+    selector.add_argument("--member-of", help="Members of this group path")
+    bulk_parser.add_argument("--dry-run", action="store_true", help="Only show the affected users")
+    bulk_parser.add_argument("--yes", action="store_true", help="Don't ask for confirmation")
+    bulk_parser.add_argument("--workers", type=int, default=8, help="Concurrent requests (default: 8)")
+    bulk_parser.add_argument("--rate", type=float, default=20.0, help="Max requests per second (default: 20, 0 = unlimited)")
+    bulk_parser.add_argument("--create-group", action="store_true", help="Create the group if it doesn't exist (add-group)")
+    inactive_parser = user_sub.add_parser("inactive", help="List users without a recent login (local index)")
+    inactive_parser.add_argument("--days", type=int, default=90, help="Inactivity threshold in days (default: 90)")
+    inactive_parser.add_argument("--format", choices=["table", "csv", "json"], default="table", help="Output format")
+    inactive_parser.add_argument("--sync", action="store_true", help="Refresh the local user index first")
+    import_parser = user_sub.add_parser("import", help="Bulk import users from CSV/JSON")
+    import_parser.add_argument("file", help="CSV, JSON or JSON Lines file (one user per row)")
+    import_parser.add_argument("--format", choices=["csv", "json", "jsonl"], help="Input format (default: from extension)")
+    import_parser.add_argument("--mode", choices=["partial", "concurrent"], default="partial",
+                               help="partial: batched realm partial import; concurrent: parallel single creates")
+    import_parser.add_argument("--batch-size", type=int, default=200, help="Users per partial-import request")
+    import_parser.add_argument("--workers", type=int, default=4, help="Concurrent requests")
+    import_parser.add_argument("--update", action="store_true", help="Update existing users instead of skipping them")
+    import_parser.add_argument("--generate-passwords", action="store_true",
+                               help="Generate a password for rows without one (shown in the output)")
+    import_parser.add_argument("--report", help="Write per-row results to this CSV file")
 
     args = parser.parse_args()
     cmd_map = {
@@ -167,8 +415,16 @@ def main():
         "restart": cmd_restart,
         "update": cmd_update,
         "backup": cmd_backup,
+        "restore": cmd_restore,
+        "db": cmd_db,
         "status": cmd_status,
+        "images": cmd_images,
+        "scale": cmd_scale,
+        "tune": cmd_tune,
         "logs": cmd_logs,
+        "traffic": cmd_traffic,
+        "bench": cmd_bench,
+        "seed": cmd_seed,
         "user": cmd_user,
     }
     cmd_map[args.command](args)
@@ -4,41 +4,37 @@ import os
 import subprocess
 import datetime
 
-
-def _load_env(root_dir):
-    """Load .env file as a dict."""
-    env = {}
-    env_path = os.path.join(root_dir, ".env")
-    if not os.path.exists(env_path):
-        return env
-    with open(env_path) as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "=" in line:
-                key, _, value = line.partition("=")
-                env[key.strip()] = value.strip()
-    return env
+from .env import load_env
 
 
 def _compose_cmd(root_dir):
-    return ["docker", "compose", "--project-directory", root_dir]
+    from . import compose
+    return compose.compose_cmd(root_dir)
 
 
 def run(root_dir):
     """Run a backup of all databases and S3 buckets."""
-    env = _load_env(root_dir)
+    env = load_env(root_dir)
     now = datetime.datetime.now().strftime("%Y-%m-%d_%H%M%S")
     backup_dir = os.path.join(root_dir, "backups", now)
     os.makedirs(backup_dir, exist_ok=True)
 
     print(f"Backing up to {backup_dir}/")
 
-    # PostgreSQL: dump each app database
-    from .setup_wizard import APP_REGISTRY
+    # PostgreSQL: dump each app database, from the instance holding it, or
+    # from the hot standby when it is up to date
+    from . import postgres, replica
+    from .registry import APP_REGISTRY
     apps = [a.strip() for a in env.get("COMPOSE_PROFILES", "").split(",") if a.strip()]
     db_user = env.get("SHARED_DB_USER", "masuite_app")
+    dedicated = postgres.dedicated(env)
+    shared_source = postgres.SHARED
+    if replica.PROFILE in apps:
+        if replica.usable_for_backup(_compose_cmd(root_dir)):
+            shared_source = replica.SERVICE
+            print(f"  Dumping shared databases from {replica.SERVICE}")
+        else:
+            print(f"  {replica.SERVICE} is not streaming or lags behind, dumping from {postgres.SHARED}")
 
     for app in apps:
         if app not in APP_REGISTRY:
@@ -48,12 +44,13 @@ def run(root_dir):
             continue
 
         dump_file = os.path.join(backup_dir, f"{app}_db.sql.gz")
+        source = postgres.instance(app, dedicated) if app in dedicated else shared_source
         print(f"  Dumping {db_name}...", end=" ", flush=True)
 
         result = subprocess.run(
             [
                 *_compose_cmd(root_dir),
-                "exec", "-T", "postgres",
+                "exec", "-T", source,
                 "pg_dump", "-U", db_user, db_name,
             ],
             capture_output=True,
@@ -101,6 +98,71 @@ def run(root_dir):
     print(f"\nBackup complete: {backup_dir}/")
 
 
+def restore(root_dir, backup, apps=None):
+    """Restore app databases from a backup directory (all dumps in it by default).
+
+    Each app is stopped while its database is dropped, recreated and
+    reloaded on the instance currently holding it.
+    """
+    import gzip
+    import shutil
+    import sys
+    from . import postgres
+    from .registry import APP_REGISTRY
+
+    env = load_env(root_dir)
+    backup_dir = backup if os.path.isdir(backup) else os.path.join(root_dir, "backups", backup)
+    if not os.path.isdir(backup_dir):
+        print(f"Backup not found: {backup}")
+        sys.exit(1)
+    dumps = {f[:-len("_db.sql.gz")]: os.path.join(backup_dir, f)
+             for f in sorted(os.listdir(backup_dir)) if f.endswith("_db.sql.gz")}
+    apps = apps or [a for a in dumps if a in APP_REGISTRY]
+    missing = [a for a in apps if a not in dumps or a not in APP_REGISTRY]
+    if missing:
+        print(f"No app database dump for: {', '.join(missing)} (in {backup_dir}/)")
+        sys.exit(1)
+
+    admin = postgres.ADMIN_USER
+    db_user = env.get("SHARED_DB_USER", "masuite_app")
+    dedicated = postgres.dedicated(env)
+    cmd = _compose_cmd(root_dir)
+    print(f"Restoring from {backup_dir}/")
+    for app in apps:
+        db_name = env.get(f"{app.upper()}_DB_NAME", postgres.db_name(app))
+        service = postgres.instance(app, dedicated)
+        app_services = [s for s in APP_REGISTRY[app].get("services", []) if s != service]
+        print(f"  {db_name} ({service})...", end=" ", flush=True)
+        subprocess.run([*cmd, "stop", *app_services], capture_output=True)
+        result = subprocess.run(
+            [*cmd, "exec", "-T", service, "psql", "-U", admin, "-d", admin, "-v", "ON_ERROR_STOP=1",
+             "-c", f'DROP DATABASE IF EXISTS "{db_name}" WITH (FORCE)',
+             "-c", f'CREATE DATABASE "{db_name}" OWNER "{db_user}"'],
+            capture_output=True, text=True,
+        )
+        if result.returncode == 0:
+            load = subprocess.Popen(
+                [*cmd, "exec", "-T", service, "psql", "-U", db_user, "-d", db_name,
+                 "-v", "ON_ERROR_STOP=1", "-q"],
+                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            )
+            try:
+                with gzip.open(dumps[app], "rb") as f:
+                    shutil.copyfileobj(f, load.stdin)
+                load.stdin.close()
+            except BrokenPipeError:
+                pass  # psql stopped on an error, reported below
+            stderr = load.stderr.read().decode()
+            result = subprocess.CompletedProcess(load.args, load.wait(), stderr=stderr)
+        subprocess.run([*cmd, "up", "-d", *app_services], capture_output=True)
+        if result.returncode == 0:
+            print("done")
+        else:
+            print(f"FAILED: {result.stderr.strip()[:200]}")
+            sys.exit(1)
+    print("\nRestore complete. Files in data/objectstorage/ are not part of backups.")
+
+
 def _cleanup_old_backups(root_dir, env):
     """Remove backups older than retention policy."""
     backup_root = os.path.join(root_dir, "backups")
@@ -0,0 +1,629 @@
+"""HTTP load tests against the running stack (`./masuite bench`).
+
+An asyncio load generator (pure stdlib: HTTP/1.1 over asyncio streams).
+Each virtual user runs one scenario in a loop with its own keep-alive
+connections and cookies, like a browser would. Users start evenly over
+the ramp-up, and only requests started after it are measured.
+
+Scenarios, offered for the enabled apps:
+
+- homepage: the homepage and the gaufre services JSON
+- login: OIDC authorization code login through the Keycloak login form
+- docs: Docs API document listing
+- drive: upload through a presigned RustFS URL, then download
+- meet: room lookup, which creates a LiveKit access token
+
+Authenticated scenarios log a seeded test user in once per virtual user
+(through the app's OIDC flow) before the measurement. The test user is
+created in Keycloak if missing, and its password reset on every run.
+
+Results (throughput and latency percentiles per operation) are saved as
+JSON under .masuite/bench/, and a run can be compared to a saved one.
+"""
+
+import asyncio
+import datetime
+import glob
+import html
+import json
+import os
+import re
+import ssl
+import sys
+import time
+import urllib.parse
+import uuid
+
+from . import keycloak
+from .env import load_env, enabled_apps, state_path
+from .user import generate_password, user_representation
+
+TEST_USER_NAME = "bench"
+REQUEST_TIMEOUT = 30
+MAX_REDIRECTS = 10
+
+_LOGIN_FORM = re.compile(r'<form\b[^>]*\bid="kc-form-login"[^>]*>', re.IGNORECASE)
+_FORM_ACTION = re.compile(r'\baction="([^"]+)"')
+
+
+class BenchError(RuntimeError):
+    """A scenario step got an unexpected response."""
+
+
+# --- HTTP client ---
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers  # [(lowercase name, value)]
+        self.body = body
+
+    def header(self, name, default=""):
+        for key, value in reversed(self.headers):
+            if key == name:
+                return value
+        return default
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class Client:
+    """One virtual user's HTTP client: a keep-alive connection per origin, cookies per host."""
+
+    def __init__(self, ssl_context):
+        self.ssl_context = ssl_context
+        self.cookies = {}
+        self._connections = {}
+
+    async def _connect(self, scheme, host, port):
+        return await asyncio.open_connection(
+            host, port, ssl=self.ssl_context if scheme == "https" else None,
+            server_hostname=host if scheme == "https" else None,
+        )
+
+    def _store_cookies(self, host, response):
+        jar = self.cookies.setdefault(host, {})
+        for name, value in response.headers:
+            if name != "set-cookie":
+                continue
+            pair, _, attrs = value.partition(";")
+            key, _, val = pair.strip().partition("=")
+            attrs = attrs.lower()
+            if "max-age=0" in attrs or "1970" in attrs:
+                jar.pop(key, None)
+            else:
+                jar[key] = val
+
+    async def _exchange(self, method, origin, netloc, target, body, headers):
+        scheme, host, port = origin
+        for attempt in range(2):
+            reused = origin in self._connections
+            if not reused:
+                self._connections[origin] = await self._connect(scheme, host, port)
+            reader, writer = self._connections[origin]
+            lines = [f"{method} {target} HTTP/1.1", f"Host: {netloc}"]
+            lines += [f"{k}: {v}" for k, v in headers.items()]
+            if body is not None:
+                lines.append(f"Content-Length: {len(body)}")
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+            try:
+                await writer.drain()
+                response, keep_alive = await _read_response(reader, method)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self._drop(origin)
+                if reused and attempt == 0:
+                    continue  # Idle connection closed by the server
+                raise
+            if not keep_alive:
+                self._drop(origin)
+            return response
+
+    def _drop(self, origin):
+        connection = self._connections.pop(origin, None)
+        if connection:
+            connection[1].close()
+
+    async def request(self, method, url, body=None, headers=None, follow=False):
+        """Send a request. Returns (response, final URL), following redirects if `follow`."""
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            host = parts.hostname
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            sent = {"User-Agent": "masuite-bench", "Accept-Encoding": "identity", **(headers or {})}
+            jar = self.cookies.get(host)
+            if jar:
+                sent["Cookie"] = "; ".join(f"{k}={v}" for k, v in jar.items())
+            origin = (parts.scheme, host, port)
+            try:
+                response = await asyncio.wait_for(
+                    self._exchange(method, origin, parts.netloc, target, body, sent), REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                self._drop(origin)  # a response may still arrive on it
+                raise
+            self._store_cookies(host, response)
+            location = response.header("location")
+            if not (follow and location and response.status in (301, 302, 303, 307, 308)):
+                return response, url
+            url = urllib.parse.urljoin(url, location)
+            if response.status in (301, 302, 303):
+                method, body, headers = "GET", None, None
+        raise BenchError(f"too many redirects ({url})")
+
+    def close(self):
+        for origin in list(self._connections):
+            self._drop(origin)
+
+
+async def _read_response(reader, method):
+    """Read one response. Returns (Response, keep-alive)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("connection closed")
+    status = int(status_line.split()[1])
+    headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers.append((name.strip().lower(), value.strip()))
+    fields = dict(headers)
+    keep_alive = fields.get("connection", "").lower() != "close"
+    if method == "HEAD" or status in (204, 304) or status < 200:
+        body = b""
+    elif "chunked" in fields.get("transfer-encoding", "").lower():
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass  # trailers
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b"".join(chunks)
+    elif "content-length" in fields:
+        body = await reader.readexactly(int(fields["content-length"]))
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return Response(status, headers, body), keep_alive
+
+
+# --- Recording ---
+
+class Recorder:
+    """Latencies and errors per operation, for requests started after the ramp-up."""
+
+    def __init__(self, measure_from):
+        self.measure_from = measure_from
+        self.latencies = {}
+        self.errors = {}
+        self.error_samples = {}
+
+    async def timed(self, op, coro):
+        """Await `coro` (a step returning a truthy value on success), recording it under `op`."""
+        started = time.monotonic()
+        try:
+            result = await coro
+            error = None if result else "unexpected response"
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                ValueError, KeyError, TypeError, BenchError) as e:
+            result, error = None, str(e) or type(e).__name__
+        if started >= self.measure_from:
+            if error:
+                self.errors[op] = self.errors.get(op, 0) + 1
+                self.error_samples.setdefault(op, error)
+            else:
+                self.latencies.setdefault(op, []).append(time.monotonic() - started)
+        return result
+
+
+# --- Scenarios ---
+
+class VirtualUser:
+    def __init__(self, bench, recorder):
+        self.bench = bench
+        self.client = Client(bench.ssl_context)
+        self.recorder = recorder
+        self.state = {}
+
+    async def get(self, url, expect=200, **kwargs):
+        response, _ = await self.client.request("GET", url, **kwargs)
+        if response.status != expect:
+            raise BenchError(f"GET {url}: HTTP {response.status}")
+        return response
+
+    async def api(self, method, base, path, data=None, expect=(200, 201, 204)):
+        """Session-authenticated Django REST call, with the CSRF token and Referer."""
+        host = urllib.parse.urlsplit(base).hostname
+        headers = {
+            "Accept": "application/json",
+            "Referer": base + "/",
+            "X-CSRFToken": self.client.cookies.get(host, {}).get("csrftoken", ""),
+        }
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers["Content-Type"] = "application/json"
+        response, _ = await self.client.request(method, base + path, body, headers)
+        if response.status not in expect:
+            raise BenchError(f"{method} {path}: HTTP {response.status} {response.body[:200]!r}")
+        return response
+
+    async def submit_login(self, response, url, follow):
+        """Post the test user's credentials to a Keycloak login form."""
+        form = _LOGIN_FORM.search(response.body.decode(errors="replace"))
+        action = form and _FORM_ACTION.search(form.group(0))
+        if not action:
+            raise BenchError(f"no Keycloak login form at {url} (HTTP {response.status})")
+        fields = {"username": self.bench.username, "password": self.bench.password, "credentialId": ""}
+        return await self.client.request(
+            "POST", urllib.parse.urljoin(url, html.unescape(action.group(1))),
+            urllib.parse.urlencode(fields).encode(),
+            {"Content-Type": "application/x-www-form-urlencoded"}, follow=follow,
+        )
+
+    async def app_login(self, base):
+        """Log in to an app through its OIDC flow, leaving its session cookie in the jar."""
+        response, url = await self.client.request("GET", base + "/api/v1.0/authenticate/", follow=True)
+        response, url = await self.submit_login(response, url, follow=True)
+        if urllib.parse.urlsplit(url).hostname != urllib.parse.urlsplit(base).hostname or response.status >= 400:
+            raise BenchError(f"login to {base} ended at {url} (HTTP {response.status})")
+
+    async def paginate(self, base, path):
+        """Yield the results of a paginated Django REST list, following `next`."""
+        while path:
+            page = (await self.api("GET", base, path)).json()
+            for item in page["results"]:
+                yield item
+            following = urllib.parse.urlsplit(page.get("next") or "")
+            path = following.path + (f"?{following.query}" if following.query else "")
+
+    async def drive_upload(self, base, filename, payload):
+        """Create a Drive file and upload its content to the presigned URL. Returns the item."""
+        item = (await self.api("POST", base, "/api/v1.0/items/",
+                               {"type": "file", "filename": filename})).json()
+        response, _ = await self.client.request("PUT", item["policy"], payload, {
+            "Content-Type": "application/octet-stream", "x-amz-acl": "private",
+        })
+        if response.status not in (200, 204):
+            raise BenchError(f"presigned upload: HTTP {response.status}")
+        await self.api("POST", base, f"/api/v1.0/items/{item['id']}/upload-ended/")
+        return item
+
+    def close(self):
+        self.client.close()
+
+
+class Scenario:
+    """A user journey run in a loop. `app` is the app it needs, None for the base system."""
+
+    name = ""
+    app = None
+    description = ""
+    needs_user = True
+
+    async def setup(self, user):
+        pass
+
+    async def run(self, user):
+        raise NotImplementedError
+
+    async def teardown(self, user):
+        pass
+
+
+class Homepage(Scenario):
+    name = "homepage"
+    description = "homepage and gaufre services JSON"
+    needs_user = False
+
+    async def run(self, user):
+        base = user.bench.urls["homepage"]
+        await user.recorder.timed("homepage", user.get(base + "/"))
+        await user.recorder.timed("gaufre json", self._gaufre(user, base))
+
+    async def _gaufre(self, user, base):
+        return (await user.get(base + "/gaufre-services.json")).json()
+
+
+class Login(Scenario):
+    name = "login"
+    description = "OIDC login through the Keycloak login form"
+
+    async def run(self, user):
+        user.client.cookies.clear()  # a new browser every time
+        await user.recorder.timed("oidc login", self._login(user))
+
+    async def _login(self, user):
+        bench = user.bench
+        query = urllib.parse.urlencode({
+            "client_id": "masuite", "response_type": "code", "scope": "openid",
+            "redirect_uri": bench.urls["homepage"] + "/", "state": uuid.uuid4().hex,
+        })
+        url = f"{bench.urls['keycloak']}/realms/{keycloak.REALM}/protocol/openid-connect/auth?{query}"
+        response, url = await user.client.request("GET", url)
+        response, _ = await user.submit_login(response, url, follow=False)
+        return response.status == 302 and "code=" in response.header("location")
+
+
+class DocsList(Scenario):
+    name = "docs"
+    app = "docs"
+    description = "Docs API document listing"
+
+    async def setup(self, user):
+        base = user.bench.urls["docs"]
+        await user.app_login(base)
+        # Something to list
+        response = await user.api("POST", base, "/api/v1.0/documents/", {"title": "masuite bench"})
+        user.state["document"] = response.json()["id"]
+
+    async def run(self, user):
+        base = user.bench.urls["docs"]
+        await user.recorder.timed("docs list", self._list(user, base))
+
+    async def _list(self, user, base):
+        return "results" in (await user.api("GET", base, "/api/v1.0/documents/")).json()
+
+    async def teardown(self, user):
+        if "document" in user.state:
+            await user.api("DELETE", user.bench.urls["docs"], f"/api/v1.0/documents/{user.state['document']}/")
+
+
+class DriveTransfer(Scenario):
+    name = "drive"
+    app = "drive"
+    description = "Drive upload (presigned RustFS URL) and download"
+
+    async def setup(self, user):
+        await user.app_login(user.bench.urls["drive"])
+
+    async def run(self, user):
+        base = user.bench.urls["drive"]
+        item = await user.recorder.timed("drive upload", self._upload(user, base))
+        if not item:
+            return
+        await user.recorder.timed("drive download", self._download(user, base, item))
+        await user.recorder.timed("drive delete", user.api("DELETE", base, f"/api/v1.0/items/{item['id']}/"))
+
+    async def _upload(self, user, base):
+        return await user.drive_upload(base, f"bench-{uuid.uuid4().hex[:8]}.bin", user.bench.payload)
+
+    async def _download(self, user, base, item):
+        item = (await user.api("GET", base, f"/api/v1.0/items/{item['id']}/")).json()
+        response = await user.get(urllib.parse.urljoin(base + "/", item["url"]))
+        return len(response.body) == len(user.bench.payload)
+
+
+class MeetToken(Scenario):
+    name = "meet"
+    app = "meet"
+    description = "Meet room lookup with LiveKit token"
+
+    async def setup(self, user):
+        base = user.bench.urls["meet"]
+        await user.app_login(base)
+        response = await user.api("POST", base, "/api/v1.0/rooms/", {"name": f"bench-{uuid.uuid4().hex[:8]}"})
+        user.state["room"] = response.json()["id"]
+
+    async def run(self, user):
+        await user.recorder.timed("meet token", self._token(user))
+
+    async def _token(self, user):
+        room = (await user.api("GET", user.bench.urls["meet"], f"/api/v1.0/rooms/{user.state['room']}/")).json()
+        return bool(room.get("livekit", {}).get("token"))
+
+    async def teardown(self, user):
+        if "room" in user.state:
+            await user.api("DELETE", user.bench.urls["meet"], f"/api/v1.0/rooms/{user.state['room']}/")
+
+
+SCENARIOS = {s.name: s for s in (Homepage(), Login(), DocsList(), DriveTransfer(), MeetToken())}
+
+
+def available(env):
+    """Scenarios usable with the enabled apps."""
+    enabled = enabled_apps(env)
+    return [name for name, s in SCENARIOS.items() if s.app is None or s.app in enabled]
+
+
+def site_urls(env):
+    """Browser-facing base URLs of the homepage, Keycloak and the apps."""
+    from .registry import APP_PORTS, APP_SUBDOMAINS
+    domain = env.get("BASE_DOMAIN", "")
+    if env.get("MASUITE_MODE", "local") == "prod" and domain:
+        return {k: f"https://{sub}.{domain}" for k, sub in APP_SUBDOMAINS.items()}
+    return {k: f"http://localhost:{port}" for k, port in APP_PORTS.items()}
+
+
+# --- Test user ---
+
+def seed_user(root_dir, env):
+    """Create the bench user if needed and set a fresh password. Returns (username, password)."""
+    admin = keycloak.connect(root_dir, env)
+    if not admin:
+        print("Error: KEYCLOAK_ADMIN_PASSWORD must be set in .env")
+        sys.exit(1)
+    username = f"{TEST_USER_NAME}@{env.get('BASE_DOMAIN') or 'masuite.localhost'}"
+    password = generate_password()
+    try:
+        existing = admin.find_user(username)
+        if existing:
+            admin.put(f"/users/{existing['id']}/reset-password",
+                      {"type": "password", "value": password, "temporary": False})
+        else:
+            admin.post("/users", user_representation(username, password, first_name="Bench", last_name="User"))
+    except keycloak.KeycloakError as e:
+        print(f"Could not prepare the test user {username}: {e}")
+        sys.exit(1)
+    finally:
+        admin.close()
+    return username, password
+
+
+# --- Run ---
+
+class Bench:
+    """Shared settings of a run."""
+
+    def __init__(self, urls, username, password, payload, ssl_context):
+        self.urls = urls
+        self.username = username
+        self.password = password
+        self.payload = payload
+        self.ssl_context = ssl_context
+
+
+async def _user_loop(bench, scenario, recorder, start_at, end_at, setup_errors):
+    await asyncio.sleep(max(0.0, start_at - time.monotonic()))
+    user = VirtualUser(bench, recorder)
+    try:
+        try:
+            await scenario.setup(user)
+        except (OSError, asyncio.TimeoutError, ValueError, KeyError, TypeError, BenchError) as e:
+            setup_errors.append(f"{scenario.name}: {e}")
+            return
+        while time.monotonic() < end_at:
+            await scenario.run(user)
+        try:
+            await scenario.teardown(user)
+        except (OSError, asyncio.TimeoutError, BenchError):
+            pass  # Best effort
+    finally:
+        user.close()
+
+
+async def _run(bench, scenarios, concurrency, duration, ramp_up):
+    now = time.monotonic()
+    recorder = Recorder(now + ramp_up)
+    end_at = now + ramp_up + duration
+    setup_errors = []
+    await asyncio.gather(*(
+        _user_loop(bench, scenarios[i % len(scenarios)], recorder,
+                   now + ramp_up * i / concurrency, end_at, setup_errors)
+        for i in range(concurrency)
+    ))
+    return recorder, setup_errors
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(recorder, duration):
+    """{operation: stats}, latencies in milliseconds."""
+    results = {}
+    for op in sorted(set(recorder.latencies) | set(recorder.errors)):
+        ordered = sorted(recorder.latencies.get(op, []))
+        stats = {"requests": len(ordered), "errors": recorder.errors.get(op, 0),
+                 "throughput": round(len(ordered) / duration, 2)}
+        if ordered:
+            stats.update({
+                "mean_ms": round(1000 * sum(ordered) / len(ordered), 1),
+                "p50_ms": round(1000 * _percentile(ordered, 0.50), 1),
+                "p95_ms": round(1000 * _percentile(ordered, 0.95), 1),
+                "p99_ms": round(1000 * _percentile(ordered, 0.99), 1),
+                "max_ms": round(1000 * ordered[-1], 1),
+            })
+        if op in recorder.error_samples:
+            stats["error_sample"] = recorder.error_samples[op][:200]
+        results[op] = stats
+    return results
+
+
+def _load_previous(root_dir, compare):
+    if compare == "last":
+        runs = sorted(glob.glob(state_path(root_dir, "bench", "*.json")))
+        if not runs:
+            print("No saved run to compare with.")
+            return None
+        compare = runs[-1]
+    try:
+        with open(compare) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read {compare}: {e}")
+        return None
+
+
+def _delta(current, previous):
+    if current is None or not previous:
+        return ""
+    return f" ({(current - previous) / previous:+.0%})"
+
+
+def report(results, previous=None):
+    before = (previous or {}).get("results", {})
+    width = max(16, *(len(op) for op in results))
+    print(f"  {'Operation':<{width}} {'Requests':>9} {'Errors':>7} {'Req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for op, stats in results.items():
+        ms = [f"{stats[k]:>8.0f}" if k in stats else f"{'-':>8}" for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+        print(f"  {op:<{width}} {stats['requests']:>9} {stats['errors']:>7} {stats['throughput']:>8.1f} {' '.join(ms)}")
+        old = before.get(op)
+        if old:
+            print(f"  {'':<{width}} vs previous: req/s {old['throughput']}{_delta(stats['throughput'], old['throughput'])}, "
+                  f"p95 {old.get('p95_ms', '-')} ms{_delta(stats.get('p95_ms'), old.get('p95_ms'))}")
+        if stats.get("error_sample"):
+            print(f"  {'':<{width}} first error: {stats['error_sample']}")
+
+
+def run(root_dir, scenarios=None, concurrency=10, duration=30, ramp_up=5,
+        upload_kb=256, output=None, compare=None, insecure=False):
+    """Run the selected scenarios against the running stack and save the results."""
+    env = load_env(root_dir)
+    offered = available(env)
+    selected = scenarios or offered
+    unavailable = [s for s in selected if s not in offered]
+    if unavailable:
+        print(f"Scenario not available with the enabled apps: {', '.join(unavailable)}")
+        print(f"Available: {', '.join(offered)}")
+        sys.exit(1)
+    if concurrency < len(selected):
+        print(f"Concurrency raised to {len(selected)}: at least one user per scenario.")
+        concurrency = len(selected)
+
+    previous = _load_previous(root_dir, compare) if compare else None
+    username = password = None
+    if any(SCENARIOS[s].needs_user for s in selected):
+        username, password = seed_user(root_dir, env)
+    ssl_context = ssl.create_default_context()
+    if insecure:
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+    bench = Bench(site_urls(env), username, password, os.urandom(upload_kb * 1024), ssl_context)
+
+    print(f"Running {', '.join(selected)} with {concurrency} users for {duration}s "
+          f"(after {ramp_up}s ramp-up)...", flush=True)
+    recorder, setup_errors = asyncio.run(
+        _run(bench, [SCENARIOS[s] for s in selected], concurrency, duration, ramp_up))
+    for error in sorted(set(setup_errors)):
+        print(f"  Setup failed: {error}")
+    results = summarize(recorder, duration)
+    if not results:
+        print("No requests completed.")
+        sys.exit(1)
+
+    print()
+    report(results, previous)
+    saved = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "scenarios": selected,
+        "concurrency": concurrency,
+        "duration": duration,
+        "ramp_up": ramp_up,
+        "upload_kb": upload_kb,
+        "results": results,
+    }
+    path = output or state_path(root_dir, "bench", datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(path, "w") as f:
+        json.dump(saved, f, indent=2)
+        f.write("\n")
+    print()
+    print(f"Results saved to {os.path.relpath(path, root_dir)}")
+    if setup_errors or any(stats["errors"] for stats in results.values()):
+        sys.exit(1)
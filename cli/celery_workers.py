@@ -0,0 +1,100 @@
+"""Celery worker sizing and per-queue worker services.
+
+Every app with a `<app>-celery` service gets host-aware worker settings in
+.env (autoscale bounds, prefetch multiplier, max tasks per child), which the
+compose files pass on the worker command line.
+
+Apps can split heavy tasks off the default worker with a "celery" object
+in metadata.json:
+
+    "celery": {"queues": {"heavy": ["*preview*", "*convert*"]}}
+
+Tasks matching the glob patterns are routed to the queue (through
+CELERY_TASK_ROUTES, read by the settings overlays), the default worker
+stops consuming it (--exclude-queues), and a dedicated `<app>-celery-<queue>`
+worker service in the app's compose.yml consumes only that queue.
+"""
+
+# Approximate resident memory of one prefork worker process
+PROCESS_MB = 128
+
+
+def celery_apps(registry):
+    """App ids that run a celery worker."""
+    return [app_id for app_id, app in registry.items()
+            if f"{app_id}-celery" in app.get("services", [])]
+
+
+def queues(app):
+    """Return {queue: [task glob patterns]} declared in an app's metadata."""
+    return app.get("celery", {}).get("queues", {})
+
+
+def worker_service(app_id, queue):
+    return f"{app_id}-celery-{queue}"
+
+
+def routing_env(registry, enabled):
+    """Static routing settings for .env: [(key, value)]."""
+    values = []
+    for app_id in celery_apps(registry):
+        if app_id not in enabled:
+            continue
+        app_queues = queues(registry[app_id])
+        if not app_queues:
+            continue
+        prefix = f"{app_id.upper()}_CELERY"
+        routes = [f"{pattern}:{queue}" for queue, patterns in app_queues.items() for pattern in patterns]
+        values.append((f"{prefix}_TASK_ROUTES", ",".join(routes)))
+        values.append((f"{prefix}_EXCLUDE_QUEUES", ",".join(app_queues)))
+    return values
+
+
+def compute(host, registry, enabled):
+    """Host-aware worker settings: [(env_key, value, explanation)]."""
+    cpus = host["cpus"]
+    settings = []
+    for app_id in celery_apps(registry):
+        if app_id not in enabled:
+            continue
+        app = registry[app_id]
+        prefix = f"{app_id.upper()}_CELERY"
+        # The app's RAM budget bounds how many processes it can afford
+        by_ram = max(1, app.get("ram", 512) // PROCESS_MB)
+        max_procs = max(2, min(cpus, by_ram, 8))
+        settings.append((f"{prefix}_AUTOSCALE", f"{max_procs},1",
+                         f"up to one process per core ({cpus}), at most {by_ram} within the "
+                         f"{app.get('ram', 512)} MB budget (2-8); one when idle"))
+        settings.append((f"{prefix}_PREFETCH_MULTIPLIER", "2",
+                         "short tasks: a little prefetch, so a slow task doesn't hold queued ones"))
+        settings.append((f"{prefix}_MAX_TASKS_PER_CHILD", "200",
+                         "recycle worker processes to bound memory growth"))
+        for queue in queues(app):
+            qprefix = f"{prefix}_{queue.upper()}"
+            heavy_procs = max(1, min(cpus // 2, by_ram // 2, 4))
+            settings.append((f"{qprefix}_AUTOSCALE", f"{heavy_procs},1",
+                             f"'{queue}' queue: half the cores (max 4), leaves room for the default worker"))
+            settings.append((f"{qprefix}_MAX_TASKS_PER_CHILD", "20",
+                             f"'{queue}' queue: long, memory-hungry tasks, recycle often"))
+    return settings
+
+
+def describe(env, registry, enabled):
+    """Configured workers for status: [(service, queues, autoscale, prefetch, max_tasks)]."""
+    rows = []
+    for app_id in celery_apps(registry):
+        if app_id not in enabled:
+            continue
+        prefix = f"{app_id.upper()}_CELERY"
+        app_queues = queues(registry[app_id])
+        default_queues = "all" + (f" but {','.join(app_queues)}" if app_queues else "")
+        rows.append((f"{app_id}-celery", default_queues,
+                     env.get(f"{prefix}_AUTOSCALE", "4,1"),
+                     env.get(f"{prefix}_PREFETCH_MULTIPLIER", "4"),
+                     env.get(f"{prefix}_MAX_TASKS_PER_CHILD", "1000")))
+        for queue in sorted(app_queues):
+            qprefix = f"{prefix}_{queue.upper()}"
+            rows.append((worker_service(app_id, queue), queue,
+                         env.get(f"{qprefix}_AUTOSCALE", "2,1"), "1",
+                         env.get(f"{qprefix}_MAX_TASKS_PER_CHILD", "20")))
+    return rows
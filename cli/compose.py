@@ -0,0 +1,210 @@
+"""Cached, flattened Docker Compose model.
+
+`docker-compose.yml` includes one compose file per service directory, and
+every `docker compose` call re-parses all of them plus `.env` and
+`versions.env`. We resolve the project once with `docker compose config`
+into a single, fully interpolated file cached under a content hash of all
+inputs, and point every later compose command at that file.
+
+The same resolved model answers service/profile/image queries in Python,
+without spawning compose at all.
+
+Generated override files (config/compose/*.json) are layered on top of
+docker-compose.yml in sorted order and are part of the hash.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import subprocess
+
+from .env import load_env, compose_profiles, state_path
+
+PROJECT_NAME = "masuite"
+OVERRIDES_DIR = os.path.join("config", "compose")
+
+_models = {}
+_unresolvable = set()
+
+
+def _override_files(root_dir):
+    """Generated compose overrides, in application order."""
+    return sorted(glob.glob(os.path.join(root_dir, OVERRIDES_DIR, "*.json")))
+
+
+def write_override(root_dir, name, services):
+    """Write config/compose/<name>.json with `services`, or remove it when there are none."""
+    path = os.path.join(root_dir, OVERRIDES_DIR, f"{name}.json")
+    if not services:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"services": services}, f, indent=2)
+        f.write("\n")
+
+
+def wait_for(app, service):
+    """Override entries making an app's backend and celery services wait for `service` to be healthy."""
+    return {svc: {"depends_on": {service: {"condition": "service_healthy"}}}
+            for svc in app.get("services", [])
+            if svc == app.get("backend_service") or "-celery" in svc}
+
+
+def _input_files(root_dir):
+    """All files that influence the resolved project."""
+    files = [os.path.join(root_dir, "docker-compose.yml")]
+    files += sorted(glob.glob(os.path.join(root_dir, "services", "*", "compose.yml")))
+    files += _override_files(root_dir)
+    files += [os.path.join(root_dir, ".env"), os.path.join(root_dir, "versions.env")]
+    return files
+
+
+def _env_files(root_dir):
+    """Env files for interpolation. .env comes last so it wins over version pins."""
+    return [p for p in (os.path.join(root_dir, "versions.env"), os.path.join(root_dir, ".env"))
+            if os.path.exists(p)]
+
+
+def input_hash(root_dir):
+    """Content hash of every compose input."""
+    h = hashlib.sha256()
+    for path in _input_files(root_dir):
+        h.update(os.path.relpath(path, root_dir).encode())
+        h.update(b"\0")
+        try:
+            with open(path, "rb") as f:
+                h.update(f.read())
+        except FileNotFoundError:
+            h.update(b"<missing>")
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def base_cmd(root_dir):
+    """Plain compose command that parses the project sources."""
+    cmd = ["docker", "compose", "--project-directory", root_dir,
+           "-f", os.path.join(root_dir, "docker-compose.yml")]
+    for path in _override_files(root_dir):
+        cmd += ["-f", path]
+    for path in _env_files(root_dir):
+        cmd += ["--env-file", path]
+    return cmd
+
+
+class ComposeModel:
+    """A resolved compose project, loaded from the flattened cache file."""
+
+    def __init__(self, root_dir, path, config):
+        self.root_dir = root_dir
+        self.path = path
+        self.config = config
+        self.services = config.get("services", {})
+
+    def cmd(self):
+        """Compose command running against the flattened file."""
+        return ["docker", "compose", "--project-directory", self.root_dir,
+                "-p", self.config.get("name", PROJECT_NAME), "-f", self.path]
+
+    def profiles(self):
+        """All profiles declared by any service."""
+        return {p for svc in self.services.values() for p in svc.get("profiles", [])}
+
+    def service_profiles(self, service):
+        return set(self.services.get(service, {}).get("profiles", []))
+
+    def is_active(self, service, profiles):
+        """Whether a service starts with the given active profiles."""
+        svc_profiles = self.service_profiles(service)
+        return not svc_profiles or bool(svc_profiles & set(profiles))
+
+    def active_services(self, profiles=None):
+        """Services started for `profiles` (default: COMPOSE_PROFILES from .env)."""
+        if profiles is None:
+            profiles = compose_profiles(load_env(self.root_dir))
+        return [name for name in self.services if self.is_active(name, profiles)]
+
+    def services_for_profile(self, profile):
+        return [name for name, svc in self.services.items()
+                if profile in svc.get("profiles", [])]
+
+    def image(self, service):
+        return self.services.get(service, {}).get("image")
+
+    def environment(self, service):
+        env = self.services.get(service, {}).get("environment") or {}
+        if isinstance(env, list):
+            env = dict(item.partition("=")[::2] for item in env)
+        return env
+
+
+def _resolve(root_dir, path):
+    """Run `docker compose config` once and write the flattened file."""
+    env = dict(os.environ)
+    # Resolve every profile so the model can answer queries about disabled
+    # apps too; COMPOSE_PROFILES from .env still filters at run time.
+    env["COMPOSE_PROFILES"] = "*"
+    try:
+        result = subprocess.run(
+            [*base_cmd(root_dir), "config", "--format", "json"],
+            capture_output=True, text=True, env=env,
+        )
+    except FileNotFoundError:
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        config = json.loads(result.stdout)
+    except json.JSONDecodeError:
+        return None
+
+    # Drop stale resolutions before writing the new one
+    for old in glob.glob(os.path.join(os.path.dirname(path), "compose-*.json")):
+        os.remove(old)
+    tmp = path + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(config, f)
+    os.replace(tmp, path)
+    return config
+
+
+def load(root_dir, refresh=False):
+    """Return the ComposeModel for root_dir, resolving it if inputs changed.
+
+    Returns None if the project cannot be resolved (e.g. docker missing).
+    """
+    digest = input_hash(root_dir)
+    if not refresh and (root_dir, digest) in _unresolvable:
+        return None
+    cached = _models.get(root_dir)
+    if cached and not refresh and os.path.basename(cached.path) == f"compose-{digest}.json":
+        return cached
+
+    path = state_path(root_dir, "cache", f"compose-{digest}.json")
+    config = None
+    if not refresh and os.path.exists(path):
+        try:
+            with open(path) as f:
+                config = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            config = None
+    if config is None:
+        config = _resolve(root_dir, path)
+    if config is None:
+        _unresolvable.add((root_dir, digest))
+        return None
+
+    model = ComposeModel(root_dir, path, config)
+    _models[root_dir] = model
+    return model
+
+
+def compose_cmd(root_dir):
+    """Compose command for root_dir: flattened cache if available, else sources."""
+    model = load(root_dir)
+    if model is None:
+        return base_cmd(root_dir)
+    return model.cmd()
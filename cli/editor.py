@@ -0,0 +1,57 @@
+"""Sizing of Drive's document editor (Collabora Online).
+
+The wizard asks for the number of people expected to edit documents at
+the same time (DRIVE_EDITOR_USERS in .env). Collabora's warm process pool,
+threads per document and memory are derived from it and from the host, per
+replica: `./masuite scale collabora=N` splits the editors between N
+replicas, which Caddy keeps sticky per document (lb_policy on WOPISrc).
+"""
+
+import math
+
+SERVICE = "collabora"
+USERS_KEY = "DRIVE_EDITOR_USERS"
+DEFAULT_USERS = 20
+
+# Editors one replica serves comfortably; above this, scale out
+USERS_PER_REPLICA = 50
+# Base memory of coolwsd plus the prespawned kits, and per active editor
+# (a document kit is shared by its editors, each view adds to it)
+BASE_MEMORY_MB = 512
+USER_MEMORY_MB = 60
+
+
+def users(env):
+    """Expected concurrent editors from .env."""
+    try:
+        return max(1, int(env.get(USERS_KEY) or DEFAULT_USERS))
+    except ValueError:
+        return DEFAULT_USERS
+
+
+def recommended_replicas(user_count):
+    return max(1, math.ceil(user_count / USERS_PER_REPLICA))
+
+
+def compute(host, user_count, replicas=1):
+    """Collabora settings for one replica: [(env_key, value, explanation)]."""
+    cpus = host["cpus"]
+    per_replica = math.ceil(user_count / max(1, replicas))
+    where = f"{per_replica} editors" + (f" per replica ({replicas} replicas)" if replicas > 1 else "")
+
+    settings = []
+    prespawn = max(1, min(math.ceil(per_replica / 10), cpus, 8))
+    settings.append(("COLLABORA_PRESPAWN", str(prespawn),
+                     f"warm document processes, one per 10 of {where} (max {min(cpus, 8)}): "
+                     "fast first open"))
+    settings.append(("COLLABORA_MAX_CONCURRENCY", str(max(1, min(cpus // 2, 4))),
+                     "threads per document, half the CPUs (max 4), so one big file can't stall the others"))
+    # All replicas together stay within a third of the host
+    cap = host["ram_mb"] // (3 * max(1, replicas))
+    memory = max(1024, min(BASE_MEMORY_MB + per_replica * USER_MEMORY_MB, cap))
+    settings.append(("COLLABORA_MEMORY", f"{memory}m",
+                     f"{BASE_MEMORY_MB} MB plus {USER_MEMORY_MB} MB for each of {where}, "
+                     "all replicas within 1/3 of RAM (memory limit)"))
+    settings.append(("COLLABORA_MEMPROPORTION", "80",
+                     "% of the memory limit before idle documents are closed, instead of an OOM kill"))
+    return settings
@@ -0,0 +1,73 @@
+""".env loading and CLI state paths shared by all commands."""
+
+import os
+
+# Local CLI state (caches, indexes, offsets). Never read by Docker.
+STATE_DIR = ".masuite"
+
+# COMPOSE_PROFILES entries that switch on optional infrastructure, not apps
+INFRA_PROFILES = {"pgbouncer", "egress", "replica"}
+
+
+def load_env(root_dir):
+    """Load .env file as a dict. Returns an empty dict if it doesn't exist."""
+    env = {}
+    env_path = os.path.join(root_dir, ".env")
+    if not os.path.exists(env_path):
+        return env
+    with open(env_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "=" in line:
+                key, _, value = line.partition("=")
+                env[key.strip()] = value.strip()
+    return env
+
+
+def compose_profiles(env):
+    """Return the set of active compose profiles from an env dict."""
+    return {p.strip() for p in env.get("COMPOSE_PROFILES", "").split(",") if p.strip()}
+
+
+def enabled_apps(env):
+    """Return the set of enabled apps (COMPOSE_PROFILES minus infrastructure)."""
+    return compose_profiles(env) - INFRA_PROFILES
+
+
+def state_path(root_dir, *parts):
+    """Return a path under the CLI state directory, creating parent dirs."""
+    path = os.path.join(root_dir, STATE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    return path
+
+
+def update_env(root_dir, values, header=None):
+    """Set keys in .env in place, appending missing ones (under `header`).
+
+    Other lines, comments and ordering are preserved.
+    """
+    env_path = os.path.join(root_dir, ".env")
+    lines = []
+    if os.path.exists(env_path):
+        with open(env_path) as f:
+            lines = f.read().splitlines()
+
+    remaining = dict(values)
+    for i, line in enumerate(lines):
+        key, sep, _ = line.partition("=")
+        key = key.strip()
+        if sep and not line.lstrip().startswith("#") and key in values:
+            lines[i] = f"{key}={values[key]}"
+            remaining.pop(key, None)
+    if remaining:
+        if lines and lines[-1].strip():
+            lines.append("")
+        if header:
+            lines.append(f"# {header}")
+        lines += [f"{k}={v}" for k, v in remaining.items()]
+
+    with open(env_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.chmod(env_path, 0o600)
@@ -0,0 +1,64 @@
+"""Host resource detection (RAM, CPUs) and app resource budgets."""
+
+import os
+
+
+def _meminfo_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _cgroup_limit_mb():
+    """Memory limit of the current cgroup (v2 or v1), if any."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value) // (1024 * 1024)
+    return None
+
+
+def detect():
+    """Return {"ram_mb", "cpus"} for this host.
+
+    Falls back to a small 4 GB / 2 CPU host when nothing can be read, so
+    generated settings stay conservative.
+    """
+    ram = _meminfo_mb() or 4096
+    limit = _cgroup_limit_mb()
+    if limit:
+        ram = min(ram, limit)
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 2
+    return {"ram_mb": ram, "cpus": cpus}
+
+
+def os_reserve_mb(ram_mb):
+    """Memory left to the OS and page cache outside any container budget."""
+    return max(512, ram_mb // 10)
+
+
+def app_budgets(registry, enabled):
+    """Declared (ram MB, vcpu) budgets of _base and every enabled app."""
+    budgets = {}
+    for svc_id, svc in registry.items():
+        if svc.get("is_infrastructure") or svc_id in enabled:
+            budgets[svc_id] = (svc.get("ram", 0), svc.get("vcpu", 0))
+    return budgets
+
+
+def headroom_mb(host, registry, enabled):
+    """RAM left after the OS reserve and the declared budgets (may be negative)."""
+    declared = sum(ram for ram, _ in app_budgets(registry, enabled).values())
+    return host["ram_mb"] - os_reserve_mb(host["ram_mb"]) - declared
@@ -0,0 +1,257 @@
+"""Docker images of the enabled services: parallel prefetch, offline bundles.
+
+`docker compose pull` fetches images one registry round-trip after the
+other, and `up` does the same for missing ones. `prefetch` pulls the
+images of the enabled profiles on a bounded thread pool instead, then
+builds the local ones (Keycloak). Those have a local-only name and
+`pull_policy: build`, so nothing ever looks them up in a registry; the
+images they are built FROM are pulled like the others.
+
+For hosts with slow or no registry access, `export` writes a bundle of
+the exact images the current pins resolve to (versions.env, .env
+overrides, enabled profiles):
+
+    <bundle>/
+      manifest.json   images, their IDs, the pins and profiles
+      images.tar.gz   one `docker save` of all images: shared layers once
+
+`import` loads it on the target host, where `./masuite start` then finds
+every image locally and neither pulls nor builds.
+"""
+
+import datetime
+import gzip
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+from . import compose
+from . import workers
+from .env import load_env, compose_profiles
+
+MANIFEST = "manifest.json"
+ARCHIVE = "images.tar.gz"
+DEFAULT_WORKERS = 4
+
+
+def _model(root_dir):
+    model = compose.load(root_dir)
+    if model is None:
+        print("Could not resolve the compose project (is Docker running?).")
+        sys.exit(1)
+    return model
+
+
+def _base_images(build):
+    """Images a build's Dockerfile starts FROM, with its ARG defaults and build args applied."""
+    path = os.path.join(build.get("context", "."), build.get("dockerfile", "Dockerfile"))
+    args = dict(build.get("args") or {})
+    stages, bases = set(), set()
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return bases
+    for line in lines:
+        words = [word for word in line.split() if not word.startswith("--")]  # FROM --platform=...
+        if len(words) >= 2 and words[0].upper() == "ARG":
+            name, _, default = words[1].partition("=")
+            args.setdefault(name, default)
+        elif len(words) >= 2 and words[0].upper() == "FROM":
+            image = re.sub(r"\$\{?(\w+)\}?", lambda m: args.get(m.group(1), ""), words[1])
+            if image not in stages and image != "scratch":
+                bases.add(image)
+            if len(words) >= 4 and words[2].upper() == "AS":
+                stages.add(words[3])
+    return bases
+
+
+def resolve(root_dir):
+    """Images of the enabled services: (pulled, built), sorted and deduplicated.
+
+    `pulled` includes the base images of the built ones, so that they can be
+    built offline from an imported bundle.
+    """
+    model = _model(root_dir)
+    pulled, built = set(), set()
+    for service in model.active_services():
+        svc = model.services[service]
+        image = svc.get("image")
+        if not image:
+            continue
+        if svc.get("build"):
+            built.add(image)
+            pulled |= _base_images(svc["build"])
+        else:
+            pulled.add(image)
+    return sorted(pulled - built), sorted(built)
+
+
+def missing(images):
+    """The images of `images` not present locally, with one `docker image inspect`."""
+    if not images:
+        return []
+    result = subprocess.run(["docker", "image", "inspect", "--format", "{{.Id}}", *images],
+                            capture_output=True, text=True)
+    if result.returncode == 0:
+        return []
+    # One "No such image: <ref>" line per missing image, with the ref as given
+    absent = {line.rsplit("No such image: ", 1)[1].strip()
+              for line in result.stderr.splitlines() if "No such image: " in line}
+    found = [image for image in images if image in absent]
+    if not absent or len(found) != len(absent):
+        return list(images)  # another failure, or refs reported differently: assume none is there
+    return found
+
+
+def _build_services(root_dir, images):
+    """Services that build one of `images`."""
+    model = _model(root_dir)
+    return sorted(service for service in model.active_services()
+                  if model.services[service].get("build") and model.services[service].get("image") in images)
+
+
+def _pull(image):
+    def attempt():
+        result = subprocess.run(["docker", "pull", "-q", image], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip()[-200:] or "docker pull failed")
+    start = time.monotonic()
+    workers.retry(attempt, attempts=3, backoff=2)
+    return time.monotonic() - start
+
+
+def prefetch(root_dir, workers_count=DEFAULT_WORKERS, missing_only=False, build=True):
+    """Pull the enabled services' images in parallel, then build local ones.
+
+    Returns False if any image failed.
+    """
+    pulled, built = resolve(root_dir)
+    if missing_only:
+        absent = set(missing(pulled + built))
+        pulled = [image for image in pulled if image in absent]
+        built = [image for image in built if image in absent]
+    ok = True
+    if pulled:
+        total = len(pulled)
+        width = len(str(total))
+        print(f"Pulling {total} image{'s' if total > 1 else ''} ({workers_count} at a time)...")
+        started = time.monotonic()
+        for done, (image, elapsed, error) in enumerate(
+                workers.imap_unordered(_pull, pulled, workers=workers_count), 1):
+            if error:
+                ok = False
+                print(f"  [{done:>{width}}/{total}] {image}  FAILED: {error}")
+            else:
+                print(f"  [{done:>{width}}/{total}] {image}  {elapsed:.1f}s", flush=True)
+        print(f"  done in {time.monotonic() - started:.0f}s")
+    if build and built:
+        print(f"Building {', '.join(built)}...", end=" ", flush=True)
+        result = subprocess.run([*compose.compose_cmd(root_dir), "build", "--pull",
+                                 *_build_services(root_dir, built)], capture_output=True, text=True)
+        if result.returncode == 0:
+            print("done")
+        else:
+            ok = False
+            print(f"FAILED\n  {result.stderr.strip()[-300:]}")
+    return ok
+
+
+def _image_id(image):
+    result = subprocess.run(["docker", "image", "inspect", "--format", "{{.Id}}", image],
+                            capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def _read_pins(root_dir):
+    path = os.path.join(root_dir, "versions.env")
+    pins = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                key, sep, value = line.strip().partition("=")
+                if sep and not key.startswith("#"):
+                    pins[key.strip()] = value.strip()
+    # .env overrides win, as in compose interpolation
+    env = load_env(root_dir)
+    pins.update({k: v for k, v in env.items() if k in pins})
+    return pins
+
+
+def export(root_dir, bundle_dir, workers_count=DEFAULT_WORKERS):
+    """Write an image bundle for the enabled profiles to `bundle_dir`."""
+    if os.path.exists(os.path.join(bundle_dir, MANIFEST)):
+        print(f"{bundle_dir}/ already holds a bundle; remove it or pick another directory.")
+        sys.exit(1)
+    if not prefetch(root_dir, workers_count, missing_only=True):
+        print("Some images are missing, bundle not written.")
+        sys.exit(1)
+
+    pulled, built = resolve(root_dir)
+    images = sorted(pulled + built)
+    os.makedirs(bundle_dir, exist_ok=True)
+    archive = os.path.join(bundle_dir, ARCHIVE)
+    print(f"Saving {len(images)} images to {archive}...", end=" ", flush=True)
+    started = time.monotonic()
+    save = subprocess.Popen(["docker", "save", *images], stdout=subprocess.PIPE)
+    # Fast compression: layers are mostly already-compressed binaries
+    with gzip.open(archive + ".tmp", "wb", compresslevel=1) as f:
+        shutil.copyfileobj(save.stdout, f, 1024 * 1024)
+    if save.wait() != 0:
+        os.remove(archive + ".tmp")
+        print("FAILED")
+        sys.exit(1)
+    os.replace(archive + ".tmp", archive)
+    size_mb = os.path.getsize(archive) / (1024 * 1024)
+    print(f"done ({size_mb:.0f} MB, {time.monotonic() - started:.0f}s)")
+
+    env = load_env(root_dir)
+    manifest = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "profiles": sorted(compose_profiles(env)),
+        "pins": _read_pins(root_dir),
+        "images": {image: _image_id(image) for image in images},
+    }
+    with open(os.path.join(bundle_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    print(f"Bundle written to {bundle_dir}/. On the target host: ./masuite images import {bundle_dir}")
+
+
+def import_bundle(root_dir, bundle_dir):
+    """Load an image bundle written by `export`."""
+    try:
+        with open(os.path.join(bundle_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        print(f"No image bundle in {bundle_dir}/ ({MANIFEST} missing or invalid).")
+        sys.exit(1)
+
+    images = manifest.get("images", {})
+    print(f"Loading {len(images)} images (exported {manifest.get('created', '?')})...", end=" ", flush=True)
+    started = time.monotonic()
+    result = subprocess.run(["docker", "load", "-q", "-i", os.path.join(bundle_dir, ARCHIVE)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"FAILED\n  {result.stderr.strip()[-300:]}")
+        sys.exit(1)
+    print(f"done ({time.monotonic() - started:.0f}s)")
+
+    not_loaded = missing(list(images))
+    if not_loaded:
+        print(f"  Not loaded: {', '.join(not_loaded)}")
+        sys.exit(1)
+
+    # The bundle only helps if this host resolves to the same images
+    if os.path.exists(os.path.join(root_dir, ".env")):
+        pulled, built = resolve(root_dir)
+        needed = [image for image in pulled + built if image not in images]
+        if needed:
+            print("  This host's configuration also uses images the bundle doesn't have:")
+            for image in needed:
+                print(f"    {image}")
+            print("  They will be pulled (or built) on start. Check the app selection and versions.env.")
@@ -0,0 +1,370 @@
+"""Shared Keycloak Admin REST API client (pure stdlib).
+
+One client per CLI process, reused by every command that talks to Keycloak:
+
+- keep-alive HTTP connections, pooled so worker threads can share the client
+- admin token cached on disk and refreshed (refresh_token grant) until it
+  expires, instead of a password grant on every command
+- the Keycloak endpoint (container IP) is discovered once with
+  `docker inspect` and cached; it is re-discovered if it stops answering,
+  or answers as something else (the IP reused by another container after
+  a restart)
+- helpers for server-side filtering and `first`/`max` pagination
+- an optional cap on admin API requests per second, shared by all threads
+"""
+
+import http.client
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+import urllib.parse
+
+from .env import load_env, state_path
+from .workers import RateLimiter
+
+REALM = "masuite"
+KEYCLOAK_CONTAINER = "masuite-keycloak-1"
+
+# Refresh the access token this many seconds before it actually expires
+_TOKEN_LEEWAY = 15
+
+
+class KeycloakError(RuntimeError):
+    """Keycloak API error, carrying the HTTP status code."""
+
+    def __init__(self, status, body):
+        super().__init__(f"Keycloak API error {status}: {body}")
+        self.status = status
+        self.body = body
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _inspect_keycloak_ip():
+    """Container IP of the Keycloak service, or None."""
+    try:
+        result = subprocess.run(
+            ["docker", "inspect", "-f",
+             "{{range .NetworkSettings.Networks}}{{.IPAddress}}{{end}}",
+             KEYCLOAK_CONTAINER],
+            capture_output=True, text=True, timeout=5,
+        )
+        ip = result.stdout.strip()
+        if result.returncode == 0 and ip:
+            return ip
+    except Exception:
+        pass
+    return None
+
+
+def discover_url(root_dir, env=None, refresh=False):
+    """Get a URL to reach Keycloak from the host.
+
+    Prefers the container IP: in prod mode the external URL may not work yet
+    (certs not issued). The result is cached in .masuite/cache/keycloak.json.
+    """
+    cache_path = state_path(root_dir, "cache", "keycloak.json")
+    if not refresh:
+        cached = _read_json(cache_path)
+        if cached and cached.get("url"):
+            return cached["url"]
+
+    ip = _inspect_keycloak_ip()
+    if ip:
+        url = f"http://{ip}:8080"
+    else:
+        env = env if env is not None else load_env(root_dir)
+        url = env.get("KEYCLOAK_URL", "http://localhost:9200")
+    _write_json(cache_path, {"url": url, "discovered_at": int(time.time())})
+    return url
+
+
+class _ConnectionPool:
+    """A small LIFO pool of keep-alive HTTP(S) connections to one host."""
+
+    def __init__(self, base_url, size=8, timeout=30):
+        parts = urllib.parse.urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _new(self):
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request, returning (status, body bytes, Content-Type).
+
+        Retries once on a fresh connection if a pooled one was closed by
+        the server while idle.
+        """
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn = self._new()
+                reused = False
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                    BrokenPipeError, ConnectionResetError):
+                conn.close()
+                if not reused:
+                    raise
+                conn = self._new()
+                conn.request(method, self.prefix + path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+            except Exception:
+                conn.close()
+                raise
+            data = resp.read()
+            if resp.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+            return resp.status, data, resp.getheader("Content-Type", "")
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class KeycloakAdmin:
+    """Keycloak Admin API client with pooled connections and a cached token."""
+
+    def __init__(self, base_url, admin_user, admin_password, realm=REALM,
+                 token_cache=None, rediscover=None, pool_size=8, limiter=None):
+        self.base_url = base_url
+        self.admin_user = admin_user
+        self.admin_password = admin_password
+        self.realm = realm
+        self.token_cache = token_cache
+        self._rediscover = rediscover
+        self._limiter = limiter
+        self._pool = _ConnectionPool(base_url, size=pool_size)
+        self._pool_size = pool_size
+        self._token = None
+        self._token_lock = threading.Lock()
+        self._group_ids = {}
+
+    # ── Token handling ────────────────────────────────────────────────
+
+    def _load_cached_token(self):
+        if not self.token_cache:
+            return None
+        cached = _read_json(self.token_cache)
+        if cached and cached.get("user") == self.admin_user:
+            return cached
+        return None
+
+    def _store_token(self, body):
+        now = time.time()
+        token = {
+            "user": self.admin_user,
+            "access_token": body["access_token"],
+            "expires_at": now + body.get("expires_in", 60),
+            "refresh_token": body.get("refresh_token"),
+            "refresh_expires_at": now + body.get("refresh_expires_in", 0),
+        }
+        self._token = token
+        if self.token_cache:
+            _write_json(self.token_cache, token)
+        return token
+
+    def _token_request(self, fields):
+        data = urllib.parse.urlencode({"client_id": "admin-cli", **fields}).encode()
+        status, body = self._send(
+            "POST", "/realms/master/protocol/openid-connect/token", data,
+            {"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        if status != 200:
+            raise KeycloakError(status, body.decode(errors="replace"))
+        return json.loads(body)
+
+    def token(self, force=False):
+        """Return a valid admin access token, refreshing it if needed."""
+        with self._token_lock:
+            now = time.time()
+            token = None if force else (self._token or self._load_cached_token())
+            if token and token["expires_at"] - _TOKEN_LEEWAY > now:
+                self._token = token
+                return token["access_token"]
+
+            if token and token.get("refresh_token") and token["refresh_expires_at"] - _TOKEN_LEEWAY > now:
+                try:
+                    body = self._token_request({
+                        "grant_type": "refresh_token",
+                        "refresh_token": token["refresh_token"],
+                    })
+                    return self._store_token(body)["access_token"]
+                except KeycloakError:
+                    pass  # Session expired server-side, fall back to password grant
+
+            body = self._token_request({
+                "grant_type": "password",
+                "username": self.admin_user,
+                "password": self.admin_password,
+            })
+            return self._store_token(body)["access_token"]
+
+    # ── Requests ──────────────────────────────────────────────────────
+
+    def _send(self, method, path, body=None, headers=None):
+        """Send a raw request, re-discovering the endpoint once if it isn't Keycloak's."""
+        try:
+            status, data, content_type = self._pool.request(method, path, body, headers)
+        except OSError:
+            if not self._moved():
+                raise
+        else:
+            # Keycloak answers JSON or nothing; anything else is whatever
+            # got the cached IP after a restart
+            if not data or content_type.startswith("application/json") or not self._moved():
+                return status, data
+        status, data, _ = self._pool.request(method, path, body, headers)
+        return status, data
+
+    def _moved(self):
+        """Re-discover the endpoint (once per client). True if it changed."""
+        if not self._rediscover:
+            return False
+        url = self._rediscover()
+        self._rediscover = None
+        if url == self.base_url:
+            return False
+        self._pool.close()
+        self.base_url = url
+        self._pool = _ConnectionPool(url, size=self._pool_size)
+        return True
+
+    def request(self, method, path, data=None, params=None):
+        """Authenticated request to /admin/realms/<realm><path>. Returns parsed JSON or None."""
+        url = f"/admin/realms/{self.realm}{path}"
+        if params:
+            query = {k: v for k, v in params.items() if v is not None}
+            if query:
+                url += ("&" if "?" in url else "?") + urllib.parse.urlencode(query)
+        body = json.dumps(data).encode() if data is not None else None
+
+        for attempt in range(2):
+            if self._limiter:
+                self._limiter.acquire()
+            headers = {
+                "Authorization": f"Bearer {self.token(force=attempt > 0)}",
+                "Content-Type": "application/json",
+            }
+            status, raw = self._send(method, url, body, headers)
+            if status == 401 and attempt == 0:
+                continue  # Token revoked or expired early, retry with a fresh one
+            break
+
+        if status >= 400:
+            raise KeycloakError(status, raw.decode(errors="replace"))
+        if status in (201, 204) or not raw:
+            return None
+        return json.loads(raw)
+
+    def get(self, path, **params):
+        return self.request("GET", path, params=params)
+
+    def post(self, path, data):
+        return self.request("POST", path, data=data)
+
+    def put(self, path, data):
+        return self.request("PUT", path, data=data)
+
+    def delete(self, path):
+        return self.request("DELETE", path)
+
+    def paginate(self, path, page_size=100, **params):
+        """Yield items from a list endpoint, fetching `first`/`max` pages lazily."""
+        first = 0
+        while True:
+            page = self.request("GET", path, params={**params, "first": first, "max": page_size})
+            if not page:
+                return
+            yield from page
+            if len(page) < page_size:
+                return
+            first += len(page)
+
+    # ── Common lookups ────────────────────────────────────────────────
+
+    def find_client(self, client_id):
+        """Return the client with the given clientId, filtered server-side."""
+        clients = self.get("/clients", clientId=client_id)
+        return next((c for c in clients or [] if c["clientId"] == client_id), None)
+
+    def find_user(self, username):
+        """Return the user with the exact username, or None."""
+        users = self.get("/users", username=username, exact="true")
+        return users[0] if users else None
+
+    def update_user(self, user_id, fields, current=None):
+        """Update some fields of a user, PUTting its full representation with `fields` merged.
+
+        Partial representations are risky under the declarative user profile,
+        so the current one is fetched unless given.
+        """
+        if current is None:
+            current = self.get(f"/users/{user_id}")
+        self.put(f"/users/{user_id}", {**current, **fields})
+
+    def group_id(self, path):
+        """Return the id of the group at `path` (e.g. /maildomain-example.com), cached."""
+        if not path.startswith("/"):
+            path = "/" + path
+        if path not in self._group_ids:
+            group = self.get(f"/group-by-path/{urllib.parse.quote(path.lstrip('/'))}")
+            self._group_ids[path] = group["id"]
+        return self._group_ids[path]
+
+    def close(self):
+        self._pool.close()
+
+
+def connect(root_dir, env=None, refresh=False, pool_size=8, rate=None):
+    """Build a KeycloakAdmin for this MaSuite install from .env.
+
+    `rate` caps admin API requests per second. Returns None if
+    KEYCLOAK_ADMIN_PASSWORD is not configured.
+    """
+    env = env if env is not None else load_env(root_dir)
+    admin_password = env.get("KEYCLOAK_ADMIN_PASSWORD")
+    if not admin_password:
+        return None
+    return KeycloakAdmin(
+        discover_url(root_dir, env, refresh=refresh),
+        env.get("KEYCLOAK_ADMIN_USER", "admin"),
+        admin_password,
+        token_cache=state_path(root_dir, "cache", "keycloak-token.json"),
+        rediscover=lambda: discover_url(root_dir, env, refresh=True),
+        pool_size=pool_size,
+        limiter=RateLimiter(rate) if rate else None,
+    )
@@ -9,64 +9,19 @@ only handles the two dynamic parts: the client secret and the redirect URIs
 (which depend on the deployment mode and domain).
 """
 
-import json
 import time
-import urllib.error
-import urllib.parse
 import urllib.request
 
-
-def _load_env(root_dir):
-    """Load .env file as a dict."""
-    import os
-    env = {}
-    env_path = os.path.join(root_dir, ".env")
-    with open(env_path) as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "=" in line:
-                key, _, value = line.partition("=")
-                env[key.strip()] = value.strip()
-    return env
-
-
-def _get_admin_token(kc_url, admin_user, admin_password):
-    """Get an admin access token from Keycloak."""
-    data = urllib.parse.urlencode({
-        "grant_type": "password",
-        "client_id": "admin-cli",
-        "username": admin_user,
-        "password": admin_password,
-    }).encode()
-    req = urllib.request.Request(
-        f"{kc_url}/realms/master/protocol/openid-connect/token",
-        data=data,
-    )
-    req.add_header("Content-Type", "application/x-www-form-urlencoded")
-    with urllib.request.urlopen(req) as resp:
-        return json.loads(resp.read())["access_token"]
-
-
-def _api(kc_url, path, token, method="GET", data=None):
-    """Keycloak Admin API request."""
-    url = f"{kc_url}/admin/realms/masuite{path}"
-    body = json.dumps(data).encode() if data else None
-    req = urllib.request.Request(url, data=body, method=method)
-    req.add_header("Authorization", f"Bearer {token}")
-    req.add_header("Content-Type", "application/json")
-    try:
-        with urllib.request.urlopen(req) as resp:
-            raw = resp.read()
-            return json.loads(raw) if raw else None
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode()
-        raise RuntimeError(f"Keycloak API {e.code}: {error_body}") from e
+from . import keycloak
+from .env import load_env
 
 
 def _wait_for_keycloak(kc_url, timeout=120):
-    """Wait for Keycloak to be ready."""
+    """Wait for Keycloak to be ready.
+
+    The optimized image is up in a few seconds: poll often so we don't
+    sleep past it.
+    """
     deadline = time.time() + timeout
     while time.time() < deadline:
         try:
@@ -74,44 +29,17 @@ def _wait_for_keycloak(kc_url, timeout=120):
             urllib.request.urlopen(req, timeout=5)
             return True
         except Exception:
-            time.sleep(2)
+            time.sleep(0.5)
     return False
 
 
-def _get_keycloak_internal_url(root_dir):
-    """Get a URL to reach Keycloak from the host.
-
-    In prod mode, the external URL (https://auth.domain) may not work yet
-    (certs not issued), so we find the container IP and connect directly.
-    """
-    import subprocess
-    try:
-        result = subprocess.run(
-            ["docker", "inspect", "-f",
-             "{{range .NetworkSettings.Networks}}{{.IPAddress}}{{end}}",
-             "masuite-keycloak-1"],
-            capture_output=True, text=True, timeout=5,
-        )
-        ip = result.stdout.strip()
-        if result.returncode == 0 and ip:
-            return f"http://{ip}:8080"
-    except Exception:
-        pass
-    return None
-
-
 def configure(root_dir):
     """Set the Keycloak OIDC client secret and redirect URIs after startup."""
-    env = _load_env(root_dir)
-    admin_user = env.get("KEYCLOAK_ADMIN_USER", "admin")
-    admin_password = env.get("KEYCLOAK_ADMIN_PASSWORD", "")
-
-    # Try internal Docker URL first, fall back to external
-    kc_url = _get_keycloak_internal_url(root_dir)
-    if not kc_url:
-        kc_url = env.get("KEYCLOAK_URL", "http://localhost:9200")
+    env = load_env(root_dir)
 
-    if not admin_password:
+    # Containers were just (re)created, so the cached Keycloak IP may be stale
+    admin = keycloak.connect(root_dir, env, refresh=True)
+    if not admin:
         return
 
     secret = env.get("SHARED_OIDC_CLIENT_SECRET", "")
@@ -133,29 +61,28 @@ def configure(root_dir):
     print("Configuring Keycloak...", end=" ", flush=True)
 
     # Wait for Keycloak
-    if not _wait_for_keycloak(kc_url):
+    if not _wait_for_keycloak(admin.base_url):
         print("FAILED (Keycloak not ready)")
         return
 
     try:
-        token = _get_admin_token(kc_url, admin_user, admin_password)
+        admin.token()
     except Exception:
         # Keycloak may still be importing realm, retry
         time.sleep(5)
         try:
-            token = _get_admin_token(kc_url, admin_user, admin_password)
+            admin.token(force=True)
         except Exception as e:
             print(f"FAILED ({e})")
             return
 
-    # Find the masuite client
-    clients = _api(kc_url, "/clients", token)
-    client = next((c for c in clients if c["clientId"] == "masuite"), None)
+    # Find the masuite client (filtered server-side)
+    client = admin.find_client("masuite")
 
     if not client:
         # Client should exist from realm import, but create if missing
         try:
-            _api(kc_url, "/clients", token, method="POST", data={
+            admin.post("/clients", {
                 "clientId": "masuite",
                 "name": "MaSuite",
                 "enabled": True,
@@ -175,7 +102,7 @@ def configure(root_dir):
             })
             print("done (created client)")
             return
-        except RuntimeError as e:
+        except keycloak.KeycloakError as e:
             print(f"FAILED (could not create client: {e})")
             return
 
@@ -202,8 +129,8 @@ def configure(root_dir):
 
     if needs_update:
         try:
-            _api(kc_url, f"/clients/{client['id']}", token, method="PUT", data=client)
-        except RuntimeError:
+            admin.put(f"/clients/{client['id']}", client)
+        except keycloak.KeycloakError:
             pass  # Best effort
 
     print("done")
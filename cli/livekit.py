@@ -0,0 +1,162 @@
+"""LiveKit (Meet media server) and egress configuration.
+
+config/livekit/livekit.yaml and config/livekit/egress.yaml are generated
+from .env by setup and `./masuite tune`:
+
+- LIVEKIT_NODE_IP: public IP announced to clients (empty: discovered via
+  STUN, which fails behind some NATs);
+- LIVEKIT_UDP_PORTS: a single port ("7882", all media muxed on it) or a
+  range ("50000-50200", one port per participant, spreads load across
+  CPU cores but needs the range opened and published);
+- LIVEKIT_BANDWIDTH_MBPS: the host's upload bandwidth, LiveKit stops
+  accepting participants at 80% of it instead of degrading every call;
+- LIVEKIT_MAX_PARTICIPANTS / LIVEKIT_NUM_TRACKS: computed from host cores
+  (cli/tuning.py).
+
+Egress (call recordings) is optional infrastructure, COMPOSE_PROFILES
+"egress". Each room recording runs a headless Chrome: the number of
+concurrent recordings is sized from host cores and egress refuses more.
+"""
+
+import os
+
+from .env import compose_profiles
+
+PROFILE = "egress"
+CONFIG_DIR = os.path.join("config", "livekit")
+
+# Participants one core forwards with simulcast and dynacast (720p publishers)
+PARTICIPANTS_PER_CORE = 25
+# Tracks per participant: camera, microphone, screen share
+TRACKS_PER_PARTICIPANT = 3
+MAX_ROOM_PARTICIPANTS = 100
+
+DEFAULT_UDP_PORTS = "7882"
+DEFAULT_BANDWIDTH_MBPS = 1000
+
+# Cores and memory one room-composite recording uses (Chrome + encoder)
+RECORDING_CPUS = 2
+RECORDING_MEMORY_MB = 1024
+
+
+def compute(host):
+    """LiveKit and egress capacity for this host: [(env_key, value, explanation)]."""
+    cpus = host["cpus"]
+    capacity = cpus * PARTICIPANTS_PER_CORE
+    settings = [
+        ("LIVEKIT_MAX_PARTICIPANTS", str(min(capacity, MAX_ROOM_PARTICIPANTS)),
+         f"per call: {PARTICIPANTS_PER_CORE} participants per core ({cpus}), max {MAX_ROOM_PARTICIPANTS}"),
+        ("LIVEKIT_NUM_TRACKS", str(capacity * TRACKS_PER_PARTICIPANT),
+         f"all calls: {capacity} participants x {TRACKS_PER_PARTICIPANT} tracks, new tracks refused above"),
+    ]
+    recordings = max(1, cpus // 2 // RECORDING_CPUS)
+    settings.append(("LIVEKIT_EGRESS_RECORDINGS", str(recordings),
+                     f"concurrent recordings (if egress is enabled): half the cores, "
+                     f"{RECORDING_CPUS} per recording"))
+    settings.append(("LIVEKIT_EGRESS_MEMORY", f"{512 + recordings * RECORDING_MEMORY_MB}m",
+                     f"512 MB plus {RECORDING_MEMORY_MB} MB per recording (memory limit)"))
+    return settings
+
+
+def _int(env, key, default):
+    try:
+        return int(env.get(key) or default)
+    except ValueError:
+        return default
+
+
+def generate_config(env):
+    """Generate livekit.yaml with actual secret values (not templates)."""
+    node_ip = env.get("LIVEKIT_NODE_IP", "")
+    udp_ports = env.get("LIVEKIT_UDP_PORTS") or DEFAULT_UDP_PORTS
+    bandwidth = _int(env, "LIVEKIT_BANDWIDTH_MBPS", DEFAULT_BANDWIDTH_MBPS)
+
+    lines = [
+        "port: 7880",
+        "rtc:",
+        "  tcp_port: 7881",
+    ]
+    start, sep, end = udp_ports.partition("-")
+    if sep:
+        lines += [f"  port_range_start: {start}", f"  port_range_end: {end}"]
+    else:
+        lines.append(f"  udp_port: {udp_ports}")
+    if node_ip:
+        lines += [f"  node_ip: {node_ip}", "  use_external_ip: false"]
+    else:
+        lines.append("  use_external_ip: true")
+    lines += [
+        # Lower subscribers' layers (then pause video) when their link is
+        # congested, rather than letting every stream stall
+        "  congestion_control:",
+        "    enabled: true",
+        "    allow_pause: true",
+        "room:",
+        f"  max_participants: {_int(env, 'LIVEKIT_MAX_PARTICIPANTS', MAX_ROOM_PARTICIPANTS)}",
+        "  empty_timeout: 300",
+        # Simulcast-capable codecs only: the SFU forwards each subscriber
+        # the layer it can take instead of transcoding
+        "  enabled_codecs:",
+        "    - mime: audio/opus",
+        "    - mime: audio/red",
+        "    - mime: video/vp8",
+        "    - mime: video/h264",
+        "limit:",
+        f"  num_tracks: {_int(env, 'LIVEKIT_NUM_TRACKS', -1)}",
+        f"  bytes_per_sec: {bandwidth * 1_000_000 // 8 * 4 // 5}",
+        "redis:",
+        "  address: redis:6379",
+        f"  password: {env.get('REDIS_PASSWORD', '')}",
+        "  db: 6",
+        "keys:",
+        f"  {env.get('LIVEKIT_API_KEY', '')}: {env.get('LIVEKIT_API_SECRET', '')}",
+        "logging:",
+        "  level: info",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def generate_egress_config(env, host):
+    """Generate egress.yaml; recordings are stored in Meet's bucket."""
+    recordings = max(1, _int(env, "LIVEKIT_EGRESS_RECORDINGS", 1))
+    # Egress admits a recording while its cost fits under max_cpu_utilization
+    # of the host's cores: price recordings so only `recordings` fit
+    cost = round(host["cpus"] * 0.8 / recordings, 2)
+    lines = [
+        f"api_key: {env.get('LIVEKIT_API_KEY', '')}",
+        f"api_secret: {env.get('LIVEKIT_API_SECRET', '')}",
+        "ws_url: ws://livekit:7880",
+        "health_port: 8080",
+        "log_level: info",
+        "redis:",
+        "  address: redis:6379",
+        f"  password: {env.get('REDIS_PASSWORD', '')}",
+        "  db: 6",
+        "cpu_cost:",
+        "  max_cpu_utilization: 0.8",
+        f"  room_composite_cpu_cost: {cost}",
+        f"  web_cpu_cost: {cost}",
+        f"  track_composite_cpu_cost: {round(cost / 2, 2)}",
+        f"  track_cpu_cost: {round(cost / 4, 2)}",
+        "s3:",
+        f"  access_key: {env.get('RUSTFS_ACCESS_KEY', '')}",
+        f"  secret: {env.get('RUSTFS_SECRET_KEY', '')}",
+        "  endpoint: http://rustfs:9000",
+        "  region: us-east-1",
+        "  bucket: meet-storage",
+        "  force_path_style: true",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def write(root_dir, env, host):
+    """Write livekit.yaml, and egress.yaml when the egress profile is on."""
+    path = os.path.join(root_dir, CONFIG_DIR)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "livekit.yaml"), "w") as f:
+        f.write(generate_config(env))
+    if PROFILE in compose_profiles(env):
+        with open(os.path.join(path, "egress.yaml"), "w") as f:
+            f.write(generate_egress_config(env, host))
@@ -0,0 +1,178 @@
+"""Structured log queries across services (`./masuite logs --grep/--level/...`).
+
+Every matching container's log is read by its own `docker logs
+--timestamps` process and reader thread. Lines are parsed (JSON logs,
+Python/Django/celery, Keycloak and Postgres text formats) and filtered
+in the reader, so only matches are queued. The per-container streams,
+each already in time order, are merged with a heap merge on docker's
+fixed-width RFC 3339 timestamps (plain string comparison). Output starts
+as soon as every stream has a first match (or has ended), and memory
+stays bounded by the queues, whatever the time range.
+
+Continuation lines (tracebacks, indented lines) inherit the level of the
+line they follow, so `--level error` keeps whole tracebacks.
+"""
+
+import heapq
+import json
+import queue
+import re
+import subprocess
+import sys
+import threading
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40, "critical": 50}
+_ALIASES = {
+    "trace": "debug", "notice": "info", "log": "info", "warn": "warning",
+    "err": "error", "fatal": "critical", "panic": "critical", "crit": "critical",
+}
+# A level word near the start of a text line: "[INFO]", "ERROR:", ": WARNING/",
+# "INFO  [org.keycloak...]" (Keycloak), "LOG:  " / "FATAL:  " (Postgres)
+_TEXT_LEVEL = re.compile(
+    r"(?<![\w-])(TRACE|DEBUG|INFO|NOTICE|LOG|WARNING|WARN|ERROR|ERR|CRITICAL|CRIT|FATAL|PANIC)(?![\w-])",
+    re.IGNORECASE,
+)
+_LEVEL_SCAN = 64
+_JSON_LEVEL_KEYS = ("level", "levelname", "severity", "log.level", "lvl")
+_JSON_MESSAGE_KEYS = ("message", "msg", "event", "log")
+
+# Matches queued per container before its reader waits for the merge
+QUEUE_SIZE = 2000
+_DONE = object()
+
+
+def normalize_level(value):
+    value = str(value or "").strip().lower()
+    value = _ALIASES.get(value, value)
+    return value if value in LEVELS else None
+
+
+def parse(line):
+    """Parse one log line (timestamp prefix removed) into (level, message, fields)."""
+    stripped = line.strip()
+    if stripped.startswith("{"):
+        try:
+            data = json.loads(stripped)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            level = next((normalize_level(data[k]) for k in _JSON_LEVEL_KEYS if k in data), None)
+            message = next((str(data[k]) for k in _JSON_MESSAGE_KEYS if k in data), stripped)
+            return level, message, data
+    # Only trust level words at the start, not anywhere in a message
+    match = _TEXT_LEVEL.search(line[:_LEVEL_SCAN])
+    if match:
+        # Lowercase words count only at the very start or in brackets:
+        # "info" inside free text is too common to be a level
+        word = match.group(1)
+        if word.isupper() or line[max(0, match.start() - 1):match.start()] in "[<":
+            return normalize_level(word), line, None
+    return None, line, None
+
+
+def _is_continuation(line):
+    return line[:1] in (" ", "\t") or line.startswith(("Traceback", "During handling", "The above exception"))
+
+
+class Query:
+    """Filters applied while streaming."""
+
+    def __init__(self, grep=None, ignore_case=False, level=None):
+        self.pattern = re.compile(grep, re.IGNORECASE if ignore_case else 0) if grep else None
+        self.min_level = LEVELS[level] if level else None
+
+    def matches(self, record):
+        if self.min_level is not None and LEVELS.get(record["level"] or "info", 20) < self.min_level:
+            return False
+        if self.pattern is not None and not self.pattern.search(record["message"]):
+            return False
+        return True
+
+
+def _read(container, service, since, query, out):
+    """Reader thread: parse and filter one container's log into `out`."""
+    cmd = ["docker", "logs", "--timestamps", container]
+    if since:
+        cmd[2:2] = ["--since", since]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True, errors="replace", bufsize=1024 * 1024)
+    last_level = None
+    try:
+        for raw in proc.stdout:
+            timestamp, _, line = raw.rstrip("\n").partition(" ")
+            level, message, fields = parse(line)
+            if level is None and _is_continuation(line):
+                level = last_level
+            else:
+                last_level = level
+            record = {"time": timestamp, "service": service, "container": container,
+                      "level": level, "message": message}
+            if fields:
+                record["fields"] = fields
+            if query.matches(record):
+                out.put(record)
+    finally:
+        proc.stdout.close()
+        proc.wait()
+        out.put(_DONE)
+
+
+def _drain(q):
+    while True:
+        item = q.get()
+        if item is _DONE:
+            return
+        yield item
+
+
+def containers(compose_cmd, services):
+    """[(container, service)] of the given services, replicas included."""
+    result = subprocess.run([*compose_cmd, "ps", "-a", "--format", "json", *services],
+                            capture_output=True, text=True)
+    found = []
+    for line in result.stdout.strip().splitlines():
+        try:
+            c = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        found.append((c.get("Name", ""), c.get("Service", "")))
+    return sorted(found)
+
+
+def query(compose_cmd, services, since=None, grep=None, ignore_case=False, level=None):
+    """Yield matching records of `services`, merged in timestamp order."""
+    flt = Query(grep, ignore_case, level)
+    streams = []
+    for container, service in containers(compose_cmd, services):
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        threading.Thread(target=_read, args=(container, service, since, flt, q),
+                         daemon=True).start()
+        streams.append(_drain(q))
+    return heapq.merge(*streams, key=lambda record: record["time"])
+
+
+def _format(record, width):
+    time = record["time"][:23].replace("T", " ")
+    level = (record["level"] or "-").upper()
+    return f"{time} {record['service']:<{width}} {level:<8} {record['message']}"
+
+
+def run(compose_cmd, services, since=None, grep=None, ignore_case=False, level=None, as_json=False):
+    """Print matching log records of `services`."""
+    width = max((len(s) for s in services), default=10)
+    count = 0
+    try:
+        for record in query(compose_cmd, services, since, grep, ignore_case, level):
+            count += 1
+            if as_json:
+                print(json.dumps(record))
+            else:
+                print(_format(record, width))
+    except BrokenPipeError:
+        # Output piped to head/less that exited
+        sys.stderr.close()
+        return
+    except KeyboardInterrupt:
+        return
+    if not as_json:
+        print(f"-- {count} line{'s' if count != 1 else ''} from {len(services)} services", file=sys.stderr)
@@ -0,0 +1,160 @@
+"""Optional PgBouncer in front of the shared PostgreSQL.
+
+Enabled by the `pgbouncer` compose profile. Apps then connect to
+pgbouncer:6432 (APP_DB_HOST/APP_DB_PORT in .env) instead of postgres:5432,
+and PostgreSQL only sees the pooled server connections.
+
+Every app database gets its own pool. Apps use transaction pooling unless
+their metadata.json sets "db_pool_mode": "session" (apps relying on
+session state: advisory locks, LISTEN/NOTIFY, session-level SET).
+Keycloak keeps its direct JDBC connection, and migrations bypass the pool.
+Databases on a dedicated instance (cli/postgres.py) are routed to it.
+"""
+
+import csv
+import io
+import os
+import subprocess
+
+from . import postgres
+from . import tuning
+
+SERVICE = "pgbouncer"
+PORT = 6432
+CONFIG_DIR = os.path.join("config", "pgbouncer")
+# Inside the container only: the password never lands in a file on the host
+AUTH_FILE = "/tmp/userlist.txt"
+
+# Server connections per app database
+DJANGO_POOL_SIZE = 10
+OTHER_POOL_SIZE = 5
+RESERVE_POOL_SIZE = 3
+
+
+def direct_db_env(env, app_id):
+    """Environment for commands that must reach PostgreSQL directly (migrations)."""
+    host = postgres.instance(app_id, postgres.dedicated(env))
+    return ["-e", f"DB_HOST={host}", "-e", f"DB_PORT={postgres.PORT}"]
+
+
+def pool_mode(app):
+    return app.get("db_pool_mode", "transaction")
+
+
+def pools(registry, enabled):
+    """Return {db_name: {"pool_size", "pool_mode", "clients"}} for enabled apps."""
+    result = {}
+    for app_id in sorted(enabled):
+        app = registry.get(app_id)
+        if not app or app.get("is_infrastructure"):
+            continue
+        clients = (tuning.DJANGO_APP_CONNECTIONS if app.get("is_django")
+                   else tuning.OTHER_APP_CONNECTIONS)
+        mode = pool_mode(app)
+        if mode == "session":
+            # A session holds its server connection: size for every client
+            size = clients
+        else:
+            size = DJANGO_POOL_SIZE if app.get("is_django") else OTHER_POOL_SIZE
+        result[f"{app_id}_db"] = {"pool_size": size, "pool_mode": mode, "clients": clients}
+    return result
+
+
+def server_connections(registry, enabled):
+    """Upper bound of PostgreSQL connections opened by PgBouncer."""
+    return sum(p["pool_size"] + RESERVE_POOL_SIZE for p in pools(registry, enabled).values())
+
+
+def generate_config(env_values, registry, enabled):
+    """Return the pgbouncer.ini contents."""
+    db_user = env_values.get("SHARED_DB_USER", "masuite_app")
+    app_pools = pools(registry, enabled)
+    dedicated = postgres.dedicated(env_values)
+    max_clients = max(200, 4 * sum(p["clients"] for p in app_pools.values()))
+
+    lines = ["[databases]"]
+    for db_name, pool in app_pools.items():
+        host = postgres.instance(db_name[:-len("_db")], dedicated)
+        lines.append(
+            f"{db_name} = host={host} port={postgres.PORT} dbname={db_name} "
+            f"pool_size={pool['pool_size']} pool_mode={pool['pool_mode']} "
+            f"max_db_connections={pool['pool_size'] + RESERVE_POOL_SIZE}"
+        )
+    lines += [
+        "",
+        "[pgbouncer]",
+        "listen_addr = 0.0.0.0",
+        f"listen_port = {PORT}",
+        "auth_type = scram-sha-256",
+        # Written at container start from the environment (services/_base/compose.yml)
+        f"auth_file = {AUTH_FILE}",
+        # SHOW commands for status; no admin console (PAUSE, SHUTDOWN, KILL)
+        f"stats_users = {db_user}",
+        "pool_mode = transaction",
+        f"max_client_conn = {max_clients}",
+        f"default_pool_size = {OTHER_POOL_SIZE}",
+        f"reserve_pool_size = {RESERVE_POOL_SIZE}",
+        "reserve_pool_timeout = 3",
+        "server_idle_timeout = 300",
+        "server_reset_query = DISCARD ALL",
+        # Protocol-level prepared statements (psycopg 3, node-postgres) in transaction mode
+        "max_prepared_statements = 200",
+        "ignore_startup_parameters = extra_float_digits,options",
+        "log_connections = 0",
+        "log_disconnections = 0",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def write(root_dir, env_values, registry, enabled):
+    """Write config/pgbouncer/pgbouncer.ini."""
+    config_dir = os.path.join(root_dir, CONFIG_DIR)
+    os.makedirs(config_dir, exist_ok=True)
+    with open(os.path.join(config_dir, "pgbouncer.ini"), "w") as f:
+        f.write(generate_config(env_values, registry, enabled))
+    # The plaintext password file of earlier versions, now unused
+    try:
+        os.remove(os.path.join(config_dir, "userlist.txt"))
+    except FileNotFoundError:
+        pass
+
+
+def _admin_query(compose_cmd, env, query):
+    """Run a PgBouncer admin console query from the postgres container."""
+    result = subprocess.run(
+        [*compose_cmd, "exec", "-T", "-e", f"PGPASSWORD={env.get('SHARED_DB_PASSWORD', '')}",
+         "postgres", "psql", "-h", SERVICE, "-p", str(PORT),
+         "-U", env.get("SHARED_DB_USER", "masuite_app"), "--csv", "-c", query, "pgbouncer"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return None
+    return list(csv.DictReader(io.StringIO(result.stdout)))
+
+
+def pool_stats(compose_cmd, env):
+    """Return [{database, mode, size, cl_active, cl_waiting, sv_active, sv_idle, maxwait}].
+
+    None if PgBouncer can't be reached.
+    """
+    pools_rows = _admin_query(compose_cmd, env, "SHOW POOLS")
+    databases = _admin_query(compose_cmd, env, "SHOW DATABASES")
+    if pools_rows is None or databases is None:
+        return None
+    sizes = {row["name"]: int(row.get("pool_size") or 0) for row in databases}
+    stats = []
+    for row in pools_rows:
+        if row["database"] == "pgbouncer":
+            continue
+        stats.append({
+            "database": row["database"],
+            "mode": row.get("pool_mode", ""),
+            "size": sizes.get(row["database"], 0),
+            "cl_active": int(row["cl_active"]),
+            "cl_waiting": int(row["cl_waiting"]),
+            "sv_active": int(row["sv_active"]),
+            "sv_idle": int(row["sv_idle"]),
+            "maxwait": int(row.get("maxwait") or 0),
+        })
+    return stats
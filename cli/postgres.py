@@ -0,0 +1,314 @@
+"""Shared and per-app PostgreSQL instances.
+
+App databases live in the shared `postgres` service, unless the app is
+listed in PG_DEDICATED_APPS: it then gets its own `postgres-<app>`
+instance, with its own tuning (`<APP>_PG_*` in .env, sized from the app's
+`ram` budget) and data directory (data/postgres-<app>). Instances are
+generated as a compose override, config/compose/postgres.json, and created
+by the same init script as the shared one.
+
+Apps find their database through `<APP>_DB_HOST`/`<APP>_DB_PORT`; with
+PgBouncer on, they keep connecting to PgBouncer, which routes each
+database to its instance.
+
+`./masuite db move <app>` moves an existing database onto a dedicated
+instance with logical replication: the data is copied and kept in sync
+while the app runs, and the app only stops for the final catch-up,
+sequence sync and switch-over. Logical replication needs wal_level=logical
+on the shared instance, which otherwise runs with the lighter `replica`
+level: the move raises it (PG_WAL_LEVEL) and lowers it again once done,
+restarting the shared instance each time.
+"""
+
+import subprocess
+import sys
+import time
+
+from . import compose
+from . import host as hostinfo
+
+SHARED = "postgres"
+PORT = 5432
+ADMIN_USER = "masuite"
+OVERRIDE_NAME = "postgres"
+DEDICATED_KEY = "PG_DEDICATED_APPS"
+
+# Logical replication objects used by `db move`
+MOVE_NAME = "masuite_move"
+WAL_LEVEL_KEY = "PG_WAL_LEVEL"
+
+
+def dedicated(env):
+    """Apps configured with their own instance."""
+    return [a.strip() for a in env.get(DEDICATED_KEY, "").split(",") if a.strip()]
+
+
+def instance(app_id, dedicated_apps):
+    """Service holding an app's database."""
+    return f"{SHARED}-{app_id}" if app_id in dedicated_apps else SHARED
+
+
+def db_name(app_id):
+    return f"{app_id}_db"
+
+
+def env_values(registry, enabled, dedicated_apps, pooled=False):
+    """`<APP>_DB_HOST`/`<APP>_DB_PORT` for enabled apps: [(key, value)]."""
+    from . import pgbouncer
+    values = []
+    for app_id in sorted(enabled):
+        if registry.get(app_id, {}).get("is_infrastructure"):
+            continue
+        prefix = app_id.upper()
+        if pooled:
+            values += [(f"{prefix}_DB_HOST", pgbouncer.SERVICE), (f"{prefix}_DB_PORT", str(pgbouncer.PORT))]
+        else:
+            values += [(f"{prefix}_DB_HOST", instance(app_id, dedicated_apps)), (f"{prefix}_DB_PORT", str(PORT))]
+    return values
+
+
+# Settings each instance gets from .env; the others (parallelism, SSD
+# costs) are host-wide and shared with the main instance
+TUNED = [
+    ("shared_buffers", "SHARED_BUFFERS", "128MB"),
+    ("effective_cache_size", "EFFECTIVE_CACHE_SIZE", "1GB"),
+    ("max_connections", "MAX_CONNECTIONS", "50"),
+    ("work_mem", "WORK_MEM", "4MB"),
+    ("maintenance_work_mem", "MAINTENANCE_WORK_MEM", "64MB"),
+]
+SHARED_TUNED = [
+    ("max_worker_processes", "PG_MAX_WORKER_PROCESSES", "8"),
+    ("max_parallel_workers", "PG_MAX_PARALLEL_WORKERS", "8"),
+    ("max_parallel_workers_per_gather", "PG_MAX_PARALLEL_WORKERS_PER_GATHER", "2"),
+    ("random_page_cost", "PG_RANDOM_PAGE_COST", "4.0"),
+    ("effective_io_concurrency", "PG_EFFECTIVE_IO_CONCURRENCY", "1"),
+]
+
+
+def _instance_service(app_id):
+    prefix = f"{app_id.upper()}_PG"
+    command = ["postgres"]
+    for setting, key, default in TUNED:
+        command += ["-c", f"{setting}=${{{prefix}_{key}:-{default}}}"]
+    for setting, key, default in SHARED_TUNED:
+        command += ["-c", f"{setting}=${{{key}:-{default}}}"]
+    return {
+        "image": "postgres:${POSTGRES_VERSION:-16-alpine}",
+        "profiles": [app_id],
+        "restart": "unless-stopped",
+        "command": command,
+        "shm_size": f"${{{prefix}_SHM_SIZE:-64mb}}",
+        "volumes": [
+            f"./data/{SHARED}-{app_id}:/var/lib/postgresql/data",
+            "./config/postgres/init-databases.sh:/docker-entrypoint-initdb.d/init-databases.sh:ro",
+        ],
+        "environment": {
+            "POSTGRES_USER": ADMIN_USER,
+            "POSTGRES_PASSWORD": "${POSTGRES_ADMIN_PASSWORD}",
+            "POSTGRES_DB": ADMIN_USER,
+            "APP_DB_USER": "${SHARED_DB_USER}",
+            "APP_DB_PASSWORD": "${SHARED_DB_PASSWORD}",
+            "APP_DB_NAMES": db_name(app_id),
+        },
+        "healthcheck": {
+            "test": ["CMD-SHELL", f"pg_isready -U {ADMIN_USER}"],
+            "interval": "5s",
+            "timeout": "5s",
+            "retries": 5,
+        },
+    }
+
+
+def override(registry, enabled, dedicated_apps):
+    """Compose override: dedicated instances, and app services waiting for them."""
+    services = {}
+    for app_id in sorted(set(dedicated_apps) & set(enabled)):
+        app = registry.get(app_id, {})
+        name = instance(app_id, dedicated_apps)
+        services[name] = _instance_service(app_id)
+        services.update(compose.wait_for(app, name))
+    return {"services": services}
+
+
+def write(root_dir, env, registry, enabled):
+    """Write (or remove) config/compose/postgres.json."""
+    compose.write_override(root_dir, OVERRIDE_NAME, override(registry, enabled, dedicated(env))["services"])
+
+
+def instances(env, enabled):
+    """Dedicated instances to run: [(service, app_id)]."""
+    return [(instance(a, [a]), a) for a in dedicated(env) if a in enabled]
+
+
+# --- db move ---
+
+def _psql(compose_cmd, service, dbname, sql, user=ADMIN_USER, check=True):
+    """Run SQL in a postgres container; returns stdout (tuples only)."""
+    result = subprocess.run(
+        [*compose_cmd, "exec", "-T", service, "psql", "-U", user, "-d", dbname,
+         "-v", "ON_ERROR_STOP=1", "-At", "-c", sql],
+        capture_output=True, text=True,
+    )
+    if check and result.returncode != 0:
+        print(f"FAILED\n  {result.stderr.strip()[:300]}")
+        sys.exit(1)
+    return result.stdout.strip()
+
+
+def _pipe(compose_cmd, source, target, dbname, dump_args, user=ADMIN_USER):
+    """pg_dump from `source` piped into psql on `target`."""
+    dump = subprocess.Popen(
+        [*compose_cmd, "exec", "-T", source, "pg_dump", "-U", user, *dump_args, dbname],
+        stdout=subprocess.PIPE,
+    )
+    restore = subprocess.run(
+        [*compose_cmd, "exec", "-T", target, "psql", "-U", user, "-d", dbname, "-v", "ON_ERROR_STOP=1", "-q"],
+        stdin=dump.stdout, capture_output=True, text=True,
+    )
+    dump.stdout.close()
+    if dump.wait() != 0 or restore.returncode != 0:
+        print(f"FAILED\n  {restore.stderr.strip()[:300]}")
+        sys.exit(1)
+
+
+def _set_wal_level(root_dir, level):
+    """Set the shared instance's wal_level and recreate it (its clients reconnect)."""
+    from .env import update_env
+    print(f"Restarting {SHARED} with wal_level={level}...", end=" ", flush=True)
+    update_env(root_dir, {WAL_LEVEL_KEY: level}, header="PostgreSQL instances")
+    cmd = compose.compose_cmd(root_dir)
+    result = subprocess.run([*cmd, "up", "-d", "--no-deps", "--wait", SHARED], capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"FAILED\n  {result.stderr.strip()[:300]}")
+        sys.exit(1)
+    print("done")
+
+
+def _wait_until(check, timeout, what):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if check():
+            return
+        time.sleep(1)
+    print(f"FAILED (timed out waiting for {what})")
+    sys.exit(1)
+
+
+def move(root_dir, app_id):
+    """Move an app's database from the shared instance to a dedicated one."""
+    from . import pgbouncer, resources, tuning
+    from .env import load_env, enabled_apps, compose_profiles, update_env
+    from .registry import SERVICE_REGISTRY
+
+    env = load_env(root_dir)
+    enabled = enabled_apps(env)
+    if app_id not in enabled or SERVICE_REGISTRY.get(app_id, {}).get("is_infrastructure"):
+        print(f"Not an enabled app: {app_id}")
+        sys.exit(1)
+    current = dedicated(env)
+    if app_id in current:
+        print(f"{app_id} already has its own instance ({instance(app_id, current)}).")
+        return
+
+    target = instance(app_id, [app_id])
+    dbname = db_name(app_id)
+    new_dedicated = current + [app_id]
+    pooled = pgbouncer.SERVICE in compose_profiles(env)
+
+    cmd = compose.compose_cmd(root_dir)
+    # Logical replication can't apply updates to tables without a primary key
+    no_pk = _psql(cmd, SHARED, dbname,
+                  "SELECT string_agg(c.relname, ', ') FROM pg_class c "
+                  "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                  "WHERE c.relkind = 'r' AND n.nspname NOT IN ('pg_catalog', 'information_schema') "
+                  "AND NOT EXISTS (SELECT FROM pg_index i WHERE i.indrelid = c.oid AND i.indisprimary)")
+    if no_pk:
+        print(f"Tables without a primary key can't be moved live: {no_pk}")
+        print(f"Use ./masuite backup, then set {DEDICATED_KEY} and ./masuite restore instead.")
+        sys.exit(1)
+
+    # Only for the move; lowered again once the subscription is gone
+    wal_level = _psql(cmd, SHARED, ADMIN_USER, "SHOW wal_level")
+    if wal_level != "logical":
+        _set_wal_level(root_dir, "logical")
+
+    # 1. Tune and start the new instance; the app is only routed to it in step 4
+    print(f"Starting {target}...", end=" ", flush=True)
+    host = hostinfo.detect()
+    settings = tuning.postgres_instance(host, SERVICE_REGISTRY, enabled, app_id, pooled)
+    update_env(root_dir, {key: value for key, value, _ in settings}, header="PostgreSQL instances")
+    env = load_env(root_dir)
+    moving = {**env, DEDICATED_KEY: ",".join(new_dedicated)}
+    write(root_dir, moving, SERVICE_REGISTRY, enabled)
+    resources.write(root_dir, moving, host)
+    cmd = compose.compose_cmd(root_dir)  # the model changed
+    if subprocess.run([*cmd, "up", "-d", "--no-deps", "--wait", target]).returncode != 0:
+        print("FAILED")
+        sys.exit(1)
+    print("done")
+
+    # 2. Schema, then a live copy through logical replication
+    print("Copying schema...", end=" ", flush=True)
+    _psql(cmd, target, dbname, "DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+    _pipe(cmd, SHARED, target, dbname, ["--schema-only", "--no-publications", "--no-subscriptions"])
+    print("done")
+
+    print("Copying data (app still running)...", end=" ", flush=True)
+    _psql(cmd, SHARED, dbname, f"DROP PUBLICATION IF EXISTS {MOVE_NAME}; "
+                               f"CREATE PUBLICATION {MOVE_NAME} FOR ALL TABLES;")
+    password = env.get("POSTGRES_ADMIN_PASSWORD", "")
+    _psql(cmd, target, dbname,
+          f"CREATE SUBSCRIPTION {MOVE_NAME} CONNECTION "
+          f"'host={SHARED} port={PORT} dbname={dbname} user={ADMIN_USER} password={password}' "
+          f"PUBLICATION {MOVE_NAME};")
+    _wait_until(lambda: _psql(cmd, target, dbname,
+                              "SELECT count(*) FROM pg_subscription_rel WHERE srsubstate <> 'r'") == "0",
+                timeout=24 * 3600, what="the initial copy")
+    print("done")
+
+    # 3. Switch-over: stop writers, let the subscriber catch up, sync sequences
+    services = SERVICE_REGISTRY[app_id].get("services", [])
+    print(f"Stopping {app_id} for the switch-over...", end=" ", flush=True)
+    started = time.time()
+    subprocess.run([*cmd, "stop", *services], capture_output=True)
+    source_lsn = _psql(cmd, SHARED, dbname, "SELECT pg_current_wal_lsn()")
+    _wait_until(lambda: _psql(cmd, target, dbname,
+                              f"SELECT coalesce(latest_end_lsn >= '{source_lsn}', false) "
+                              f"FROM pg_stat_subscription WHERE subname = '{MOVE_NAME}' AND relid IS NULL") == "t",
+                timeout=300, what="replication to catch up")
+    setvals = _psql(cmd, SHARED, dbname,
+                    "SELECT format('SELECT setval(%L, %s, %s);', "
+                    "quote_ident(schemaname) || '.' || quote_ident(sequencename), "
+                    "coalesce(last_value, 1), last_value IS NOT NULL) FROM pg_sequences")
+    if setvals:
+        _psql(cmd, target, dbname, setvals)
+    _psql(cmd, target, dbname, f"DROP SUBSCRIPTION {MOVE_NAME};")
+    _psql(cmd, SHARED, dbname, f"DROP PUBLICATION {MOVE_NAME};")
+
+    # 4. Route the app to its instance and restart it
+    from . import replica
+    update_env(root_dir, {DEDICATED_KEY: ",".join(new_dedicated),
+                          **dict(env_values(SERVICE_REGISTRY, [app_id], new_dedicated, pooled))},
+               header="PostgreSQL instances")
+    if app_id in replica.routed(env):
+        # The replica follows the shared instance only
+        update_env(root_dir, {replica.APPS_KEY: ",".join(a for a in replica.routed(env) if a != app_id),
+                              f"{app_id.upper()}_DB_REPLICA_HOST": ""})
+    env = load_env(root_dir)
+    cmd = compose.compose_cmd(root_dir)
+    if pooled:
+        pgbouncer.write(root_dir, env, SERVICE_REGISTRY, enabled)
+        # SIGHUP reloads the config without dropping the other apps' clients
+        subprocess.run([*cmd, "kill", "-s", "HUP", pgbouncer.SERVICE], capture_output=True)
+    result = subprocess.run([*cmd, "up", "-d", *services], capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"FAILED\n  {result.stderr.strip()[:300]}")
+        sys.exit(1)
+    print(f"done ({time.time() - started:.0f}s downtime)")
+    if wal_level != "logical":
+        _set_wal_level(root_dir, wal_level)
+
+    print()
+    print(f"{app_id} now uses {target} (data/{target}/).")
+    print("The old copy is still in the shared instance. Once you have checked the app, drop it with:")
+    print(f"  docker compose exec {SHARED} dropdb -U {ADMIN_USER} {dbname}")
@@ -0,0 +1,132 @@
+"""Shared and per-app Redis instances.
+
+Apps keep their data in one DB number (`redis_db` in metadata.json) of the
+shared `redis` service, unless they are listed in REDIS_DEDICATED_APPS:
+those get their own `redis-<app>` instance, generated as a compose
+override (config/compose/redis.json). Compose files build Redis URLs from
+`<APP>_REDIS_HOST`, so routing is only a matter of .env.
+
+Each instance has a role that sets its persistence and eviction:
+
+- broker: celery queues live here, so nothing may be lost or evicted:
+  AOF with fsync every second, no RDB snapshots (their fork stalls a
+  busy instance), noeviction;
+- cache: pure cache, no persistence, allkeys-lru.
+
+The shared instance holds brokers, caches and LiveKit's state: AOF
+everysec like a broker, but volatile-lru so caches with a TTL can be
+evicted.
+
+Apps with a celery worker get a broker instance, others a cache one.
+Metadata "redis_dedicated": true makes dedicated the setup default.
+"""
+
+from . import compose
+
+SHARED = "redis"
+PORT = 6379
+OVERRIDE_NAME = "redis"
+DEDICATED_KEY = "REDIS_DEDICATED_APPS"
+
+ROLES = {
+    "broker": {"appendonly": "yes", "policy": "noeviction"},
+    "cache": {"appendonly": "no", "policy": "allkeys-lru"},
+}
+
+
+def uses_redis(app):
+    return app.get("redis_db") is not None
+
+
+def dedicated(env):
+    """Apps configured with their own instance."""
+    return [a.strip() for a in env.get(DEDICATED_KEY, "").split(",") if a.strip()]
+
+
+def default_dedicated(registry, enabled):
+    return [app_id for app_id in sorted(enabled)
+            if registry.get(app_id, {}).get("redis_dedicated") and uses_redis(registry[app_id])]
+
+
+def service_name(app_id):
+    return f"{SHARED}-{app_id}"
+
+
+def role(registry, app_id):
+    return "broker" if f"{app_id}-celery" in registry[app_id].get("services", []) else "cache"
+
+
+def env_values(registry, enabled, dedicated_apps):
+    """`<APP>_REDIS_HOST` for every enabled app using Redis: [(key, value)]."""
+    values = []
+    for app_id in sorted(enabled):
+        app = registry.get(app_id, {})
+        if uses_redis(app):
+            host = service_name(app_id) if app_id in dedicated_apps else SHARED
+            values.append((f"{app_id.upper()}_REDIS_HOST", host))
+    return values
+
+
+def compute(host, registry, enabled, dedicated_apps):
+    """maxmemory of dedicated instances: [(env_key, value, explanation)]."""
+    settings = []
+    for app_id in sorted(set(dedicated_apps) & set(enabled)):
+        if not uses_redis(registry.get(app_id, {})):
+            continue
+        ram = registry[app_id].get("ram", 512)
+        memory = max(64, min(2048, 64 + ram // 4))
+        kind = role(registry, app_id)
+        settings.append((f"{app_id.upper()}_REDIS_MAXMEMORY", f"{memory}mb",
+                         f"{service_name(app_id)} ({kind}): 64 MB plus 1/4 of the app's "
+                         f"{ram} MB budget, {ROLES[kind]['policy']}"))
+    return settings
+
+
+def _instance(registry, app_id):
+    opts = ROLES[role(registry, app_id)]
+    return {
+        "image": "redis:${REDIS_VERSION:-7-alpine}",
+        "profiles": [app_id],
+        "restart": "unless-stopped",
+        "command": [
+            "redis-server", "--requirepass", "${REDIS_PASSWORD}",
+            "--save", "",
+            "--appendonly", opts["appendonly"], "--appendfsync", "everysec",
+            "--maxmemory", f"${{{app_id.upper()}_REDIS_MAXMEMORY:-128mb}}",
+            "--maxmemory-policy", opts["policy"],
+        ],
+        "volumes": [f"./data/{service_name(app_id)}:/data"],
+        "healthcheck": {
+            "test": ["CMD", "redis-cli", "-a", "${REDIS_PASSWORD}", "ping"],
+            "interval": "5s",
+            "timeout": "5s",
+            "retries": 5,
+        },
+    }
+
+
+def override(registry, enabled, dedicated_apps):
+    """Compose override: dedicated instances, and app services waiting for them."""
+    services = {}
+    for app_id in sorted(set(dedicated_apps) & set(enabled)):
+        app = registry.get(app_id, {})
+        if not uses_redis(app):
+            continue
+        name = service_name(app_id)
+        services[name] = _instance(registry, app_id)
+        services.update(compose.wait_for(app, name))
+    return {"services": services}
+
+
+def write(root_dir, env, registry, enabled):
+    """Write (or remove) config/compose/redis.json."""
+    compose.write_override(root_dir, OVERRIDE_NAME, override(registry, enabled, dedicated(env))["services"])
+
+
+def instances(env, registry, enabled):
+    """Redis services to run: [(service, role)]."""
+    result = [(SHARED, "shared")]
+    for app_id in dedicated(env):
+        if app_id in enabled and uses_redis(registry.get(app_id, {})):
+            result.append((service_name(app_id), role(registry, app_id)))
+    return result
@@ -0,0 +1,100 @@
+"""Service registry, loaded from services/*/metadata.json on first use.
+
+    from .registry import SERVICE_REGISTRY, APP_REGISTRY
+
+SERVICE_REGISTRY: all services (including _base infrastructure)
+APP_REGISTRY:     user-selectable apps only (excludes infrastructure)
+APP_PORTS:        infra ports (homepage, keycloak, rustfs_console) + app ports
+APP_SUBDOMAINS:   infra subdomains (homepage, keycloak, rustfs, livekit) + app subdomains
+
+Importing this module reads nothing: the registry is built the first time
+one of these names is accessed. The parsed metadata is cached in
+.masuite/cache/registry.json, keyed on the mtime and size of every
+metadata.json, so adding, removing or editing a service invalidates it.
+"""
+
+import json
+import os
+
+from .env import state_path
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_CACHE = ("cache", "registry.json")
+
+_NAMES = ("SERVICE_REGISTRY", "APP_REGISTRY", "APP_PORTS", "APP_SUBDOMAINS")
+
+
+def _metadata_files(root_dir):
+    """{service id: metadata.json path} of services/*/."""
+    services_dir = os.path.join(root_dir, "services")
+    if not os.path.isdir(services_dir):
+        return {}
+    files = {}
+    for entry in sorted(os.listdir(services_dir)):
+        path = os.path.join(services_dir, entry, "metadata.json")
+        if os.path.isfile(path):
+            files[entry] = path
+    return files
+
+
+def load(root_dir=_PROJECT_ROOT):
+    """Parse all service metadata from services/*/metadata.json files."""
+    registry = {}
+    for entry, path in _metadata_files(root_dir).items():
+        with open(path) as f:
+            registry[entry] = json.load(f)
+    return registry
+
+
+def _fingerprint(files):
+    key = {}
+    for entry, path in files.items():
+        st = os.stat(path)
+        key[entry] = [st.st_mtime_ns, st.st_size]
+    return key
+
+
+def load_cached(root_dir=_PROJECT_ROOT):
+    """Like load(), through the on-disk cache when no metadata.json changed."""
+    files = _metadata_files(root_dir)
+    key = _fingerprint(files)
+    cache_path = os.path.join(root_dir, ".masuite", *_CACHE)
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached["registry"]
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    registry = load(root_dir)
+    # A read-only install, or one owned by another user, just goes uncached
+    try:
+        path = state_path(root_dir, *_CACHE)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"key": key, "registry": registry}, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return registry
+
+
+def _build():
+    services = load_cached()
+    apps = {k: v for k, v in services.items() if not v.get("is_infrastructure")}
+    infra = services.get("_base", {})
+    return {
+        "SERVICE_REGISTRY": services,
+        "APP_REGISTRY": apps,
+        "APP_PORTS": {**infra.get("ports", {}), **{k: v["port"] for k, v in apps.items()}},
+        "APP_SUBDOMAINS": {**infra.get("subdomains", {}), **{k: v["subdomain"] for k, v in apps.items()}},
+    }
+
+
+def __getattr__(name):
+    if name not in _NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Later lookups find the module globals and skip this hook
+    globals().update(_build())
+    return globals()[name]
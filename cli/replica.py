@@ -0,0 +1,95 @@
+"""Optional hot-standby replica of the shared PostgreSQL.
+
+Enabled by the `replica` compose profile. `postgres-replica` clones the
+shared instance with pg_basebackup on first start, then follows it by
+streaming replication through a physical replication slot, so the
+primary keeps the WAL the replica still needs (up to
+PG_MAX_SLOT_WAL_KEEP_SIZE, beyond which the slot is dropped and the
+replica must be re-cloned).
+
+The replica serves:
+
+- backups: `./masuite backup` dumps shared databases from it when it is
+  streaming and not lagging, so pg_dump doesn't compete with the apps;
+- read-only traffic of the Django apps listed in PG_REPLICA_APPS: their
+  settings overlay adds a `replica` database, and the router of
+  config/settings/masuite_replica.py sends it the reads of GET/HEAD
+  requests that haven't written (Celery tasks stay on the primary; other
+  users' writes may show up a fraction of a second late, so only apps
+  tolerating that should opt in).
+
+Apps on a dedicated instance (cli/postgres.py) aren't replicated.
+"""
+
+import csv
+import io
+import subprocess
+
+from . import postgres
+
+SERVICE = "postgres-replica"
+PROFILE = "replica"
+SLOT = "masuite_replica"
+APPS_KEY = "PG_REPLICA_APPS"
+
+# Backups fall back to the primary beyond this replay lag
+MAX_BACKUP_LAG_BYTES = 16 * 1024 * 1024
+
+
+def routed(env):
+    """Apps sending their reads to the replica."""
+    return [a.strip() for a in env.get(APPS_KEY, "").split(",") if a.strip()]
+
+
+def candidates(registry, enabled, dedicated_apps):
+    """Apps that can opt in: Django apps on the shared instance."""
+    return [app_id for app_id in sorted(enabled)
+            if registry.get(app_id, {}).get("is_django") and app_id not in dedicated_apps]
+
+
+def env_values(registry, enabled, dedicated_apps, apps, active=True):
+    """`<APP>_DB_REPLICA_HOST` for apps that can opt in: [(key, value)]."""
+    return [(f"{app_id.upper()}_DB_REPLICA_HOST", SERVICE if active and app_id in apps else "")
+            for app_id in candidates(registry, enabled, dedicated_apps)]
+
+
+def status(compose_cmd):
+    """Replication state seen from the primary.
+
+    Returns {"state", "lag_bytes", "replay_lag"} (replay_lag in seconds,
+    None when idle), {"state": "disconnected", ...} when the slot exists
+    but the replica isn't streaming, or None when the primary can't be
+    queried.
+    """
+    query = (
+        "SELECT coalesce(r.state, 'disconnected') AS state, "
+        "pg_wal_lsn_diff(pg_current_wal_lsn(), coalesce(r.replay_lsn, s.restart_lsn)) AS lag_bytes, "
+        "extract(epoch FROM r.replay_lag) AS replay_lag, s.wal_status "
+        "FROM pg_replication_slots s "
+        f"LEFT JOIN pg_stat_replication r ON r.pid = s.active_pid WHERE s.slot_name = '{SLOT}'"
+    )
+    result = subprocess.run(
+        [*compose_cmd, "exec", "-T", postgres.SHARED, "psql", "-U", postgres.ADMIN_USER,
+         "-d", postgres.ADMIN_USER, "--csv", "-c", query],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return None
+    rows = list(csv.DictReader(io.StringIO(result.stdout)))
+    if not rows:
+        return {"state": "no slot", "lag_bytes": None, "replay_lag": None, "wal_status": ""}
+    row = rows[0]
+    return {
+        "state": row["state"],
+        "lag_bytes": int(float(row["lag_bytes"])) if row["lag_bytes"] else None,
+        "replay_lag": float(row["replay_lag"]) if row["replay_lag"] else None,
+        "wal_status": row.get("wal_status", ""),
+    }
+
+
+def usable_for_backup(compose_cmd):
+    """True when the replica streams and is close enough to the primary."""
+    current = status(compose_cmd)
+    return bool(current and current["state"] == "streaming"
+                and current["lag_bytes"] is not None
+                and current["lag_bytes"] <= MAX_BACKUP_LAG_BYTES)
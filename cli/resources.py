@@ -0,0 +1,186 @@
+"""Per-service CPU and memory limits derived from metadata.json budgets.
+
+Each service group (one services/*/metadata.json) declares a `ram` (MB) and
+`vcpu` budget. Budgets are scaled to the host and turned into a generated
+compose override, config/compose/resources.json:
+
+- reservations: the group budget split evenly over its services, shrunk
+  when the host is smaller than the sum of budgets, so the reservations
+  always fit;
+- limits: any single service may use its whole (scaled) group budget but
+  no more, so one runaway worker can't push the host into swap.
+
+Postgres (shared, replica and dedicated instances), Redis, OpenSearch, Keycloak,
+Collabora and LiveKit egress get limits sized from their tuned settings
+(cli/tuning.py) instead, so a limit never sits below the memory they are
+configured to use.
+
+MASUITE_LIMITS in .env selects the mode:
+
+- enforce:  write the override (default);
+- advisory: no override, `status` still compares usage to the limits;
+- off:      no override, no comparison.
+"""
+
+import json
+import os
+
+from . import host as hostinfo
+from .compose import OVERRIDES_DIR
+
+MODES = ("enforce", "advisory", "off")
+DEFAULT_MODE = "enforce"
+OVERRIDE_FILE = os.path.join(OVERRIDES_DIR, "resources.json")
+
+# Groups may burst up to this many times their declared budget on big hosts
+MAX_SCALE = 4
+MIN_MEMORY_MB = 128
+
+
+def mode(env):
+    value = env.get("MASUITE_LIMITS", DEFAULT_MODE)
+    return value if value in MODES else DEFAULT_MODE
+
+
+def _parse_mb(value, default):
+    """Parse '512MB', '1g', '2048m' (compose/postgres/redis sizes) to MB."""
+    value = str(value or "").strip().lower().rstrip("b")
+    if not value:
+        return default
+    mult = {"k": 1 / 1024, "m": 1, "g": 1024}.get(value[-1])
+    try:
+        if mult is None:
+            return int(value) // (1024 * 1024)
+        return int(float(value[:-1]) * mult)
+    except ValueError:
+        return default
+
+
+def _postgres_mb(env, prefix="PG", connections=100):
+    """Memory a Postgres instance tuned with `<prefix>_*` settings may use."""
+    shared_buffers = _parse_mb(env.get(f"{prefix}_SHARED_BUFFERS"), 128)
+    work_mem = _parse_mb(env.get(f"{prefix}_WORK_MEM"), 4)
+    maintenance = _parse_mb(env.get(f"{prefix}_MAINTENANCE_WORK_MEM"), 64)
+    connections = int(env.get(f"{prefix}_MAX_CONNECTIONS") or connections)
+    shm = _parse_mb(env.get(f"{prefix}_SHM_SIZE"), 64)
+    # ~10 MB per backend process, plus a quarter of them sorting at once
+    return shared_buffers + shm + maintenance + connections * (10 + work_mem // 4) + 256
+
+
+def _tuned_memory_mb(env):
+    """Memory limits for services whose usage is set by cli/tuning.py."""
+    redis_max = _parse_mb(env.get("REDIS_MAXMEMORY"), 0)
+    limits = {"postgres": _postgres_mb(env)}
+    # The hot standby runs with the primary's settings
+    limits["postgres-replica"] = limits["postgres"]
+    if redis_max:
+        # Room for fragmentation and the copy-on-write fork of AOF rewrites
+        limits["redis"] = redis_max * 2 + 64
+    limits["opensearch"] = _parse_mb(env.get("OPENSEARCH_HEAP"), 512) * 2 + 256
+    # Heap plus metaspace, threads and Quarkus off-heap buffers
+    limits["keycloak"] = _parse_mb(env.get("KEYCLOAK_HEAP"), 512) + 512
+    if env.get("LIVEKIT_EGRESS_MEMORY"):
+        limits["livekit-egress"] = _parse_mb(env["LIVEKIT_EGRESS_MEMORY"], 1536)
+    if env.get("COLLABORA_MEMORY"):
+        limits["collabora"] = _parse_mb(env["COLLABORA_MEMORY"], 1024)
+    return limits
+
+
+def compute(host, registry, enabled, env):
+    """Return {service: {"memory", "cpus", "memory_reservation", "cpus_reservation"}}.
+
+    Memory values are MB, CPU values fractional cores.
+    """
+    budgets = hostinfo.app_budgets(registry, enabled)
+    declared_ram = sum(ram for ram, _ in budgets.values()) or 1
+    declared_cpu = sum(cpu for _, cpu in budgets.values()) or 1
+    available = host["ram_mb"] - hostinfo.os_reserve_mb(host["ram_mb"])
+
+    scale = max(1.0, min(MAX_SCALE, available / declared_ram))
+    ram_fit = min(1.0, max(0, available) / declared_ram)
+    cpu_fit = min(1.0, host["cpus"] / declared_cpu)
+    tuned = _tuned_memory_mb(env)
+
+    limits = {}
+    # Dedicated Postgres and Redis instances (cli/postgres.py, cli/redis.py)
+    # aren't listed in metadata
+    from . import postgres, redis
+    for service, app_id in postgres.instances(env, enabled):
+        memory = _postgres_mb(env, f"{app_id.upper()}_PG", connections=50)
+        limits[service] = {
+            "memory": memory,
+            "cpus": round(min(float(host["cpus"]), 2.0), 2),
+            "memory_reservation": max(64, _parse_mb(env.get(f"{app_id.upper()}_PG_SHARED_BUFFERS"), 128)),
+            "cpus_reservation": 0.1,
+        }
+    for service, _ in redis.instances(env, registry, enabled)[1:]:
+        app_id = service[len(redis.SHARED) + 1:]
+        maxmemory = _parse_mb(env.get(f"{app_id.upper()}_REDIS_MAXMEMORY"), 128)
+        limits[service] = {
+            "memory": maxmemory * 2 + 64,
+            "cpus": 1.0,
+            "memory_reservation": max(16, maxmemory // 2),
+            "cpus_reservation": 0.1,
+        }
+    for svc_id in budgets:
+        ram, vcpu = budgets[svc_id]
+        services = registry[svc_id].get("services", [])
+        for service in services:
+            limits[service] = {
+                "memory": max(MIN_MEMORY_MB, int(tuned.get(service, ram * scale))),
+                "cpus": round(min(float(host["cpus"]), max(1.0, vcpu * scale * 2)), 2),
+                "memory_reservation": max(16, int(ram * ram_fit / len(services))),
+                "cpus_reservation": round(vcpu * cpu_fit / len(services), 2),
+            }
+    return limits
+
+
+def override(limits):
+    """Compose override setting deploy.resources for every service."""
+    services = {}
+    for service, lim in sorted(limits.items()):
+        services[service] = {"deploy": {"resources": {
+            "limits": {"cpus": str(lim["cpus"]), "memory": f"{lim['memory']}M"},
+            "reservations": {
+                "cpus": str(lim["cpus_reservation"]),
+                "memory": f"{lim['memory_reservation']}M",
+            },
+        }}}
+    return {"services": services}
+
+
+def write(root_dir, env, host=None):
+    """Write (or remove) config/compose/resources.json for the current mode.
+
+    Returns the computed limits, or None when limits are off.
+    """
+    from .registry import SERVICE_REGISTRY
+    from .env import enabled_apps
+
+    path = os.path.join(root_dir, OVERRIDE_FILE)
+    current = mode(env)
+    limits = None
+    if current != "off":
+        limits = compute(host or hostinfo.detect(), SERVICE_REGISTRY, enabled_apps(env), env)
+
+    if current == "enforce":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(override(limits), f, indent=2)
+            f.write("\n")
+        os.replace(tmp, path)
+    elif os.path.exists(path):
+        os.remove(path)
+    return limits
+
+
+def render_table(limits):
+    """Format limits as a table, one line per service."""
+    lines = [f"  {'Service':<26} {'Memory':>8} {'Reserved':>9} {'CPUs':>5} {'Reserved':>9}"]
+    for service, lim in sorted(limits.items()):
+        lines.append(
+            f"  {service:<26} {lim['memory']:>6}MB {lim['memory_reservation']:>7}MB "
+            f"{lim['cpus']:>5} {lim['cpus_reservation']:>9}"
+        )
+    return "\n".join(lines)
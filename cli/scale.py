@@ -0,0 +1,166 @@
+"""Horizontal scaling of app services (`./masuite scale drive-backend=3`).
+
+Replica counts are persisted as a generated compose override,
+config/compose/scale.json (deploy.replicas), so every later `start` or
+`update` keeps them.
+
+Caddy reaches services through generated `to-<service>` snippets in
+config/caddy/upstreams.caddy, imported by the static snippets as
+`reverse_proxy { import to-drive-backend 8000 }`. A single replica proxies
+to the service name. Several replicas are listed one by one, with a load
+balancing policy, passive and (where metadata gives a health_uri) active
+health checks.
+
+Only services listed under "scalable" in their app's metadata.json can be
+scaled. Websocket services set a hashing lb_policy there, so all clients of
+one document land on the same replica.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from .compose import OVERRIDES_DIR, PROJECT_NAME
+
+SCALE_FILE = os.path.join(OVERRIDES_DIR, "scale.json")
+UPSTREAMS_FILE = os.path.join("config", "caddy", "upstreams.caddy")
+MAX_REPLICAS = 16
+
+DEFAULT_LB_POLICY = "least_conn"
+
+
+def scalable(registry, enabled=None):
+    """Return {service: options} for scalable services (of `enabled` apps only, if given)."""
+    result = {}
+    for app_id, svc in registry.items():
+        if enabled is None or app_id in enabled:
+            result.update(svc.get("scalable", {}))
+    return result
+
+
+def load(root_dir):
+    """Return the persisted {service: replicas} (only services scaled above 1)."""
+    try:
+        with open(os.path.join(root_dir, SCALE_FILE)) as f:
+            services = json.load(f).get("services", {})
+    except (OSError, ValueError):
+        return {}
+    return {name: svc["deploy"]["replicas"] for name, svc in services.items()}
+
+
+def save(root_dir, replicas):
+    """Write the scale override, or remove it when nothing is scaled."""
+    path = os.path.join(root_dir, SCALE_FILE)
+    replicas = {name: n for name, n in sorted(replicas.items()) if n > 1}
+    if not replicas:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    override = {"services": {name: {"deploy": {"replicas": n}} for name, n in replicas.items()}}
+    with open(path, "w") as f:
+        json.dump(override, f, indent=2)
+        f.write("\n")
+
+
+def generate_upstreams(registry, replicas):
+    """Caddyfile snippets `to-<service>`; the port is passed as import argument."""
+    lines = ["# Generated by ./masuite setup and ./masuite scale - do not edit", ""]
+    for service, opts in sorted(scalable(registry).items()):
+        if service.endswith("-celery"):
+            continue  # workers aren't behind Caddy
+        count = replicas.get(service, 1)
+        lines.append(f"(to-{service}) {{")
+        if count == 1:
+            lines.append(f"\tto {service}:{{args[0]}}")
+        else:
+            targets = " ".join(f"{PROJECT_NAME}-{service}-{i}:{{args[0]}}" for i in range(1, count + 1))
+            lines.append(f"\tto {targets}")
+            lines.append(f"\tlb_policy {opts.get('lb_policy', DEFAULT_LB_POLICY)}")
+            lines.append("\tlb_try_duration 5s")
+            lines.append("\tfail_duration 30s")
+            lines.append("\tmax_fails 3")
+            if opts.get("health_uri"):
+                lines.append(f"\thealth_uri {opts['health_uri']}")
+                lines.append("\thealth_interval 10s")
+                lines.append("\thealth_timeout 5s")
+        lines.append("}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def write_upstreams(root_dir, registry, replicas=None):
+    if replicas is None:
+        replicas = load(root_dir)
+    path = os.path.join(root_dir, UPSTREAMS_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(generate_upstreams(registry, replicas))
+
+
+def parse_specs(specs, registry, enabled):
+    """Parse ["drive-backend=3", ...] into {service: replicas}. Exits on errors."""
+    allowed = scalable(registry, enabled)
+    result = {}
+    for spec in specs:
+        service, sep, count = spec.partition("=")
+        if not sep or not count.isdigit():
+            print(f"Invalid scale spec: {spec} (expected SERVICE=N)")
+            sys.exit(1)
+        if service not in allowed:
+            print(f"Service can't be scaled: {service}")
+            print(f"Scalable services: {', '.join(sorted(allowed)) or '(none)'}")
+            sys.exit(1)
+        count = int(count)
+        if not 1 <= count <= MAX_REPLICAS:
+            print(f"Replicas for {service} must be between 1 and {MAX_REPLICAS}")
+            sys.exit(1)
+        result[service] = count
+    return result
+
+
+def _reload_caddy(compose_cmd):
+    result = subprocess.run(
+        [*compose_cmd, "exec", "-T", "caddy", "caddy", "reload", "--config", "/etc/caddy/Caddyfile"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        err = result.stderr.strip()[-300:] if result.stderr else "unknown error"
+        print(f"WARNING: Caddy reload failed: {err}")
+        return False
+    return True
+
+
+def run(root_dir, specs):
+    """Apply replica counts, persist them and reload Caddy."""
+    from . import compose
+    from .env import load_env, enabled_apps
+    from .registry import SERVICE_REGISTRY
+
+    enabled = enabled_apps(load_env(root_dir))
+    replicas = load(root_dir)
+
+    if not specs:
+        print("Replicas:")
+        for service in sorted(scalable(SERVICE_REGISTRY, enabled)):
+            print(f"  {service:<26} {replicas.get(service, 1)}")
+        return
+
+    changes = parse_specs(specs, SERVICE_REGISTRY, enabled)
+    replicas.update(changes)
+    save(root_dir, replicas)
+    write_upstreams(root_dir, SERVICE_REGISTRY, replicas)
+
+    # The compose model includes the scale override: resolve it after saving
+    cmd = compose.compose_cmd(root_dir)
+    for service, count in sorted(changes.items()):
+        print(f"  {service} -> {count} replica{'s' if count > 1 else ''}")
+    result = subprocess.run([*cmd, "up", "-d", "--no-deps", *sorted(changes)])
+    if result.returncode != 0:
+        print("Failed to apply replica counts (saved, applied on next start).")
+        sys.exit(1)
+    if _reload_caddy(cmd):
+        print("Caddy upstreams reloaded.")
+    if "collabora" in changes:
+        print("Editors are now split between replicas: run ./masuite tune to resize Collabora.")
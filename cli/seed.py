@@ -0,0 +1,315 @@
+"""Synthetic users and content for performance tests (`./masuite seed`).
+
+    ./masuite seed --users 5000 --docs-per-user 20 --drive-gb 50
+    ./masuite seed --purge
+
+Users are created in Keycloak in partial-import batches (as `user
+import` does), named seed-00001@<domain> and so on. Content is then
+created through each app's public API, logged in as each user through
+the app's OIDC flow (the same client as `./masuite bench`), on a bounded
+number of concurrent users:
+
+- Docs: `--docs-per-user` documents per user;
+- Drive: `--drive-gb` spread over the users, as files of mixed sizes
+  uploaded through presigned RustFS URLs.
+
+Everything derives from `--seed`: names, titles, file sizes and file
+contents are the same on every run with the same seed. Runs are
+idempotent: existing users, documents (by title) and files (by name) are
+kept and only what is missing is created, so an interrupted run can be
+resumed and a larger one extends a smaller one.
+
+Seeded users get a fresh random password on every run (reset for
+existing ones), which is never stored. `--purge` deletes the seeded
+content through the apps' APIs, then the users.
+"""
+
+import asyncio
+import random
+import re
+import ssl
+import sys
+import time
+
+from . import bench
+from . import keycloak
+from .env import load_env, enabled_apps
+from .user import generate_password, user_representation
+from .workers import batched, imap_unordered
+
+USER_PREFIX = "seed-"
+DOC_PREFIX = "Seed "
+FILE_PREFIX = "seed-"
+BATCH_SIZE = 200
+DEFAULT_WORKERS = 16
+
+KIB = 1024
+MIB = 1024 * KIB
+GIB = 1024 * MIB
+# (size, weight): mostly small files, as in real drives. Kept at 16 MiB
+# at most, since each upload is held in memory.
+FILE_SIZES = ((64 * KIB, 50), (MIB, 30), (4 * MIB, 15), (16 * MIB, 5))
+
+FIRST_NAMES = ("Alice", "Bruno", "Camille", "David", "Emma", "Farid", "Gabrielle", "Hugo", "Inès",
+               "Jules", "Karima", "Louis", "Manon", "Nathan", "Océane", "Paul", "Rose", "Samir",
+               "Théo", "Zoé")
+LAST_NAMES = ("Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand",
+              "Leroy", "Moreau", "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "Roux")
+WORDS = ("budget", "meeting", "notes", "roadmap", "report", "draft", "review", "plan", "minutes",
+         "proposal", "summary", "specification", "onboarding", "retrospective", "agenda", "survey")
+
+
+def _rng(seed, *parts):
+    """A random generator for one item, independent of the others and of run order."""
+    return random.Random(":".join(str(p) for p in (seed, *parts)))
+
+
+def username(index, domain):
+    return f"{USER_PREFIX}{index:05d}@{domain}"
+
+
+def profile(seed, index, domain):
+    rng = _rng(seed, "user", index)
+    return {"email": username(index, domain),
+            "first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES)}
+
+
+def doc_titles(seed, index, count):
+    titles = []
+    for k in range(count):
+        rng = _rng(seed, "doc", index, k)
+        words = " ".join(rng.sample(WORDS, 2))
+        titles.append(f"{DOC_PREFIX}{k + 1:03d}: {words.capitalize()}")
+    return titles
+
+
+def drive_files(seed, index, budget):
+    """[(filename, size)] of one user's files, adding up to `budget` bytes."""
+    rng = _rng(seed, "drive", index)
+    sizes, weights = zip(*FILE_SIZES)
+    files = []
+    total = 0
+    while total < budget:
+        size = min(rng.choices(sizes, weights)[0], budget - total)
+        files.append((f"{FILE_PREFIX}{len(files) + 1:04d}.bin", size))
+        total += size
+    return files
+
+
+def payload(seed, index, filename, size):
+    """Deterministic content: a 64 KiB random block, repeated."""
+    block = _rng(seed, "content", index, filename).randbytes(64 * KIB)
+    return (block * (size // len(block) + 1))[:size]
+
+
+# --- Keycloak users ---
+
+def _connect(root_dir, env, workers):
+    admin = keycloak.connect(root_dir, env, pool_size=workers)
+    if not admin:
+        print("Error: KEYCLOAK_ADMIN_PASSWORD must be set in .env")
+        sys.exit(1)
+    return admin
+
+
+def _set_password(admin, user_id, password):
+    admin.put(f"/users/{user_id}/reset-password", {"type": "password", "value": password, "temporary": False})
+
+
+def _import_batch(admin, profiles, password):
+    """Create missing users of a batch, reset the password of the others. Returns (created, existing)."""
+    resp = admin.post("/partialImport", {
+        "ifResourceExists": "SKIP",
+        "users": [user_representation(p["email"], password, p["first_name"], p["last_name"])
+                  for p in profiles],
+    }) or {}
+    skipped = [r["resourceName"] for r in resp.get("results", [])
+               if r.get("resourceType") == "USER" and r.get("action") == "SKIPPED"]
+    for name in skipped:
+        _set_password(admin, admin.find_user(name)["id"], password)
+    return len(profiles) - len(skipped), len(skipped)
+
+
+def ensure_users(admin, profiles, password, workers):
+    created = existing = 0
+    failed = False
+    for batch, result, error in imap_unordered(
+            lambda b: _import_batch(admin, b, password), batched(profiles, BATCH_SIZE), workers=workers):
+        if error:
+            failed = True
+            print(f"  {batch[0]['email']}..{batch[-1]['email']}: FAILED: {error}")
+            continue
+        created += result[0]
+        existing += result[1]
+        print(f"  users: {created} created, {existing} existing", flush=True)
+    return not failed
+
+
+def seeded_users(admin, domain):
+    """Seeded users in Keycloak, by username pattern."""
+    pattern = re.compile(rf"^{re.escape(USER_PREFIX)}\d{{5}}@{re.escape(domain)}$")
+    return [u for u in admin.paginate("/users", search=USER_PREFIX, briefRepresentation="true")
+            if pattern.match(u["username"])]
+
+
+# --- App content ---
+
+async def _seed_docs(user, base, titles):
+    existing = {doc["title"] async for doc in user.paginate(base, "/api/v1.0/documents/?page_size=100")}
+    missing = [t for t in titles if t not in existing]
+    for title in missing:
+        await user.api("POST", base, "/api/v1.0/documents/", {"title": title})
+    return len(missing)
+
+
+async def _seed_drive(user, base, seed, index, files):
+    existing = {item["filename"] async for item in user.paginate(base, "/api/v1.0/items/?page_size=100")
+                if item.get("type") == "file"}
+    created = 0
+    for filename, size in files:
+        if filename not in existing:
+            await user.drive_upload(base, filename, payload(seed, index, filename, size))
+            created += size
+    return created
+
+
+async def _purge_docs(user, base):
+    docs = [doc async for doc in user.paginate(base, "/api/v1.0/documents/?page_size=100")
+            if doc["title"].startswith(DOC_PREFIX)]
+    for doc in docs:
+        await user.api("DELETE", base, f"/api/v1.0/documents/{doc['id']}/")
+    return len(docs)
+
+
+async def _purge_drive(user, base):
+    items = [item async for item in user.paginate(base, "/api/v1.0/items/?page_size=100")
+             if item.get("filename", "").startswith(FILE_PREFIX)]
+    for item in items:
+        await user.api("DELETE", base, f"/api/v1.0/items/{item['id']}/")
+    return len(items)
+
+
+async def _for_each_user(names, password, urls, workers, action):
+    """Run `action(user, name)` for every user on `workers` concurrent sessions.
+
+    Prints one line per user. Returns the number of failures.
+    """
+    semaphore = asyncio.Semaphore(workers)
+    ssl_context = ssl.create_default_context()
+    total = len(names)
+    done = failures = 0
+
+    async def one(name):
+        nonlocal done, failures
+        async with semaphore:
+            user = bench.VirtualUser(bench.Bench(urls, name, password, None, ssl_context), recorder=None)
+            try:
+                summary = await action(user, name)
+            except (OSError, asyncio.TimeoutError, ValueError, KeyError, TypeError, bench.BenchError) as e:
+                failures += 1
+                summary = f"FAILED: {str(e)[:200]}"
+            finally:
+                user.close()
+            done += 1
+            print(f"  [{done:>{len(str(total))}}/{total}] {name}  {summary}", flush=True)
+
+    await asyncio.gather(*(one(name) for name in names))
+    return failures
+
+
+def _apps(env):
+    apps = [a for a in ("docs", "drive") if a in enabled_apps(env)]
+    if not apps:
+        print("Neither Docs nor Drive is enabled: only users are seeded.")
+    return apps
+
+
+def run(root_dir, users, docs_per_user=0, drive_gb=0.0, seed=0, workers=DEFAULT_WORKERS):
+    """Create (or complete) the seeded users and their content."""
+    env = load_env(root_dir)
+    domain = env.get("BASE_DOMAIN") or "masuite.localhost"
+    apps = _apps(env) if docs_per_user or drive_gb else []
+    budget = int(drive_gb * GIB / users) if users else 0
+    started = time.monotonic()
+
+    admin = _connect(root_dir, env, workers)
+    password = generate_password(24)
+    profiles = [profile(seed, i, domain) for i in range(1, users + 1)]
+    print(f"Seeding {users} users (seed {seed})...")
+    try:
+        ok = ensure_users(admin, profiles, password, min(workers, 4))
+    finally:
+        admin.close()
+
+    if apps:
+        print(f"Seeding content ({', '.join(apps)}, {workers} users at a time)...")
+        urls = bench.site_urls(env)
+        index_of = {p["email"]: i for i, p in enumerate(profiles, 1)}
+
+        async def seed_user(user, name):
+            index = index_of[name]
+            parts = []
+            if "docs" in apps and docs_per_user:
+                await user.app_login(urls["docs"])
+                created = await _seed_docs(user, urls["docs"], doc_titles(seed, index, docs_per_user))
+                parts.append(f"{created} docs created")
+            if "drive" in apps and budget:
+                await user.app_login(urls["drive"])
+                created = await _seed_drive(user, urls["drive"], seed, index, drive_files(seed, index, budget))
+                parts.append(f"{created / MIB:.0f} MiB uploaded")
+            return ", ".join(parts)
+
+        failures = asyncio.run(_for_each_user([p["email"] for p in profiles], password, urls, workers, seed_user))
+        ok = ok and not failures
+    print(f"Done in {time.monotonic() - started:.0f}s.")
+    if not ok:
+        print("Some users failed: run the same command again to complete them.")
+        sys.exit(1)
+
+
+def purge(root_dir, workers=DEFAULT_WORKERS):
+    """Delete the seeded content, then the seeded users."""
+    env = load_env(root_dir)
+    domain = env.get("BASE_DOMAIN") or "masuite.localhost"
+    apps = _apps(env)
+    admin = _connect(root_dir, env, workers)
+    try:
+        found = seeded_users(admin, domain)
+        if not found:
+            print("No seeded users found.")
+            return
+        print(f"Purging {len(found)} seeded users...")
+        password = generate_password(24)
+        if apps:
+            for _, _, error in imap_unordered(lambda u: _set_password(admin, u["id"], password),
+                                              found, workers=min(workers, 8)):
+                if error:
+                    print(f"  Could not reset a password: {error}")
+            urls = bench.site_urls(env)
+
+            async def purge_user(user, name):
+                counts = []
+                if "docs" in apps:
+                    await user.app_login(urls["docs"])
+                    counts.append(f"{await _purge_docs(user, urls['docs'])} docs")
+                if "drive" in apps:
+                    await user.app_login(urls["drive"])
+                    counts.append(f"{await _purge_drive(user, urls['drive'])} files")
+                return "deleted " + ", ".join(counts)
+
+            failures = asyncio.run(_for_each_user([u["username"] for u in found], password, urls,
+                                                  workers, purge_user))
+            if failures:
+                print("Some users' content could not be deleted; their accounts are kept. Run --purge again.")
+                sys.exit(1)
+
+        deleted = 0
+        for user, _, error in imap_unordered(lambda u: admin.delete(f"/users/{u['id']}"),
+                                             found, workers=min(workers, 8)):
+            if error:
+                print(f"  {user['username']}: FAILED: {error}")
+            else:
+                deleted += 1
+        print(f"Deleted {deleted} users.")
+    finally:
+        admin.close()
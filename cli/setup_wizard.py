@@ -1,58 +1,52 @@
 """Interactive setup wizard for MaSuite."""
 
+import gzip
 import json
 import os
 import secrets
 import string
 
-# ──────────────────────────────────────────────────────────────────────
-# Service Registry - loaded from services/*/metadata.json at import time.
-# SERVICE_REGISTRY: all services (including _base infrastructure)
-# APP_REGISTRY:     user-selectable apps only (excludes infrastructure)
-# ──────────────────────────────────────────────────────────────────────
-
-_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-
-def _load_service_registry():
-    """Load all service metadata from services/*/metadata.json files."""
-    registry = {}
-    services_dir = os.path.join(_PROJECT_ROOT, "services")
-    if not os.path.isdir(services_dir):
-        return registry
-    for entry in sorted(os.listdir(services_dir)):
-        meta_path = os.path.join(services_dir, entry, "metadata.json")
-        if os.path.isfile(meta_path):
-            with open(meta_path) as f:
-                registry[entry] = json.load(f)
-    return registry
-
-
-SERVICE_REGISTRY = _load_service_registry()
-APP_REGISTRY = {k: v for k, v in SERVICE_REGISTRY.items() if not v.get("is_infrastructure")}
+from . import celery_workers
+from . import editor
+from . import host as hostinfo
+from . import livekit
+from . import pgbouncer
+from . import postgres
+from . import redis
+from . import replica
+from . import resources
+from . import scale
+from . import tuning
+from .env import load_env
+from .registry import SERVICE_REGISTRY, APP_REGISTRY, APP_PORTS, APP_SUBDOMAINS
 
 # ── Derived views ─────────────────────────────────────────────────────
 
-_INFRA = SERVICE_REGISTRY.get("_base", {})
-
 APPS = [(k, v["label"], v["description"]) for k, v in APP_REGISTRY.items()]
 DEFAULT_APPS = {k for k, v in APP_REGISTRY.items() if v["default_enabled"]}
 
-# Unified port map: infra ports (homepage, keycloak, rustfs_console) + app ports
-APP_PORTS = {
-    **_INFRA.get("ports", {}),
-    **{k: v["port"] for k, v in APP_REGISTRY.items()},
-}
+GAUFRE_SCRIPT_URL = "https://static.suite.anct.gouv.fr/widgets/"
 
-# Unified subdomain map: infra subdomains (homepage, keycloak, rustfs, livekit) + app subdomains
-APP_SUBDOMAINS = {
-    **_INFRA.get("subdomains", {}),
-    **{k: v["subdomain"] for k, v in APP_REGISTRY.items()},
+APP_LOGOS = {k: v["logo"] for k, v in APP_REGISTRY.items() if v.get("logo")}
+
+# Caddy performance settings, overridable per service with a "caddy" object
+# in metadata.json. Timeouts/durations use Caddy syntax.
+CADDY_DEFAULTS = {
+    "encode": True,                  # encode zstd gzip on the site block
+    "immutable_paths": [],           # hashed asset paths, cached for a year
+    "precompressed": False,          # serve .gz siblings (static file_server only)
+    "keepalive": "2m",               # idle upstream connections kept this long
+    "keepalive_idle_conns": 32,      # idle connections kept per upstream host
+    "dial_timeout": "5s",
+    "response_header_timeout": "5m",  # slow uploads and exports
+    "stream_timeout": "24h",         # max websocket lifetime
+    "stream_close_delay": "5m",      # keep websockets open across Caddy reloads
 }
 
-GAUFRE_SCRIPT_URL = "https://static.suite.anct.gouv.fr/widgets/"
 
-APP_LOGOS = {k: v["logo"] for k, v in APP_REGISTRY.items() if v.get("logo")}
+def caddy_options(svc_id):
+    """Caddy settings for a service: CADDY_DEFAULTS overlaid with metadata."""
+    return {**CADDY_DEFAULTS, **SERVICE_REGISTRY.get(svc_id, {}).get("caddy", {})}
 
 
 def ask(prompt, default=None):
@@ -90,30 +84,13 @@ def generate_fernet_key():
     return base64.urlsafe_b64encode(secrets.token_bytes(32)).decode()
 
 
-def _load_existing_env(root_dir):
-    """Load existing .env values to preserve secrets on re-run."""
-    env = {}
-    env_path = os.path.join(root_dir, ".env")
-    if not os.path.exists(env_path):
-        return env
-    with open(env_path) as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "=" in line:
-                key, _, value = line.partition("=")
-                env[key.strip()] = value.strip()
-    return env
-
-
 def build_env(config):
     """Build the .env file contents from config dict.
 
     Preserves existing secrets from prior .env when re-running setup.
     """
     # Load existing env to preserve secrets
-    existing = _load_existing_env(config.get("root_dir", ""))
+    existing = load_env(config.get("root_dir", ""))
 
     def keep(key, new_value):
         """Return existing value if present, else new_value."""
@@ -130,6 +107,12 @@ def build_env(config):
 
     # Compose profiles
     profiles = list(enabled)
+    if config.get("pgbouncer"):
+        profiles.append("pgbouncer")
+    if config.get("egress"):
+        profiles.append(livekit.PROFILE)
+    if config.get("replica"):
+        profiles.append(replica.PROFILE)
     w(f'COMPOSE_PROFILES={",".join(sorted(profiles))}')
     w()
 
@@ -189,14 +172,35 @@ def build_env(config):
     # Per-app DB names (used by individual app compose files)
     for app_id in enabled:
         w(f"{app_id.upper()}_DB_NAME={app_id}_db")
-    # Consolidated list for postgres init script
-    db_names = " ".join(f"{app_id}_db" for app_id in sorted(enabled))
+    # Consolidated list for postgres init script (dedicated instances create their own)
+    dedicated_pg = config.get("pg_dedicated", [])
+    db_names = " ".join(f"{app_id}_db" for app_id in sorted(enabled) if app_id not in dedicated_pg)
     w(f"APP_DB_NAMES={db_names}")
+    # Where apps connect: PgBouncer pools when enabled, else postgres directly
+    if config.get("pgbouncer"):
+        w("APP_DB_HOST=pgbouncer")
+        w(f"APP_DB_PORT={pgbouncer.PORT}")
+    else:
+        w("APP_DB_HOST=postgres")
+        w("APP_DB_PORT=5432")
+    # Apps with their own instance (see cli/postgres.py)
+    w(f"{postgres.DEDICATED_KEY}={','.join(dedicated_pg)}")
+    for key, value in postgres.env_values(SERVICE_REGISTRY, enabled, dedicated_pg, config.get("pgbouncer", False)):
+        w(f"{key}={value}")
+    # Apps reading from the hot standby (see cli/replica.py)
+    replica_apps = config.get("replica_apps", []) if config.get("replica") else []
+    w(f"{replica.APPS_KEY}={','.join(replica_apps)}")
+    for key, value in replica.env_values(SERVICE_REGISTRY, enabled, dedicated_pg, replica_apps):
+        w(f"{key}={value}")
     w()
 
     # Redis
     w("# Redis")
     w(f"REDIS_PASSWORD={keep('REDIS_PASSWORD', generate_secret(32))}")
+    dedicated_redis = config.get("redis_dedicated", [])
+    w(f"{redis.DEDICATED_KEY}={','.join(dedicated_redis)}")
+    for key, value in redis.env_values(SERVICE_REGISTRY, enabled, dedicated_redis):
+        w(f"{key}={value}")
     w()
 
     # RustFS (S3-compatible storage)
@@ -237,12 +241,15 @@ def build_env(config):
         else:
             subdomain = APP_SUBDOMAINS["livekit"]
             w(f"LIVEKIT_URL=wss://{subdomain}.{domain}")
+        w(f'LIVEKIT_NODE_IP={config.get("livekit_node_ip", "")}')
+        w(f"LIVEKIT_UDP_PORTS={keep('LIVEKIT_UDP_PORTS', livekit.DEFAULT_UDP_PORTS)}")
+        w(f'LIVEKIT_BANDWIDTH_MBPS={config.get("livekit_bandwidth", livekit.DEFAULT_BANDWIDTH_MBPS)}')
         w()
 
     if "drive" in enabled:
         w("# Drive - Document editor")
-        editor = config.get("drive_editor", "collabora")
-        w(f"DRIVE_EDITOR={editor}")
+        w(f'DRIVE_EDITOR={config.get("drive_editor", "collabora")}')
+        w(f"{editor.USERS_KEY}={config.get('editor_users', editor.DEFAULT_USERS)}")
         w()
 
     if "conversations" in enabled:
@@ -284,6 +291,29 @@ def build_env(config):
             w("CALENDARS_CALDAV_OUTBOUND_API_KEY=")
         w()
 
+    # Celery task routing to dedicated queues (metadata.json "celery")
+    routing = celery_workers.routing_env(SERVICE_REGISTRY, enabled)
+    if routing:
+        w("# Celery queues")
+        for key, value in routing:
+            w(f"{key}={value}")
+        w()
+
+    # Host-aware tuning of postgres/redis/opensearch/celery (see cli/tuning.py)
+    w("# Tuning - host-aware, recompute with ./masuite tune")
+    manual = existing.get("MASUITE_TUNING") == "manual"
+    w(f"MASUITE_TUNING={'manual' if manual else 'auto'}")
+    w(f"MASUITE_LIMITS={resources.mode(existing)}")
+    host = config.get("host") or hostinfo.detect()
+    editor_replicas = scale.load(config.get("root_dir", "")).get(editor.SERVICE, 1)
+    settings = tuning.compute(host, SERVICE_REGISTRY, enabled, pooled=config.get("pgbouncer", False),
+                              editor_users=config.get("editor_users", editor.DEFAULT_USERS),
+                              editor_replicas=editor_replicas, dedicated_redis=dedicated_redis,
+                              dedicated_pg=dedicated_pg)
+    for key, value, _ in settings:
+        w(f"{key}={keep(key, value) if manual else value}")
+    w()
+
     # Backup
     w("# Backup")
     w("BACKUP_RETENTION_DAILY=7")
@@ -298,8 +328,10 @@ def generate_caddyfile(config):
     """Generate Caddyfile for reverse proxying all enabled apps.
 
     Per-service routing is defined in static Caddyfile snippets under
-    services/*/Caddyfile. This function generates the minimal stub that
-    loads the snippets and creates site blocks.
+    services/*/Caddyfile. This function generates the stub that loads the
+    snippets and creates site blocks, plus the per-service upstream
+    transport snippets (upstream-<id>, stream-<id>) the static snippets
+    import inside their reverse_proxy blocks.
     """
     enabled = config["enabled_apps"]
     mode = config["mode"]
@@ -318,7 +350,28 @@ def generate_caddyfile(config):
     w("}")
     w()
 
-    # Load all service Caddyfile snippets (including _base)
+    # Upstream transports, defined before the snippets that import them
+    for svc_id in SERVICE_REGISTRY:
+        opts = caddy_options(svc_id)
+        name = svc_id.lstrip("_")
+        for kind in ("upstream", "stream"):
+            w(f"({kind}-{name}) {{")
+            w("\ttransport http {")
+            w(f"\t\tkeepalive {opts['keepalive']}")
+            w(f"\t\tkeepalive_idle_conns_per_host {opts['keepalive_idle_conns']}")
+            w(f"\t\tdial_timeout {opts['dial_timeout']}")
+            if kind == "upstream":
+                w(f"\t\tresponse_header_timeout {opts['response_header_timeout']}")
+            w("\t}")
+            if kind == "stream":
+                w(f"\tstream_timeout {opts['stream_timeout']}")
+                w(f"\tstream_close_delay {opts['stream_close_delay']}")
+            w("}")
+            w()
+
+    # Upstream lists per scalable service (./masuite scale), then all
+    # service Caddyfile snippets (including _base)
+    w("import /etc/caddy/upstreams.caddy")
     w("import /etc/caddy/services/*/Caddyfile")
     w()
 
@@ -327,17 +380,41 @@ def generate_caddyfile(config):
             return f":{port}"
         return f"{subdomain}.{domain}" if subdomain else domain
 
+    def site(addr, snippet, svc_id):
+        opts = caddy_options(svc_id)
+        w(f"{addr} {{")
+        if opts["encode"]:
+            w("\tencode zstd gzip")
+        if opts["immutable_paths"]:
+            w(f"\t@immutable path {' '.join(opts['immutable_paths'])}")
+            w('\theader @immutable >Cache-Control "public, max-age=31536000, immutable"')
+        # JSON access log per site, read by ./masuite traffic. Rotated
+        # files stay uncompressed so they keep their inode (read offsets)
+        w("\tlog {")
+        w(f"\t\toutput file /var/log/caddy/{snippet}.log {{")
+        w("\t\t\troll_size 50MiB")
+        w("\t\t\troll_keep 5")
+        w("\t\t\troll_uncompressed")
+        w("\t\t\tmode 0644")
+        w("\t\t}")
+        w("\t\tformat json")
+        w("\t}")
+        w(f"\timport {snippet}")
+        if snippet == "homepage":
+            if opts["precompressed"]:
+                w("\tfile_server {")
+                w("\t\tprecompressed gzip")
+                w("\t}")
+            else:
+                w("\tfile_server")
+        w("}")
+        w()
+
     # --- Homepage ---
-    w(f"{site_address(APP_PORTS['homepage'], APP_SUBDOMAINS['homepage'])} {{")
-    w("\timport homepage")
-    w("}")
-    w()
+    site(site_address(APP_PORTS['homepage'], APP_SUBDOMAINS['homepage']), "homepage", "_base")
 
     # --- Keycloak ---
-    w(f"{site_address(APP_PORTS['keycloak'], APP_SUBDOMAINS['keycloak'])} {{")
-    w("\timport keycloak")
-    w("}")
-    w()
+    site(site_address(APP_PORTS['keycloak'], APP_SUBDOMAINS['keycloak']), "keycloak", "_base")
 
     # --- RustFS Console (local only) ---
     if mode == "local":
@@ -350,11 +427,7 @@ def generate_caddyfile(config):
     for app_id, app in APP_REGISTRY.items():
         if app_id not in enabled:
             continue
-        addr = site_address(app["port"], app["subdomain"])
-        w(f"{addr} {{")
-        w(f"\timport {app_id}")
-        w("}")
-        w()
+        site(site_address(app["port"], app["subdomain"]), app_id, app_id)
 
     # --- LiveKit (prod only, needs TLS termination) ---
     if "meet" in enabled and mode == "prod":
@@ -399,28 +472,18 @@ def generate_caddyfile(config):
     return "\n".join(lines)
 
 
-def generate_livekit_config(env_values):
-    """Generate livekit.yaml with actual secret values (not templates)."""
-    api_key = env_values.get("LIVEKIT_API_KEY", "")
-    api_secret = env_values.get("LIVEKIT_API_SECRET", "")
-    redis_password = env_values.get("REDIS_PASSWORD", "")
-    lines = [
-        "port: 7880",
-        "rtc:",
-        "  tcp_port: 7881",
-        "  udp_port: 7882",
-        "  use_external_ip: true",
-        "redis:",
-        "  address: redis:6379",
-        f"  password: {redis_password}",
-        "  db: 6",
-        "keys:",
-        f"  {api_key}: {api_secret}",
-        "logging:",
-        "  level: info",
-        "",
-    ]
-    return "\n".join(lines)
+def write_precompressed(paths):
+    """Write .gz siblings of generated files for Caddy's `precompressed gzip`.
+
+    Only for files setup writes: Caddy serves a sidecar without checking
+    it is fresh, so tracked files updated by `git pull` must not get one.
+    """
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(f"{path}.gz", "wb") as f:
+            # mtime=0 keeps the output stable across re-runs
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
 
 
 def generate_homepage_config(config):
@@ -533,6 +596,16 @@ def run(root_dir, preset_apps=None, preset_mode=None):
 
     config = {"enabled_apps": enabled, "root_dir": root_dir}
 
+    # Size check against the declared app budgets
+    host = hostinfo.detect()
+    config["host"] = host
+    needed = sum(ram for ram, _ in hostinfo.app_budgets(SERVICE_REGISTRY, enabled).values())
+    print()
+    print(f"  Host: {host['ram_mb'] / 1024:.1f} GB RAM, {host['cpus']} CPUs"
+          f" -- selected apps need about {needed / 1024:.1f} GB")
+    if hostinfo.headroom_mb(host, SERVICE_REGISTRY, enabled) < 0:
+        print("  WARNING: this host has less memory than the selected apps need.")
+
     # -- Step 2: Mode --
     print()
     if preset_mode:
@@ -575,6 +648,9 @@ def run(root_dir, preset_apps=None, preset_mode=None):
         print()
         choice = ask("  Choose", "1")
         config["drive_editor"] = "onlyoffice" if choice == "2" else "collabora"
+        previous = load_env(root_dir).get(editor.USERS_KEY, editor.DEFAULT_USERS)
+        users = ask("  Expected concurrent editors (sizes the editor)", str(previous))
+        config["editor_users"] = editor.users({editor.USERS_KEY: users})
 
     # Conversations: LLM endpoint (optional)
     if "conversations" in enabled:
@@ -595,6 +671,24 @@ def run(root_dir, preset_apps=None, preset_mode=None):
             config["llm_api_key"] = ""
             config["llm_model"] = ""
 
+    # Meet: media server capacity
+    if "meet" in enabled:
+        previous = load_env(root_dir)
+        print()
+        print("  Meet: LiveKit media server.")
+        print("  Calls are capped to what this host's CPUs and bandwidth can carry.")
+        print()
+        if mode == "prod":
+            config["livekit_node_ip"] = ask(
+                "  Public IP for media (leave empty to auto-detect)",
+                previous.get("LIVEKIT_NODE_IP", ""),
+            )
+        bandwidth = ask("  Server upload bandwidth in Mbit/s",
+                        previous.get("LIVEKIT_BANDWIDTH_MBPS", str(livekit.DEFAULT_BANDWIDTH_MBPS)))
+        config["livekit_bandwidth"] = bandwidth if bandwidth.isdigit() else livekit.DEFAULT_BANDWIDTH_MBPS
+        was_egress = livekit.PROFILE in previous.get("COMPOSE_PROFILES", "").split(",")
+        config["egress"] = ask_yn("  Enable call recording (LiveKit egress, CPU-heavy)?", was_egress)
+
     # Messages: SMTP relay (optional)
     if "messages" in enabled:
         print()
@@ -614,10 +708,63 @@ def run(root_dir, preset_apps=None, preset_mode=None):
             config["smtp_relay_user"] = ""
             config["smtp_relay_password"] = ""
 
+    # Connection pooling
+    existing = load_env(root_dir)
+    print()
+    print("  PgBouncer pools app connections to PostgreSQL (fewer, cheaper")
+    print("  server connections). Recommended with three or more apps.")
+    print()
+    was_pooled = "pgbouncer" in existing.get("COMPOSE_PROFILES", "").split(",")
+    config["pgbouncer"] = ask_yn("  Enable PgBouncer?", was_pooled or len(enabled) >= 3)
+
+    # Redis isolation
+    candidates = [a for a in sorted(enabled) if redis.uses_redis(SERVICE_REGISTRY[a])]
+    if candidates:
+        previous = existing.get(redis.DEDICATED_KEY)
+        default = previous if previous is not None else ",".join(
+            redis.default_dedicated(SERVICE_REGISTRY, enabled))
+        print()
+        print("  Apps share one Redis instance. Busy ones can get their own, so their")
+        print(f"  queues don't slow the others ({', '.join(candidates)}).")
+        print("  Changing this doesn't move data: an app's pending tasks and sessions")
+        print("  stay on its old instance, so let its queue drain first.")
+        print()
+        answer = ask("  Apps with their own Redis (comma-separated, - for none)", default or "-")
+        config["redis_dedicated"] = [a.strip() for a in answer.split(",") if a.strip() in candidates]
+
+    # PostgreSQL isolation: chosen on first setup, later changes move data (db move)
+    previous = existing.get(postgres.DEDICATED_KEY)
+    if previous is None and not os.path.isdir(os.path.join(root_dir, "data", postgres.SHARED)):
+        print()
+        print("  Apps share one PostgreSQL instance. Busy ones can get their own, with")
+        print(f"  its own tuning and data directory ({', '.join(sorted(enabled))}).")
+        print()
+        answer = ask("  Apps with their own PostgreSQL (comma-separated, - for none)", "-")
+        config["pg_dedicated"] = [a.strip() for a in answer.split(",") if a.strip() in enabled]
+    else:
+        config["pg_dedicated"] = [a for a in postgres.dedicated(existing) if a in enabled]
+        print()
+        print("  To give an app its own PostgreSQL, run: ./masuite db move <app>")
+
+    # Hot standby for backups and read offload
+    print()
+    print("  A PostgreSQL hot standby takes backups off the main instance and can")
+    print("  serve the read-only queries of some apps. Uses as much memory again.")
+    print()
+    was_replica = replica.PROFILE in existing.get("COMPOSE_PROFILES", "").split(",")
+    config["replica"] = ask_yn("  Run a PostgreSQL replica?", was_replica)
+    readers = replica.candidates(SERVICE_REGISTRY, enabled, config["pg_dedicated"])
+    if config["replica"] and readers:
+        previous = ",".join(a for a in replica.routed(existing) if a in readers)
+        print()
+        print("  Reads routed to the replica may lag writes by a fraction of a second.")
+        print()
+        answer = ask(f"  Apps reading from the replica ({', '.join(readers)}; - for none)", previous or "-")
+        config["replica_apps"] = [a.strip() for a in answer.split(",") if a.strip() in readers]
+
     # -- Generate everything --
     print()
     print("  Generating configuration...", end=" ", flush=True)
-    existing = _load_existing_env(root_dir)
     config["keycloak_admin_password"] = existing.get(
         "KEYCLOAK_ADMIN_PASSWORD", generate_password()
     )
@@ -634,7 +781,6 @@ def run(root_dir, preset_apps=None, preset_mode=None):
     homepage_config_json = generate_homepage_config(config)
     gaufre_services_json = generate_gaufre_services(config)
     docs_theme_json = generate_docs_theme(config) if "docs" in enabled else None
-    livekit_yaml = generate_livekit_config(env_values) if "meet" in enabled else None
     print("done")
 
     # Write files
@@ -648,6 +794,7 @@ def run(root_dir, preset_apps=None, preset_mode=None):
     os.makedirs(caddy_dir, exist_ok=True)
     with open(os.path.join(caddy_dir, "Caddyfile"), "w") as f:
         f.write(caddyfile_content)
+    scale.write_upstreams(root_dir, SERVICE_REGISTRY)
 
     hp_dir = os.path.join(root_dir, "config", "homepage")
     os.makedirs(hp_dir, exist_ok=True)
@@ -655,16 +802,21 @@ def run(root_dir, preset_apps=None, preset_mode=None):
         f.write(homepage_config_json)
     with open(os.path.join(hp_dir, "gaufre-services.json"), "w") as f:
         f.write(gaufre_services_json)
+    if caddy_options("_base")["precompressed"]:
+        write_precompressed([os.path.join(hp_dir, "config.json"), os.path.join(hp_dir, "gaufre-services.json")])
 
     if docs_theme_json:
         with open(os.path.join(root_dir, "config", "docs-theme.json"), "w") as f:
             f.write(docs_theme_json)
 
-    if livekit_yaml:
-        lk_dir = os.path.join(root_dir, "config", "livekit")
-        os.makedirs(lk_dir, exist_ok=True)
-        with open(os.path.join(lk_dir, "livekit.yaml"), "w") as f:
-            f.write(livekit_yaml)
+    redis.write(root_dir, env_values, SERVICE_REGISTRY, enabled)
+    postgres.write(root_dir, env_values, SERVICE_REGISTRY, enabled)
+    resources.write(root_dir, env_values, config.get("host"))
+    if config["pgbouncer"]:
+        pgbouncer.write(root_dir, env_values, SERVICE_REGISTRY, enabled)
+
+    if "meet" in enabled:
+        livekit.write(root_dir, env_values, config["host"])
 
     print("done")
 
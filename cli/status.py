@@ -5,7 +5,18 @@ import os
 import shutil
 import subprocess
 
-from .setup_wizard import SERVICE_REGISTRY, APP_REGISTRY
+from . import celery_workers
+from . import host as hostinfo
+from . import pgbouncer
+from . import postgres
+from . import redis
+from . import replica
+from . import resources
+from .env import load_env, compose_profiles, enabled_apps
+from .registry import SERVICE_REGISTRY, APP_REGISTRY
+
+# Usage above this fraction of a service's memory limit is flagged
+LIMIT_WARNING = 0.8
 
 
 def _build_service_groups():
@@ -47,6 +58,12 @@ def _parse_docker_size(s):
         return -1
 
 
+def _replica_number(container):
+    """Replica index from a compose container name (masuite-drive-backend-2 -> 2)."""
+    suffix = container.get("Name", "").rsplit("-", 1)[-1]
+    return int(suffix) if suffix.isdigit() else 0
+
+
 def run(root_dir, compose_cmd):
     """Display comprehensive status information."""
 
@@ -94,31 +111,40 @@ def run(root_dir, compose_cmd):
                 }
 
     # 3. Build service name -> container info map
+    #    (scaled services have several containers, one per replica)
     svc_map = {}
     for c in containers:
         svc = c.get("Service", c.get("Name", ""))
-        svc_map[svc] = c
+        svc_map.setdefault(svc, []).append(c)
+    for replicas in svc_map.values():
+        replicas.sort(key=_replica_number)
 
     # 4. Read URLs from .env
-    env_path = os.path.join(root_dir, ".env")
-    env_vars = {}
-    profiles = set()
-    if os.path.exists(env_path):
-        with open(env_path) as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#") and "=" in line:
-                    k, _, v = line.partition("=")
-                    env_vars[k.strip()] = v.strip()
-        profiles = {p.strip() for p in env_vars.get("COMPOSE_PROFILES", "").split(",")}
+    env_vars = load_env(root_dir)
+    profiles = compose_profiles(env_vars)
+    apps = enabled_apps(env_vars)
 
     mode = env_vars.get("MASUITE_MODE", "unknown")
 
+    # Dedicated Postgres and Redis instances are shown with their app
+    groups = {name: list(services) for name, services in SERVICE_GROUPS.items()}
+    for service, app_id in postgres.instances(env_vars, apps):
+        groups[SERVICE_REGISTRY[app_id]["label"]].append(service)
+    for service, _ in redis.instances(env_vars, SERVICE_REGISTRY, apps)[1:]:
+        app_id = service[len(redis.SHARED) + 1:]
+        groups[SERVICE_REGISTRY[app_id]["label"]].append(service)
+
+    limits_mode = resources.mode(env_vars)
+    limits = {}
+    if limits_mode != "off":
+        limits = resources.compute(hostinfo.detect(), SERVICE_REGISTRY, apps, env_vars)
+    near_limit = []
+
     # 5. Print header
     print()
     print("  MaSuite Status")
     print("  " + "=" * 60)
-    print(f"  Mode: {mode}    Apps: {', '.join(sorted(profiles))}")
+    print(f"  Mode: {mode}    Apps: {', '.join(sorted(apps))}")
     print()
 
     # 6. Print service table grouped by app
@@ -126,19 +152,19 @@ def run(root_dir, compose_cmd):
     total_cpu = 0.0
 
     header = f"  {'Service':<28} {'Status':<12} {'CPU':>7} {'Memory':>10}"
+    if limits:
+        header += f" {'Limit':>8} {'Used':>5}"
     print(header)
-    print("  " + "-" * 60)
+    print("  " + "-" * (75 if limits else 60))
 
-    for group_name, services in SERVICE_GROUPS.items():
+    for group_name, services in groups.items():
         # Check if any service in this group is present
-        group_services = [(s, svc_map.get(s)) for s in services if s in svc_map]
+        group_services = [(s, c) for s in services for c in svc_map.get(s, [])]
         if not group_services:
             continue
 
         print(f"  {group_name}")
         for svc_name, c in group_services:
-            if c is None:
-                continue
             state = c.get("State", "unknown")
             health = c.get("Health", "")
 
@@ -171,17 +197,89 @@ def run(root_dir, compose_cmd):
             if mem_str != "-":
                 total_mem += _parse_docker_size(mem_str)
 
-            # Short name: strip "masuite-" prefix and "-1" suffix
+            # Replicas are shown as service#N
             short = svc_name
-
-            print(f"    {short:<26} {status_str:<12} {cpu_str:>7} {mem_str:>10}")
+            if len(svc_map[svc_name]) > 1:
+                short = f"{svc_name}#{_replica_number(c)}"
+
+            line = f"    {short:<26} {status_str:<12} {cpu_str:>7} {mem_str:>10}"
+            limit = limits.get(svc_name)
+            if limit:
+                limit_str = f"{limit['memory']}MB"
+                used_str = "-"
+                if mem_str != "-":
+                    used = _parse_docker_size(mem_str) / (limit["memory"] * 1024**2)
+                    used_str = f"{used:.0%}"
+                    if used >= LIMIT_WARNING:
+                        near_limit.append((svc_name, used))
+                        used_str += "!"
+                line += f" {limit_str:>8} {used_str:>5}"
+            print(line)
 
     # 7. Totals
-    print("  " + "-" * 60)
+    print("  " + "-" * (75 if limits else 60))
     print(f"  {'Total':<28} {'':<12} {total_cpu:>6.1f}% {_fmt_bytes(total_mem):>10}")
     print()
 
-    # 8. Disk usage
+    if near_limit:
+        action = "will be OOM-killed" if limits_mode == "enforce" else "would be OOM-killed under enforce"
+        print(f"  Near memory limit ({limits_mode}; services at 100% {action}):")
+        for svc_name, used in near_limit:
+            print(f"    {svc_name:<26} {used:.0%} of {limits[svc_name]['memory']}MB")
+        print("  Raise the app's \"ram\" budget in services/<app>/metadata.json or run ./masuite tune.")
+        print()
+
+    # 8. Connection pools
+    if "pgbouncer" in profiles and pgbouncer.SERVICE in svc_map:
+        pools = pgbouncer.pool_stats(compose_cmd, env_vars)
+        if pools is None:
+            print("  Connection pools: PgBouncer not reachable.")
+        else:
+            print("  Connection pools (PgBouncer):")
+            print(f"    {'Database':<20} {'Mode':<12} {'Clients':>8} {'Waiting':>8} "
+                  f"{'Server':>7} {'Idle':>5} {'Used':>5}")
+            for p in pools:
+                used = f"{p['sv_active'] / p['size']:.0%}" if p["size"] else "-"
+                if p["cl_waiting"]:
+                    used += "!"
+                print(f"    {p['database']:<20} {p['mode']:<12} {p['cl_active']:>8} {p['cl_waiting']:>8} "
+                      f"{p['sv_active']:>7} {p['sv_idle']:>5} {used:>5}")
+            waiting = [p for p in pools if p["cl_waiting"]]
+            if waiting:
+                print("    ! clients waiting for a server connection: pool saturated "
+                      f"(longest wait {max(p['maxwait'] for p in waiting)}s).")
+        print()
+
+    # Replication (hot standby)
+    if replica.PROFILE in profiles:
+        current = replica.status(compose_cmd)
+        if current is None:
+            print("  Replication: postgres not reachable.")
+        else:
+            lag = "-" if current["lag_bytes"] is None else _fmt_bytes(current["lag_bytes"])
+            delay = "-" if current["replay_lag"] is None else f"{current['replay_lag']:.1f}s"
+            print(f"  Replication ({replica.SERVICE}): {current['state']}, "
+                  f"{lag} behind, replay lag {delay}")
+            if current["wal_status"] == "lost":
+                print(f"    ! the primary dropped WAL the replica needs: stop {replica.SERVICE}, "
+                      f"delete data/{replica.SERVICE}/ and start it again to re-clone.")
+            elif current["state"] != "streaming":
+                print(f"    ! backups are taken from postgres until {replica.SERVICE} streams again.")
+        print()
+
+    # 9. Celery workers
+    workers = celery_workers.describe(env_vars, SERVICE_REGISTRY, apps)
+    if workers:
+        print("  Celery workers:")
+        print(f"    {'Service':<26} {'Queues':<18} {'Autoscale':>9} {'Prefetch':>8} {'Recycle':>8}  State")
+        for service, queues, autoscale, prefetch, max_tasks in workers:
+            states = [c.get("State", "unknown") for c in svc_map.get(service, [])]
+            state = ",".join(sorted(set(states))) or "not created"
+            print(f"    {service:<26} {queues:<18} {autoscale:>9} {prefetch:>8} {max_tasks:>8}  {state}")
+        print("    (autoscale max,min processes; recycle = max tasks per child)")
+        print()
+
+    # 10. Disk usage
     data_dir = os.path.join(root_dir, "data")
     if os.path.isdir(data_dir):
         print("  Disk usage (data/):")
@@ -208,12 +306,12 @@ def run(root_dir, compose_cmd):
         print(f"    {'Total':<20} {_fmt_bytes(total_disk):>10}")
         print()
 
-    # 9. Overall disk free
+    # 11. Overall disk free
     disk = shutil.disk_usage(root_dir)
     used_pct = disk.used / disk.total * 100
     print(f"  System disk: {_fmt_bytes(disk.used)} / {_fmt_bytes(disk.total)} ({used_pct:.0f}% used)")
 
-    # 10. URLs (derived from registry)
+    # 12. URLs (derived from registry)
     url_entries = [("Homepage", "HOMEPAGE_URL")]
     for app_id, app in APP_REGISTRY.items():
         url_entries.append((app["label"], f"{app_id.upper()}_URL"))
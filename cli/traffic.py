@@ -0,0 +1,262 @@
+"""Per-app traffic and latency from Caddy access logs (`./masuite traffic`).
+
+Every site block of the generated Caddyfile writes JSON access logs to
+data/logs/caddy/<site>.log. Caddy rotates them by size (renaming to
+<site>-<time>.log, uncompressed), so a file keeps its inode when rotated.
+
+Runs read only what was appended since the previous one: the read offset
+of each log file is kept by inode in .masuite/traffic/state.json, along
+with hourly aggregates per site and route:
+
+- request count, status classes (2xx, 3xx, 4xx, 5xx);
+- a latency histogram with logarithmic buckets (4 per doubling, ~19%
+  wide), from which p50/p95/p99 are read.
+
+Aggregates older than RETENTION_HOURS are dropped. Routes are request
+paths with ids (numbers, UUIDs, hashes, long tokens) replaced by `:id`.
+"""
+
+import datetime
+import glob
+import json
+import math
+import os
+import re
+
+from .env import state_path
+
+LOG_DIR = os.path.join("data", "logs", "caddy")
+RETENTION_HOURS = 7 * 24
+# Routes kept per site and hour; rarer ones are counted as "(other)"
+MAX_ROUTES = 300
+OTHER_ROUTE = "(other)"
+BUCKETS_PER_DOUBLING = 4
+MAX_BUCKET = BUCKETS_PER_DOUBLING * 18  # 2^18 ms, ~4 min
+ROUTE_DEPTH = 6
+
+_ID_SEGMENT = re.compile(
+    r"^(\d+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{16,}|[A-Za-z0-9_-]{24,})$",
+    re.IGNORECASE,
+)
+
+
+def route(uri):
+    """Normalize a request URI to a route: query dropped, ids collapsed, depth capped."""
+    path = uri.split("?", 1)[0]
+    segments = [":id" if _ID_SEGMENT.match(s) else s for s in path.split("/") if s]
+    if len(segments) > ROUTE_DEPTH:
+        segments = segments[:ROUTE_DEPTH] + ["*"]
+    return "/" + "/".join(segments)
+
+
+def bucket(ms):
+    """Histogram bucket of a latency: upper bound 2^(i/4) ms."""
+    if ms <= 1:
+        return 0
+    return min(MAX_BUCKET, math.ceil(BUCKETS_PER_DOUBLING * math.log2(ms)))
+
+
+def bucket_ms(index):
+    return 2 ** (index / BUCKETS_PER_DOUBLING)
+
+
+def percentile(histogram, fraction):
+    """Latency (ms) under which `fraction` of requests fall, from a {bucket: count} histogram."""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    target = fraction * total
+    seen = 0
+    for index in sorted(histogram):
+        seen += histogram[index]
+        if seen >= target:
+            return bucket_ms(index)
+    return bucket_ms(max(histogram))
+
+
+def _new_stats():
+    return {"n": 0, "status": {}, "hist": {}, "ms": 0.0}
+
+
+def _add(stats, status, ms):
+    stats["n"] += 1
+    cls = f"{status // 100}xx" if status else "err"
+    stats["status"][cls] = stats["status"].get(cls, 0) + 1
+    b = str(bucket(ms))
+    stats["hist"][b] = stats["hist"].get(b, 0) + 1
+    stats["ms"] += ms
+
+
+def _merge(into, stats):
+    into["n"] += stats["n"]
+    into["ms"] += stats["ms"]
+    for key in ("status", "hist"):
+        for k, v in stats[key].items():
+            into[key][k] = into[key].get(k, 0) + v
+
+
+# --- state ---
+
+def _state_file(root_dir):
+    return state_path(root_dir, "traffic", "state.json")
+
+
+def load_state(root_dir):
+    try:
+        with open(_state_file(root_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}, "hours": {}}
+
+
+def save_state(root_dir, state):
+    path = _state_file(root_dir)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+
+
+def _site(path):
+    """Site of a log file: docs.log and docs-2026-10-19T04-37-12.000.log -> docs."""
+    name = os.path.basename(path)[:-len(".log")]
+    return re.sub(r"-\d{4}-\d{2}-\d{2}T[\d.-]+$", "", name)
+
+
+def _ingest_line(line, site, hours):
+    try:
+        entry = json.loads(line)
+        request = entry["request"]
+        ts = float(entry["ts"])
+    except (ValueError, KeyError, TypeError):
+        return False
+    hour = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime("%Y-%m-%dT%H")
+    routes = hours.setdefault(hour, {}).setdefault(site, {})
+    key = route(request.get("uri", "/"))
+    if key not in routes and len(routes) >= MAX_ROUTES:
+        key = OTHER_ROUTE
+    stats = routes.get(key)
+    if stats is None:
+        stats = routes[key] = _new_stats()
+    _add(stats, int(entry.get("status") or 0), float(entry.get("duration") or 0) * 1000)
+    return True
+
+
+def update(root_dir):
+    """Read new access log data into the stored aggregates. Returns (state, lines read)."""
+    state = load_state(root_dir)
+    files = state["files"]
+    seen = {}
+    read = 0
+    for path in sorted(glob.glob(os.path.join(root_dir, LOG_DIR, "*.log"))):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        inode = str(st.st_ino)
+        offset = files.get(inode, {}).get("offset", 0)
+        if st.st_size < offset:
+            offset = 0  # truncated, or a new file reusing the inode
+        if st.st_size > offset:
+            site = _site(path)
+            with open(path, "rb") as f:
+                f.seek(offset)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break  # being written; read it next time
+                    offset += len(raw)
+                    read += _ingest_line(raw, site, state["hours"])
+        seen[inode] = {"path": os.path.relpath(path, root_dir), "offset": offset}
+    # Forget files removed by rotation, and expired hours
+    state["files"] = seen
+    cutoff = (datetime.datetime.now(datetime.timezone.utc)
+              - datetime.timedelta(hours=RETENTION_HOURS)).strftime("%Y-%m-%dT%H")
+    state["hours"] = {h: v for h, v in state["hours"].items() if h >= cutoff}
+    save_state(root_dir, state)
+    return state, read
+
+
+def aggregate(state, hours, by_route=False, site=None):
+    """Sum the last `hours` hours: {(site, route or None): stats}, and the window in seconds."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cutoff = (now - datetime.timedelta(hours=hours)).strftime("%Y-%m-%dT%H")
+    result = {}
+    first = None
+    for hour, sites in state["hours"].items():
+        if hour < cutoff:
+            continue
+        first = min(first or hour, hour)
+        for name, routes in sites.items():
+            if site and name != site:
+                continue
+            for path, stats in routes.items():
+                key = (name, path if by_route else None)
+                _merge(result.setdefault(key, _new_stats()), stats)
+    if first is None:
+        return result, 0
+    start = datetime.datetime.strptime(first, "%Y-%m-%dT%H").replace(tzinfo=datetime.timezone.utc)
+    return result, max(1.0, (now - start).total_seconds())
+
+
+def _row(label, stats, window, width):
+    hist = {int(k): v for k, v in stats["hist"].items()}
+    n = stats["n"]
+    mix = " ".join(f"{stats['status'].get(c, 0) / n:>4.0%}" for c in ("2xx", "3xx", "4xx", "5xx"))
+    p50, p95, p99 = (percentile(hist, f) for f in (0.5, 0.95, 0.99))
+    return (f"  {label:<{width}} {n:>9} {n / window:>7.2f} {mix}  "
+            f"{p50:>7.0f} {p95:>7.0f} {p99:>7.0f}")
+
+
+def _header(first, width):
+    return (f"  {first:<{width}} {'Requests':>9} {'Req/s':>7} {'2xx':>4} {'3xx':>4} {'4xx':>4} {'5xx':>4}  "
+            f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7}")
+
+
+def parse_window(text):
+    """Window in hours from "6h" or "2d" (a bare number is hours)."""
+    match = re.fullmatch(r"(\d+)\s*([hd]?)", text.strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"invalid window {text!r}, expected e.g. 6h or 2d")
+    return int(match.group(1)) * (24 if match.group(2) == "d" else 1)
+
+
+def run(root_dir, hours=1, app=None, routes=False, slow=False, top=20, min_requests=10):
+    """Update aggregates from new log data and print the report."""
+    if not os.path.isdir(os.path.join(root_dir, LOG_DIR)):
+        print(f"No access logs in {LOG_DIR}/. Re-run ./masuite setup to enable them, then ./masuite restart.")
+        return
+    state, read = update(root_dir)
+    print()
+    print(f"  Traffic (last {hours}h, {read} new log lines read)")
+    print()
+
+    per_site, window = aggregate(state, hours, site=app)
+    if not per_site:
+        print("  No requests in this window.")
+        print()
+        return
+    width = max(14, *(len(s) for s, _ in per_site))
+    print(_header("Site", width))
+    for (site, _), stats in sorted(per_site.items(), key=lambda kv: -kv[1]["n"]):
+        print(_row(site, stats, window, width))
+    print()
+
+    if routes or slow:
+        per_route, _ = aggregate(state, hours, by_route=True, site=app)
+        items = [(f"{s} {r}", stats) for (s, r), stats in per_route.items()]
+        if slow:
+            title = f"Slowest routes (p95, at least {min_requests} requests)"
+            items = [(k, v) for k, v in items if v["n"] >= min_requests]
+            items.sort(key=lambda kv: -(percentile({int(b): c for b, c in kv[1]["hist"].items()}, 0.95) or 0))
+        else:
+            title = "Busiest routes"
+            items.sort(key=lambda kv: -kv[1]["n"])
+        items = items[:top]
+        if items:
+            width = max(len(k) for k, _ in items)
+            print(f"  {title}:")
+            print(_header("Route", width))
+            for label, stats in items:
+                print(_row(label, stats, window, width))
+            print()
+    print("  Latencies are histogram bucket bounds (within ~19%). Rates are averaged over the window.")
+    print()
@@ -0,0 +1,79 @@
+"""Recompute host-aware settings (`./masuite tune`)."""
+
+from . import celery_workers
+from . import editor
+from . import host as hostinfo
+from . import livekit
+from . import postgres
+from . import redis
+from . import resources
+from . import scale
+from . import tuning
+from .env import load_env, enabled_apps, compose_profiles, update_env
+
+
+def run(root_dir, dry_run=False):
+    """Detect host resources, recompute tuning and write it to .env."""
+    from .registry import SERVICE_REGISTRY
+
+    env = load_env(root_dir)
+    enabled = enabled_apps(env)
+    host = hostinfo.detect()
+    budgets = hostinfo.app_budgets(SERVICE_REGISTRY, enabled)
+    declared = sum(ram for ram, _ in budgets.values())
+    headroom = hostinfo.headroom_mb(host, SERVICE_REGISTRY, enabled)
+
+    print()
+    print(f"  Host: {host['ram_mb']} MB RAM, {host['cpus']} CPUs")
+    print(f"  Declared budgets: {declared} MB ({', '.join(f'{k} {r}' for k, (r, _) in sorted(budgets.items()))})")
+    print(f"  OS reserve: {hostinfo.os_reserve_mb(host['ram_mb'])} MB    Headroom: {headroom} MB")
+    if headroom < 0:
+        print("  WARNING: the enabled apps' budgets exceed this host's memory; using minimum settings.")
+    print()
+
+    pooled = "pgbouncer" in compose_profiles(env)
+    editor_users = editor.users(env)
+    editor_replicas = scale.load(root_dir).get(editor.SERVICE, 1)
+    settings = tuning.compute(host, SERVICE_REGISTRY, enabled, pooled=pooled, editor_users=editor_users,
+                              editor_replicas=editor_replicas, dedicated_redis=redis.dedicated(env),
+                              dedicated_pg=postgres.dedicated(env))
+    print(tuning.render_table(settings))
+    print()
+    if "drive" in enabled and editor.recommended_replicas(editor_users) > editor_replicas:
+        wanted = editor.recommended_replicas(editor_users)
+        print(f"  {editor_users} concurrent editors is more than {editor_replicas} Collabora "
+              f"replica{'s' if editor_replicas > 1 else ''} handle well "
+              f"({editor.USERS_PER_REPLICA} each): ./masuite scale {editor.SERVICE}={wanted}")
+        print()
+
+    manual = env.get("MASUITE_TUNING") == "manual"
+    limits_mode = resources.mode(env)
+    if limits_mode != "off":
+        tuned = env if manual else {**env, **{key: value for key, value, _ in settings}}
+        limits = resources.compute(host, SERVICE_REGISTRY, enabled, tuned)
+        print(f"  Resource limits ({limits_mode}, MASUITE_LIMITS in .env):")
+        print(resources.render_table(limits))
+        print()
+
+    if dry_run:
+        print("  Dry run, .env not changed.")
+        return
+    if manual:
+        print("  MASUITE_TUNING=manual in .env: values above were not written.")
+        print("  Set MASUITE_TUNING=auto to let ./masuite tune manage them.")
+        resources.write(root_dir, env, host)
+        return
+
+    update_env(root_dir, {
+        "MASUITE_TUNING": "auto",
+        **{key: value for key, value, _ in settings},
+    }, header="Tuning - host-aware, recompute with ./masuite tune")
+    # Queue routing follows metadata.json; keep it in sync too
+    update_env(root_dir, dict(celery_workers.routing_env(SERVICE_REGISTRY, enabled)),
+               header="Celery queues")
+    env = load_env(root_dir)
+    resources.write(root_dir, env, host)
+    if "meet" in enabled:
+        livekit.write(root_dir, env, host)
+    print("  Written to .env and config/. Run ./masuite restart to apply.")
+    print()
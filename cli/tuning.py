@@ -0,0 +1,178 @@
+"""Host-aware tuning of the shared PostgreSQL, Redis, OpenSearch and Keycloak services,
+of dedicated PostgreSQL instances, of the apps' celery workers, Drive's document editor and Meet's LiveKit.
+
+Settings are derived from host RAM/CPUs minus the declared `ram` budgets of
+_base and the enabled apps (services/*/metadata.json), and written to .env
+as plain variables that the compose files pass to each service, e.g.
+`postgres -c shared_buffers=${PG_SHARED_BUFFERS}`.
+
+Every value comes with a one-line explanation, shown by `./masuite tune`.
+Set MASUITE_TUNING=manual in .env to keep hand-edited values.
+"""
+
+from . import celery_workers
+from . import editor
+from . import host as hostinfo
+from . import livekit
+from . import redis
+
+# Estimated Postgres connections per enabled app (gunicorn + celery processes)
+DJANGO_APP_CONNECTIONS = 20
+OTHER_APP_CONNECTIONS = 10
+KEYCLOAK_CONNECTIONS = 25
+RESERVED_CONNECTIONS = 10
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, int(value)))
+
+
+def postgres_memory_mb(host, registry, enabled):
+    """Memory Postgres may plan for: its share of _base plus half the headroom."""
+    base_ram = registry.get("_base", {}).get("ram", 1536)
+    headroom = max(0, hostinfo.headroom_mb(host, registry, enabled))
+    return _clamp(base_ram * 0.3 + headroom * 0.5, 256, host["ram_mb"] // 2)
+
+
+def app_connections(registry, enabled, pooled=False):
+    """Postgres connections opened by the enabled apps."""
+    if pooled:
+        from . import pgbouncer
+        return pgbouncer.server_connections(registry, enabled)
+    total = 0
+    for app_id in enabled:
+        app = registry.get(app_id, {})
+        total += DJANGO_APP_CONNECTIONS if app.get("is_django") else OTHER_APP_CONNECTIONS
+    return total
+
+
+def max_connections(registry, enabled, pooled=False):
+    total = KEYCLOAK_CONNECTIONS + RESERVED_CONNECTIONS
+    return max(100, total + app_connections(registry, enabled, pooled))
+
+
+def postgres_instance(host, registry, enabled, app_id, pooled=False):
+    """Settings of an app's dedicated Postgres instance (cli/postgres.py)."""
+    settings = []
+
+    def s(key, value, why):
+        settings.append((f"{app_id.upper()}_PG_{key}", str(value), why))
+
+    ram = registry.get(app_id, {}).get("ram", 512)
+    headroom = max(0, hostinfo.headroom_mb(host, registry, enabled))
+    pg_mem = _clamp(ram * 0.5 + headroom * 0.1, 256, host["ram_mb"] // 4)
+    conns = max(50, app_connections(registry, [app_id], pooled) + RESERVED_CONNECTIONS)
+    shared_buffers = _clamp(pg_mem * 0.25, 64, 4096)
+    s("SHARED_BUFFERS", f"{shared_buffers}MB",
+      f"25% of a {pg_mem} MB budget (half of {app_id}'s {ram} MB + 10% of headroom)")
+    s("EFFECTIVE_CACHE_SIZE", f"{_clamp(pg_mem * 0.75, shared_buffers * 2, host['ram_mb'] // 4)}MB",
+      "planner hint: instance budget plus OS page cache")
+    s("MAX_CONNECTIONS", conns,
+      f"{app_id}'s {'PgBouncer pool' if pooled else 'connections'} + {RESERVED_CONNECTIONS} admin (min 50)")
+    s("WORK_MEM", f"{_clamp((pg_mem - shared_buffers) / (conns * 2), 4, 64)}MB",
+      "remaining budget spread over every connection running two sorts/hashes at once")
+    s("MAINTENANCE_WORK_MEM", f"{_clamp(pg_mem / 8, 64, 512)}MB", "1/8 of the budget for VACUUM and index builds")
+    s("SHM_SIZE", f"{_clamp(shared_buffers / 2, 64, 1024)}mb", "/dev/shm for parallel query shared memory")
+    return settings
+
+
+def compute(host, registry, enabled, *, pooled=False, editor_users=editor.DEFAULT_USERS,
+            editor_replicas=1, dedicated_redis=(), dedicated_pg=()):
+    """Return [(env_key, value, explanation)] for this host and app selection.
+
+    `pooled` means apps connect through PgBouncer (see cli/pgbouncer.py).
+    `dedicated_pg` lists apps with their own Postgres instance (cli/postgres.py):
+    the shared instance isn't sized for them.
+    `editor_users` and `editor_replicas` size Collabora (see cli/editor.py).
+    `dedicated_redis` lists apps with their own Redis instance (cli/redis.py).
+    """
+    settings = []
+
+    def s(key, value, why):
+        settings.append((key, str(value), why))
+
+    cpus = host["cpus"]
+    headroom = hostinfo.headroom_mb(host, registry, enabled)
+    pg_mem = postgres_memory_mb(host, registry, enabled)
+    dedicated_pg = [a for a in dedicated_pg if a in enabled]
+    conns = max_connections(registry, [a for a in enabled if a not in dedicated_pg], pooled)
+
+    # --- PostgreSQL ---
+    shared_buffers = _clamp(pg_mem * 0.25, 128, 8192)
+    s("PG_SHARED_BUFFERS", f"{shared_buffers}MB",
+      f"25% of the {pg_mem} MB Postgres budget (30% of _base + half of {max(0, headroom)} MB headroom)")
+    effective_cache = _clamp(pg_mem * 0.75, shared_buffers * 2, host["ram_mb"] // 2)
+    s("PG_EFFECTIVE_CACHE_SIZE", f"{effective_cache}MB",
+      "planner hint: Postgres budget plus OS page cache likely to hold table data")
+    if pooled:
+        s("PG_MAX_CONNECTIONS", conns,
+          f"PgBouncer server pools, {KEYCLOAK_CONNECTIONS} Keycloak, "
+          f"{RESERVED_CONNECTIONS} admin (min 100)")
+    else:
+        s("PG_MAX_CONNECTIONS", conns,
+          f"{DJANGO_APP_CONNECTIONS}/Django app, {OTHER_APP_CONNECTIONS}/other app, "
+          f"{KEYCLOAK_CONNECTIONS} Keycloak, {RESERVED_CONNECTIONS} admin (min 100)")
+    work_mem = _clamp((pg_mem - shared_buffers) / (conns * 2), 4, 64)
+    s("PG_WORK_MEM", f"{work_mem}MB",
+      "remaining budget spread over every connection running two sorts/hashes at once")
+    maintenance = _clamp(pg_mem / 8, 64, 1024)
+    s("PG_MAINTENANCE_WORK_MEM", f"{maintenance}MB",
+      "1/8 of the budget for VACUUM and index builds (only a few run at once)")
+    s("PG_MAX_WORKER_PROCESSES", max(8, cpus), f"one background worker per CPU ({cpus}), min 8")
+    s("PG_MAX_PARALLEL_WORKERS", cpus, f"parallel query workers capped at host CPUs ({cpus})")
+    s("PG_MAX_PARALLEL_WORKERS_PER_GATHER", _clamp(cpus // 2, 0, 4),
+      "half the CPUs per query (max 4) so one report can't starve the apps")
+    s("PG_RANDOM_PAGE_COST", "1.1", "assumes SSD/NVMe storage (default 4.0 is tuned for spinning disks)")
+    s("PG_EFFECTIVE_IO_CONCURRENCY", 200, "concurrent I/O requests SSDs handle well")
+    s("PG_SHM_SIZE", f"{_clamp(shared_buffers / 2, 128, 2048)}mb",
+      "/dev/shm for parallel query shared memory (Docker default is 64 MB)")
+    for app_id in sorted(dedicated_pg):
+        settings += postgres_instance(host, registry, enabled, app_id, pooled)
+
+    # --- Redis ---
+    redis_mem = _clamp(128 + max(0, headroom) * 0.1, 128, 4096)
+    s("REDIS_MAXMEMORY", f"{redis_mem}mb",
+      "128 MB plus 10% of headroom; caches, celery queues and LiveKit state share it")
+    s("REDIS_MAXMEMORY_POLICY", "volatile-lru",
+      "evict only keys with a TTL (caches, sessions), never celery queues")
+    settings += redis.compute(host, registry, enabled, dedicated_redis)
+
+    # --- Keycloak ---
+    base_ram = registry.get("_base", {}).get("ram", 1536)
+    kc_heap = _clamp(base_ram * 0.25 + max(0, headroom) * 0.05, 256, 2048)
+    s("KEYCLOAK_HEAP", f"{kc_heap}m",
+      "25% of the _base budget plus 5% of headroom, max 2 GB (fixed, no resizing pauses)")
+    s("KEYCLOAK_DB_POOL_MAX_SIZE", KEYCLOAK_CONNECTIONS,
+      "the Keycloak share counted in PG_MAX_CONNECTIONS (Keycloak's default is 100)")
+    cache = _clamp(kc_heap * 40, 10000, 100000)
+    s("KEYCLOAK_REALMS_CACHE", 10000, "realms, clients and roles: few entries, keep the default")
+    s("KEYCLOAK_USERS_CACHE", cache, "40 cached users per MB of heap (min 10000): logins skip the database")
+    s("KEYCLOAK_SESSIONS_CACHE", cache, "40 sessions per MB of heap kept in memory, older ones read from the database")
+
+    # --- OpenSearch (Messages) ---
+    if "messages" in enabled:
+        heap = _clamp(512 + max(0, headroom) * 0.15, 512, min(31 * 1024, host["ram_mb"] // 4))
+        s("OPENSEARCH_HEAP", f"{heap}m",
+          "512 MB plus 15% of headroom, max 1/4 of RAM (leave the rest to Lucene's page cache)")
+
+    # --- Celery workers ---
+    settings += celery_workers.compute(host, registry, enabled)
+
+    # --- LiveKit (Meet) ---
+    if "meet" in enabled:
+        settings += livekit.compute(host)
+
+    # --- Document editor (Drive) ---
+    if "drive" in enabled:
+        settings += editor.compute(host, editor_users, editor_replicas)
+
+    return settings
+
+
+def render_table(settings):
+    """Format computed settings with their explanations."""
+    width = max(len(k) for k, _, _ in settings)
+    lines = []
+    for key, value, why in settings:
+        lines.append(f"  {key:<{width}}  {value:<10} {why}")
+    return "\n".join(lines)
@@ -1,12 +1,12 @@
 """Update MaSuite: pull code, images, and restart."""
 
-import os
 import subprocess
 import sys
 
 
 def _compose_cmd(root_dir):
-    return ["docker", "compose", "--project-directory", root_dir]
+    from . import compose
+    return compose.compose_cmd(root_dir)
 
 
 def run(root_dir):
@@ -27,16 +27,9 @@ def run(root_dir):
         print("  Try: git -C", root_dir, "status")
         sys.exit(1)
 
-    # 2. Pull new images
-    print("Pulling Docker images...", end=" ", flush=True)
-    result = subprocess.run(
-        [*_compose_cmd(root_dir), "pull"],
-        capture_output=True, text=True,
-    )
-    if result.returncode == 0:
-        print("done")
-    else:
-        print(f"FAILED\n  {result.stderr.strip()}")
+    # 2. Pull new images in parallel, rebuild local ones (Keycloak) on their new base
+    from . import images
+    if not images.prefetch(root_dir):
         sys.exit(1)
 
     # 3. Recreate containers
@@ -59,27 +52,24 @@ def run(root_dir):
 
 def _run_migrations(root_dir):
     """Run Django migrate for each enabled Django app."""
-    from .setup_wizard import APP_REGISTRY
+    from .registry import APP_REGISTRY
+    from . import pgbouncer
+    from .env import load_env, compose_profiles
     django_apps = {
         k: v["backend_service"]
         for k, v in APP_REGISTRY.items() if v["is_django"]
     }
 
-    # Read COMPOSE_PROFILES from .env
-    env_path = os.path.join(root_dir, ".env")
-    profiles = set()
-    if os.path.exists(env_path):
-        with open(env_path) as f:
-            for line in f:
-                if line.startswith("COMPOSE_PROFILES="):
-                    profiles = {p.strip() for p in line.split("=", 1)[1].strip().split(",")}
+    env = load_env(root_dir)
+    profiles = compose_profiles(env)
 
     for app_id, service_name in django_apps.items():
         if app_id not in profiles:
             continue
         print(f"  Running migrations for {app_id}...", end=" ", flush=True)
         result = subprocess.run(
-            [*_compose_cmd(root_dir), "exec", "-T", "-u", "root", service_name,
+            [*_compose_cmd(root_dir), "exec", "-T", "-u", "root",
+             *pgbouncer.direct_db_env(env, app_id), service_name,
              "python", "manage.py", "migrate", "--noinput"],
             capture_output=True, text=True,
         )
@@ -1,163 +1,231 @@
 """User management via Keycloak Admin REST API (pure stdlib)."""
 
+import csv
+import datetime
 import json
-import os
 import secrets
 import string
-import urllib.error
-import urllib.parse
-import urllib.request
-
-
-def _load_env(root_dir):
-    """Load .env file as a dict."""
-    env = {}
-    env_path = os.path.join(root_dir, ".env")
-    if not os.path.exists(env_path):
-        return env
-    with open(env_path) as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "=" in line:
-                key, _, value = line.partition("=")
-                env[key.strip()] = value.strip()
-    return env
-
-
-def _get_admin_token(keycloak_url, admin_user, admin_password):
-    """Get an admin access token from Keycloak."""
-    token_url = f"{keycloak_url}/realms/master/protocol/openid-connect/token"
-    data = urllib.parse.urlencode({
-        "grant_type": "password",
-        "client_id": "admin-cli",
-        "username": admin_user,
-        "password": admin_password,
-    }).encode()
-
-    req = urllib.request.Request(token_url, data=data)
-    req.add_header("Content-Type", "application/x-www-form-urlencoded")
-
-    with urllib.request.urlopen(req) as resp:
-        body = json.loads(resp.read())
-        return body["access_token"]
-
-
-def _api_request(keycloak_url, path, token, method="GET", data=None):
-    """Make an authenticated request to the Keycloak Admin API."""
-    url = f"{keycloak_url}/admin/realms/masuite{path}"
-    body = json.dumps(data).encode() if data else None
-    req = urllib.request.Request(url, data=body, method=method)
-    req.add_header("Authorization", f"Bearer {token}")
-    req.add_header("Content-Type", "application/json")
+import sys
+import time
 
-    try:
-        with urllib.request.urlopen(req) as resp:
-            if resp.status in (201, 204):
-                return None
-            body = resp.read()
-            if not body:
-                return None
-            return json.loads(body)
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode()
-        raise RuntimeError(f"Keycloak API error {e.code}: {error_body}") from e
-
-
-def _generate_password(length=16):
+from . import keycloak
+
+
+def generate_password(length=16):
     alphabet = string.ascii_letters + string.digits
     return "".join(secrets.choice(alphabet) for _ in range(length))
 
 
-def _get_keycloak_url(root_dir, env):
-    """Get a working Keycloak URL, preferring internal Docker IP."""
-    import subprocess
-    try:
-        result = subprocess.run(
-            ["docker", "inspect", "-f",
-             "{{range .NetworkSettings.Networks}}{{.IPAddress}}{{end}}",
-             "masuite-keycloak-1"],
-            capture_output=True, text=True, timeout=5,
-        )
-        ip = result.stdout.strip()
-        if result.returncode == 0 and ip:
-            return f"http://{ip}:8080"
-    except Exception:
-        pass
-    return env.get("KEYCLOAK_URL", "http://localhost:9200")
+def user_representation(email, password=None, first_name="", last_name="",
+                        enabled=True, groups=None):
+    """Build a Keycloak UserRepresentation for a MaSuite user (username = email)."""
+    user = {
+        "email": email,
+        "username": email,
+        "enabled": enabled,
+        "emailVerified": True,
+    }
+    if first_name:
+        user["firstName"] = first_name
+    if last_name:
+        user["lastName"] = last_name
+    if groups:
+        user["groups"] = list(groups)
+    if password:
+        user["credentials"] = [
+            {
+                "type": "password",
+                "value": password,
+                "temporary": False,
+            }
+        ]
+    return user
 
 
 def create(root_dir, email, password=None):
     """Create a user in Keycloak."""
-    env = _load_env(root_dir)
-    keycloak_url = _get_keycloak_url(root_dir, env)
-    admin_user = env.get("KEYCLOAK_ADMIN_USER", "admin")
-    admin_password = env.get("KEYCLOAK_ADMIN_PASSWORD")
-
-    if not admin_password:
+    admin = keycloak.connect(root_dir)
+    if not admin:
         print("Error: KEYCLOAK_ADMIN_PASSWORD must be set in .env")
         return
 
     if not password:
-        password = _generate_password()
+        password = generate_password()
         show_password = True
     else:
         show_password = False
 
     print(f"Creating user {email}...", end=" ", flush=True)
 
-    token = _get_admin_token(keycloak_url, admin_user, admin_password)
-
-    user_data = {
-        "email": email,
-        "username": email,
-        "enabled": True,
-        "emailVerified": True,
-        "credentials": [
-            {
-                "type": "password",
-                "value": password,
-                "temporary": False,
-            }
-        ],
-    }
+    user_data = user_representation(email, password)
 
     try:
-        _api_request(keycloak_url, "/users", token, method="POST", data=user_data)
+        admin.post("/users", user_data)
         print("done")
         if show_password:
             print(f"  Email:    {email}")
             print(f"  Password: {password}")
-    except RuntimeError as e:
-        if "409" in str(e):
+    except keycloak.KeycloakError as e:
+        if e.status == 409:
             print(f"FAILED: user {email} already exists")
         else:
             print(f"FAILED: {e}")
 
 
-def list_users(root_dir):
-    """List all users in the masuite realm."""
-    env = _load_env(root_dir)
-    keycloak_url = _get_keycloak_url(root_dir, env)
-    admin_user = env.get("KEYCLOAK_ADMIN_USER", "admin")
-    admin_password = env.get("KEYCLOAK_ADMIN_PASSWORD")
+def parse_since(value):
+    """Parse a --created-since value (YYYY-MM-DD or a relative 30d/12h) to epoch ms."""
+    value = value.strip()
+    units = {"d": 86400, "h": 3600, "m": 60}
+    if value[-1:] in units and value[:-1].isdigit():
+        return int((time.time() - int(value[:-1]) * units[value[-1]]) * 1000)
+    try:
+        dt = datetime.datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        raise ValueError(f"invalid --created-since {value!r}, expected YYYY-MM-DD or e.g. 30d") from None
+    return int(dt.timestamp() * 1000)
 
-    if not admin_password:
-        print("Error: KEYCLOAK_ADMIN_PASSWORD must be set in .env")
-        return
 
-    token = _get_admin_token(keycloak_url, admin_user, admin_password)
-    users = _api_request(keycloak_url, "/users?max=100", token)
+def _query_params(search=None, enabled=None):
+    """Server-side filters shared by the list and count endpoints."""
+    params = {"search": search}
+    if enabled is not None:
+        params["enabled"] = "true" if enabled else "false"
+    return params
 
-    if not users:
-        print("No users found.")
-        return
 
-    print(f"{'Email':40s} {'Enabled':8s} {'Created'}")
-    print("-" * 70)
+def iter_users(admin, search=None, enabled=None, created_since=None, page_size=100):
+    """Yield users page by page as they arrive.
+
+    `search` and `enabled` are filtered by Keycloak; the admin API has no
+    creation-date filter, so `created_since` (epoch ms) is applied while
+    streaming.
+    """
+    params = _query_params(search, enabled)
+    for user in admin.paginate("/users", page_size=page_size, briefRepresentation="true", **params):
+        if created_since and user.get("createdTimestamp", 0) < created_since:
+            continue
+        yield user
+
+
+def _created_date(user):
+    ts = user.get("createdTimestamp")
+    if not ts:
+        return ""
+    return datetime.datetime.fromtimestamp(ts / 1000, datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+def _write_table(users, out):
+    count = 0
     for u in users:
+        if count == 0:
+            out.write(f"{'Email':40s} {'Enabled':8s} {'Created'}\n")
+            out.write("-" * 70 + "\n")
         email = u.get("email", u.get("username", "?"))
         enabled = "yes" if u.get("enabled") else "no"
-        created = str(u.get("createdTimestamp", ""))[:10]
-        print(f"{email:40s} {enabled:8s} {created}")
+        out.write(f"{email:40s} {enabled:8s} {_created_date(u)}\n")
+        out.flush()
+        count += 1
+    if count == 0:
+        out.write("No users found.\n")
+
+
+def _write_csv(users, out):
+    writer = csv.writer(out)
+    writer.writerow(["id", "email", "username", "first_name", "last_name", "enabled", "created"])
+    for u in users:
+        writer.writerow([
+            u.get("id", ""), u.get("email", ""), u.get("username", ""),
+            u.get("firstName", ""), u.get("lastName", ""),
+            "true" if u.get("enabled") else "false", _created_date(u),
+        ])
+        out.flush()
+
+
+def _write_json(users, out):
+    """Stream a JSON array, one user per line."""
+    out.write("[")
+    for i, u in enumerate(users):
+        out.write(("," if i else "") + "\n  " + json.dumps(u))
+        out.flush()
+    out.write("\n]\n")
+
+
+FORMATTERS = {"table": _write_table, "csv": _write_csv, "json": _write_json}
+
+
+def _format_age(ms):
+    return datetime.datetime.fromtimestamp(ms / 1000).strftime("%Y-%m-%d %H:%M")
+
+
+def list_users(root_dir, search=None, enabled=None, created_since=None,
+               fmt="table", count=False, local=False, sync=False):
+    """List users in the masuite realm, streaming every page.
+
+    `created_since` is in epoch ms (see parse_since). With `local`, answer
+    from the user index instead (see user_index.py).
+    """
+    if local or sync:
+        from . import user_index
+        db = user_index.ensure(root_dir, refresh=sync)
+        if db is None:
+            return
+        users = user_index.query(db, search, enabled, created_since)
+        if count:
+            print(sum(1 for _ in users))
+        else:
+            FORMATTERS[fmt](users, sys.stdout)
+        db.close()
+        return
+
+    admin = keycloak.connect(root_dir)
+    if not admin:
+        print("Error: KEYCLOAK_ADMIN_PASSWORD must be set in .env")
+        return
+
+    if count:
+        if created_since:
+            # No server-side creation filter: count the streamed rows instead
+            n = sum(1 for _ in iter_users(admin, search, enabled, created_since))
+        else:
+            n = admin.get("/users/count", **_query_params(search, enabled))
+        print(n)
+        return
+
+    users = iter_users(admin, search, enabled, created_since)
+    FORMATTERS[fmt](users, sys.stdout)
+
+
+def find(root_dir, email, sync=False):
+    """Check whether a user exists, answering from the local index."""
+    from . import user_index
+    db = user_index.ensure(root_dir, refresh=sync)
+    if db is None:
+        return
+    user = user_index.find(db, email)
+    synced = user_index.synced_at(db)
+    db.close()
+    if not user:
+        print(f"No user {email} (index synced {_format_age(synced)})")
+        sys.exit(1)
+    print(f"{'Email':12s} {user.get('email', '')}")
+    print(f"{'Name':12s} {user.get('firstName', '')} {user.get('lastName', '')}".rstrip())
+    print(f"{'Enabled':12s} {'yes' if user.get('enabled') else 'no'}")
+    print(f"{'Created':12s} {_created_date(user)}")
+    last = user.get("lastLoginTimestamp")
+    print(f"{'Last login':12s} {_format_age(last) if last else 'never recorded'}")
+    print(f"{'Id':12s} {user['id']}")
+
+
+def inactive(root_dir, days, fmt="table", sync=False):
+    """List users without a login in the last `days` days, from the local index."""
+    from . import user_index
+    db = user_index.ensure(root_dir, refresh=sync)
+    if db is None:
+        return
+    since = user_index.events_since(db)
+    cutoff = (time.time() - days * 86400) * 1000
+    if since and since > cutoff:
+        print(f"Note: login events are only recorded since {_format_age(since)}; "
+              f"users who logged in before that are listed as inactive.", file=sys.stderr)
+    FORMATTERS[fmt](user_index.inactive(db, days), sys.stdout)
+    db.close()
@@ -0,0 +1,173 @@
+"""Bulk user lifecycle operations: enable/disable, delete, group membership.
+
+Targets are selected from a file of emails, a Keycloak search query, or the
+members of a group, then processed through a bounded worker pool with retry
+and exponential backoff on transient errors (HTTP 429/5xx, connection
+resets). --rate caps every Keycloak request, lookups included, so an
+operation made of several requests (enable/disable: GET then PUT) counts
+each of them. --dry-run prints the affected users and stops.
+
+Group operations take a group path. Messages maps mail domains to groups
+named KEYCLOAK_GROUP_PATH_PREFIX + domain, so `--mail-domain example.com`
+is a shortcut for the `/maildomain-example.com` group.
+"""
+
+import os
+import sys
+import time
+
+from . import keycloak
+from .user import iter_users
+from .user_import import raw_rows, detect_format, get_field
+from .workers import imap_unordered, retry
+
+ACTIONS = ("enable", "disable", "delete", "add-group", "remove-group")
+
+# Must match KEYCLOAK_GROUP_PATH_PREFIX in services/messages/compose.yml
+MAIL_DOMAIN_GROUP_PREFIX = "/maildomain-"
+
+
+def _retryable(e):
+    if isinstance(e, keycloak.KeycloakError):
+        return e.status == 429 or e.status >= 500
+    return isinstance(e, OSError)
+
+
+def _emails_from_file(path):
+    """Yield emails from a CSV/JSON file (email column) or a plain list, one per line."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".csv", ".json", ".jsonl", ".ndjson"):
+        for _, raw in raw_rows(path, detect_format(path)):
+            email = get_field(raw, "email")
+            if email:
+                yield email.strip().lower()
+    else:
+        with open(path) as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    yield line.lower()
+
+
+def select_users(admin, file=None, search=None, group=None, workers=8):
+    """Resolve a selector to a list of users. Returns (users, missing emails)."""
+    if file:
+        def find(email):
+            return retry(lambda: admin.find_user(email), retryable=_retryable)
+
+        users, missing = [], []
+        for email, user, error in imap_unordered(find, _emails_from_file(file), workers=workers):
+            if error:
+                raise error
+            if user:
+                users.append(user)
+            else:
+                missing.append(email)
+        return users, missing
+    # Paged listings start over on a transient error
+    if search is not None:
+        return retry(lambda: list(iter_users(admin, search=search)), retryable=_retryable), []
+    if group:
+        def members():
+            gid = admin.group_id(group)
+            return list(admin.paginate(f"/groups/{gid}/members", page_size=500, briefRepresentation="true"))
+
+        return retry(members, retryable=_retryable), []
+    raise ValueError("a selector is required (--file, --search or --group)")
+
+
+def _operation(admin, action, group_id=None):
+    """Return a function applying `action` to one user."""
+    if action == "enable":
+        return lambda u: admin.update_user(u["id"], {"enabled": True})
+    if action == "disable":
+        return lambda u: admin.update_user(u["id"], {"enabled": False})
+    if action == "delete":
+        return lambda u: admin.delete(f"/users/{u['id']}")
+    if action == "add-group":
+        return lambda u: admin.put(f"/users/{u['id']}/groups/{group_id}", {})
+    if action == "remove-group":
+        return lambda u: admin.delete(f"/users/{u['id']}/groups/{group_id}")
+    raise ValueError(f"unknown action {action}")
+
+
+def _ensure_group(admin, path, create):
+    try:
+        return admin.group_id(path)
+    except keycloak.KeycloakError as e:
+        if e.status != 404 or not create:
+            raise
+    parent, _, name = path.rstrip("/").rpartition("/")
+    if parent:
+        admin.post(f"/groups/{admin.group_id(parent)}/children", {"name": name})
+    else:
+        admin.post("/groups", {"name": name})
+    return admin.group_id(path)
+
+
+def run(root_dir, action, group=None, mail_domain=None, file=None, search=None,
+        member_of=None, dry_run=False, yes=False, workers=8, rate=20.0,
+        create_group=False):
+    """Apply a bulk action to the selected users."""
+    admin = keycloak.connect(root_dir, pool_size=workers, rate=rate)
+    if not admin:
+        print("Error: KEYCLOAK_ADMIN_PASSWORD must be set in .env")
+        return
+    if mail_domain:
+        group = MAIL_DOMAIN_GROUP_PREFIX + mail_domain
+    if action in ("add-group", "remove-group") and not group:
+        print(f"Error: {action} needs a group path or --mail-domain")
+        sys.exit(1)
+
+    try:
+        users, missing = select_users(admin, file=file, search=search, group=member_of, workers=workers)
+        group_id = None
+        if group and not dry_run:
+            group_id = _ensure_group(admin, group, create_group and action == "add-group")
+    except (OSError, ValueError, keycloak.KeycloakError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    for email in missing:
+        print(f"  not found: {email}")
+    target = f" {group}" if group else ""
+    print(f"{action}{target}: {len(users)} user(s) selected")
+    if dry_run:
+        for u in sorted(users, key=lambda u: u.get("username", "")):
+            enabled = "enabled" if u.get("enabled") else "disabled"
+            print(f"  {u.get('email') or u.get('username', '?'):40s} {enabled}")
+        print("Dry run, nothing changed.")
+        return
+    if not users:
+        return
+    if not yes:
+        try:
+            answer = input(f"Apply '{action}{target}' to {len(users)} user(s)? [y/N]: ").strip()
+        except (EOFError, KeyboardInterrupt):
+            answer = ""
+        if not answer.lower().startswith("y"):
+            print("Cancelled.")
+            return
+
+    op = _operation(admin, action, group_id)
+
+    def apply(user):
+        return retry(lambda: op(user), retryable=_retryable)
+
+    start = time.monotonic()
+    done = failed = 0
+    for user, _, error in imap_unordered(apply, users, workers=workers):
+        name = user.get("email") or user.get("username", "?")
+        if error:
+            failed += 1
+            print(f"  {name:40s} FAILED: {str(error)[:200]}", flush=True)
+        else:
+            done += 1
+            print(f"  {name:40s} done", flush=True)
+    admin.close()
+
+    elapsed = time.monotonic() - start
+    print()
+    print(f"{action}{target}: {done} done, {failed} failed in {elapsed:.1f}s")
+    if failed:
+        sys.exit(1)
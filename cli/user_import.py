@@ -0,0 +1,245 @@
+"""Bulk user import from CSV or JSON into Keycloak.
+
+Rows are streamed from the input file and pushed to Keycloak either in
+batches through the realm partial-import endpoint (default, one request per
+batch) or through a bounded pool of concurrent single-user creates.
+
+Imports are idempotent: users that already exist are skipped, or updated in
+place with --update (never deleted and re-created, so their ids and app
+accounts are kept).
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+
+from . import keycloak
+from .user import user_representation, generate_password
+from .workers import batched, imap_unordered
+
+# Accepted column names for each field (first match wins)
+FIELDS = {
+    "email": ("email", "mail", "username"),
+    "first_name": ("first_name", "firstName", "firstname", "given_name"),
+    "last_name": ("last_name", "lastName", "lastname", "family_name"),
+    "password": ("password",),
+    "enabled": ("enabled",),
+    "groups": ("groups", "group"),
+}
+
+_FALSE = {"0", "false", "no", "n", "off"}
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".json":
+        return "json"
+    raise ValueError(f"Cannot guess format of {path}, use --format csv|json|jsonl")
+
+
+def raw_rows(path, fmt):
+    """Yield (line_number, dict) from the input file, streaming where possible."""
+    if fmt == "csv":
+        with open(path, newline="") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+    elif fmt == "jsonl":
+        with open(path) as f:
+            for n, line in enumerate(f, 1):
+                line = line.strip()
+                if line:
+                    yield n, json.loads(line)
+    else:
+        with open(path) as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get("users", [])
+        for n, row in enumerate(data, 1):
+            yield n, row
+
+
+def get_field(raw, name):
+    for key in FIELDS[name]:
+        value = raw.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def read_rows(path, fmt=None, generate_passwords=False):
+    """Yield normalized rows: dict(line, email, user, password, error)."""
+    fmt = fmt or detect_format(path)
+    for line, raw in raw_rows(path, fmt):
+        email = (get_field(raw, "email") or "").strip().lower()
+        row = {"line": line, "email": email, "user": None, "password": None, "error": None}
+        if "@" not in email:
+            row["error"] = "missing or invalid email"
+            yield row
+            continue
+
+        password = get_field(raw, "password")
+        if not password and generate_passwords:
+            password = generate_password()
+        enabled = get_field(raw, "enabled")
+        if isinstance(enabled, str):
+            enabled = enabled.strip().lower() not in _FALSE
+        groups = get_field(raw, "groups") or []
+        if isinstance(groups, str):
+            groups = [g.strip() for g in groups.split(";") if g.strip()]
+
+        row["password"] = password
+        row["user"] = user_representation(
+            email, password,
+            first_name=get_field(raw, "first_name") or "",
+            last_name=get_field(raw, "last_name") or "",
+            enabled=True if enabled is None else bool(enabled),
+            groups=groups,
+        )
+        yield row
+
+
+def _update_user(admin, row):
+    """Update an existing user in place: profile, enabled flag, groups, password."""
+    user = row["user"]
+    existing = admin.find_user(user["username"])
+    if not existing:
+        raise keycloak.KeycloakError(404, "user disappeared during import")
+    fields = {k: user[k] for k in ("email", "firstName", "lastName", "enabled") if k in user}
+    admin.update_user(existing["id"], fields, current=existing)
+    for path in user.get("groups", []):
+        admin.put(f"/users/{existing['id']}/groups/{admin.group_id(path)}", {})
+    if row["password"]:
+        admin.put(f"/users/{existing['id']}/reset-password", user["credentials"][0])
+    return "updated"
+
+
+def _create_one(admin, row, update):
+    try:
+        admin.post("/users", row["user"])
+        return "created"
+    except keycloak.KeycloakError as e:
+        if e.status != 409:
+            raise
+    return _update_user(admin, row) if update else "skipped"
+
+
+def _import_batch(admin, rows, update):
+    """Import one batch through partialImport. Returns [(row, status, error)]."""
+    resp = admin.post("/partialImport", {
+        "ifResourceExists": "SKIP",
+        "users": [r["user"] for r in rows],
+    }) or {}
+    actions = {
+        r.get("resourceName", "").lower(): r.get("action", "")
+        for r in resp.get("results", []) if r.get("resourceType") == "USER"
+    }
+    results = []
+    for row in rows:
+        action = actions.get(row["email"])
+        if action == "ADDED":
+            results.append((row, "created", None))
+        elif action == "SKIPPED":
+            if not update:
+                results.append((row, "skipped", None))
+                continue
+            try:
+                results.append((row, _update_user(admin, row), None))
+            except Exception as e:
+                results.append((row, "failed", e))
+        else:
+            results.append((row, "failed", RuntimeError(f"unexpected result {action!r}")))
+    return results
+
+
+def _results(admin, rows, mode, batch_size, workers, update):
+    """Yield (row, status, error) for every input row."""
+    def valid(rows):
+        for row in rows:
+            if row["error"]:
+                invalid.append(row)
+            else:
+                yield row
+
+    invalid = []
+    if mode == "partial":
+        batches = batched(valid(rows), batch_size)
+        for batch, result, error in imap_unordered(
+            lambda b: _import_batch(admin, b, update), batches, workers=workers,
+        ):
+            if error:
+                for row in batch:
+                    yield row, "failed", error
+            else:
+                yield from result
+            while invalid:
+                row = invalid.pop()
+                yield row, "invalid", row["error"]
+    else:
+        for row, status, error in imap_unordered(
+            lambda r: _create_one(admin, r, update), valid(rows), workers=workers,
+        ):
+            yield row, ("failed" if error else status), error
+            while invalid:
+                row = invalid.pop()
+                yield row, "invalid", row["error"]
+    for row in invalid:
+        yield row, "invalid", row["error"]
+
+
+def run(root_dir, path, fmt=None, mode="partial", batch_size=200, workers=4,
+        update=False, generate_passwords=False, report=None):
+    """Import users from a CSV/JSON file, printing one result line per row."""
+    admin = keycloak.connect(root_dir, pool_size=workers)
+    if not admin:
+        print("Error: KEYCLOAK_ADMIN_PASSWORD must be set in .env")
+        return
+    try:
+        rows = read_rows(path, fmt, generate_passwords)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return
+
+    print(f"Importing users from {path} ({mode}, {workers} workers)...")
+    report_file = open(report, "w", newline="") if report else None
+    writer = None
+    if report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(["line", "email", "status", "detail", "password"])
+
+    counts = {}
+    start = time.monotonic()
+    try:
+        for row, status, error in _results(admin, rows, mode, batch_size, workers, update):
+            counts[status] = counts.get(status, 0) + 1
+            detail = str(error)[:200] if error else ""
+            shown_password = row["password"] if generate_passwords and status == "created" else ""
+            line = f"  {row['line']:>6} {row['email'] or '?':40s} {status}"
+            if detail:
+                line += f": {detail}"
+            if shown_password:
+                line += f" (password: {shown_password})"
+            print(line, flush=True)
+            if writer:
+                writer.writerow([row["line"], row["email"], status, detail, shown_password])
+    except (OSError, ValueError) as e:
+        print(f"Error reading {path}: {e}")
+    finally:
+        if report_file:
+            report_file.close()
+        admin.close()
+
+    elapsed = time.monotonic() - start
+    total = sum(counts.values())
+    rate = total / elapsed if elapsed > 0 else 0
+    summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+    print()
+    print(f"Processed {total} rows in {elapsed:.1f}s ({rate:.1f} rows/s): {summary or 'nothing to do'}")
+    if counts.get("failed") or counts.get("invalid"):
+        sys.exit(1)
@@ -0,0 +1,274 @@
+"""Local SQLite index of Keycloak users for instant lookups.
+
+Questions like "does this email exist?" or "who hasn't logged in for 90
+days?" are answered from .masuite/users.sqlite3 instead of scanning the
+Keycloak API. The index is refreshed explicitly (`user sync`, or `--sync`
+on a query):
+
+- the first sync (or --full) pages through every user
+- later syncs only replay Keycloak admin events (user create/update/delete)
+  and login events newer than the stored watermark, and re-fetch the users
+  they touch
+
+Event recording is switched on for the realm at the first sync, since
+without it Keycloak keeps no history to sync from (and no last-login time).
+Events expire after EVENTS_EXPIRATION unless the realm already sets an
+expiration: the index only needs the events since the previous sync.
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+from . import keycloak
+from .env import state_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    email TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    enabled INTEGER NOT NULL,
+    created_ts INTEGER,
+    last_login_ts INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE INDEX IF NOT EXISTS users_username ON users (username);
+CREATE INDEX IF NOT EXISTS users_last_login ON users (last_login_ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Login event types that count as "the user logged in"
+LOGIN_EVENTS = ("LOGIN", "CODE_TO_TOKEN")
+# Expiration of the recorded events, in seconds, when the realm has none
+EVENTS_EXPIRATION = 90 * 86400
+# Overlap with the previous sync to absorb clock skew between host and Keycloak
+_WATERMARK_OVERLAP_MS = 60_000
+
+
+def open_index(root_dir):
+    """Open (and create if needed) the user index database."""
+    path = state_path(root_dir, "users.sqlite3")
+    new = not os.path.exists(path)
+    db = sqlite3.connect(path)
+    if new:
+        os.chmod(path, 0o600)
+    db.row_factory = sqlite3.Row
+    db.executescript(SCHEMA)
+    return db
+
+
+def _meta(db, key, default=None):
+    row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else default
+
+
+def _set_meta(db, key, value):
+    db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+def _upsert(db, user):
+    db.execute(
+        """INSERT INTO users (id, username, email, first_name, last_name, enabled, created_ts, data)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(id) DO UPDATE SET
+             username = excluded.username, email = excluded.email,
+             first_name = excluded.first_name, last_name = excluded.last_name,
+             enabled = excluded.enabled, created_ts = excluded.created_ts,
+             data = excluded.data""",
+        (
+            user["id"], user.get("username", ""), (user.get("email") or "").lower(),
+            user.get("firstName", ""), user.get("lastName", ""),
+            1 if user.get("enabled") else 0, user.get("createdTimestamp"),
+            json.dumps(user),
+        ),
+    )
+
+
+def _enable_events(admin):
+    """Make sure the realm records admin events and login events, with an expiration.
+
+    Only the changed fields are PUT (Keycloak leaves the others as they are).
+    Returns the changed fields.
+    """
+    realm = admin.get("")
+    update = {}
+    if not realm.get("adminEventsEnabled"):
+        update["adminEventsEnabled"] = True
+    if not realm.get("eventsEnabled"):
+        update["eventsEnabled"] = True
+    types = set(realm.get("enabledEventTypes") or [])
+    if types and not set(LOGIN_EVENTS) <= types:
+        update["enabledEventTypes"] = sorted(types | set(LOGIN_EVENTS))
+    if not realm.get("eventsExpiration"):
+        update["eventsExpiration"] = EVENTS_EXPIRATION
+    attributes = realm.get("attributes") or {}
+    if not attributes.get("adminEventsExpiration"):
+        update["attributes"] = {**attributes, "adminEventsExpiration": str(EVENTS_EXPIRATION)}
+    if update:
+        admin.put("", update)
+    return update
+
+
+def _full_sync(admin, db):
+    seen = set()
+    for user in admin.paginate("/users", page_size=500, briefRepresentation="true"):
+        _upsert(db, user)
+        seen.add(user["id"])
+    existing = {row["id"] for row in db.execute("SELECT id FROM users")}
+    gone = existing - seen
+    db.executemany("DELETE FROM users WHERE id = ?", [(i,) for i in gone])
+    return len(seen), len(gone)
+
+
+def _incremental_sync(admin, db, since):
+    """Replay admin events since `since` (epoch ms). Returns (updated, deleted)."""
+    touched, deleted = set(), set()
+    for event in admin.paginate("/admin-events", page_size=500,
+                                dateFrom=since, resourceTypes="USER"):
+        parts = event.get("resourcePath", "").split("/")
+        if len(parts) < 2 or parts[0] != "users":
+            continue
+        user_id = parts[1]
+        if event.get("operationType") == "DELETE" and len(parts) == 2:
+            deleted.add(user_id)
+            touched.discard(user_id)
+        elif user_id not in deleted:
+            touched.add(user_id)
+
+    for user_id in touched:
+        try:
+            _upsert(db, admin.get(f"/users/{user_id}"))
+        except keycloak.KeycloakError as e:
+            if e.status != 404:
+                raise
+            deleted.add(user_id)
+    db.executemany("DELETE FROM users WHERE id = ?", [(i,) for i in deleted])
+    return len(touched), len(deleted)
+
+
+def _sync_logins(admin, db, since):
+    """Record the latest login time of every user seen in login events."""
+    latest = {}
+    for event_type in LOGIN_EVENTS:
+        for event in admin.paginate("/events", page_size=500, type=event_type, dateFrom=since):
+            uid, t = event.get("userId"), event.get("time", 0)
+            if uid and t > latest.get(uid, 0):
+                latest[uid] = t
+    db.executemany(
+        "UPDATE users SET last_login_ts = MAX(COALESCE(last_login_ts, 0), ?) WHERE id = ?",
+        [(t, uid) for uid, t in latest.items()],
+    )
+    return len(latest)
+
+
+def sync(root_dir, full=False, quiet=False):
+    """Refresh the index from Keycloak. Returns False if Keycloak is not configured."""
+    admin = keycloak.connect(root_dir)
+    if not admin:
+        print("Error: KEYCLOAK_ADMIN_PASSWORD must be set in .env")
+        return False
+
+    db = open_index(root_dir)
+    start = time.monotonic()
+    now_ms = int(time.time() * 1000)
+    watermark = _meta(db, "watermark")
+    with db:
+        # Printed even when quiet: these change the realm
+        changed = _enable_events(admin)
+        if changed.keys() & {"adminEventsEnabled", "eventsEnabled", "enabledEventTypes"}:
+            _set_meta(db, "events_since", now_ms)
+            print(f"Enabled admin and login event recording on the {keycloak.REALM} realm.")
+        if changed.keys() & {"eventsExpiration", "attributes"}:
+            print(f"Set {keycloak.REALM} realm events to expire after {EVENTS_EXPIRATION // 86400} days.")
+        if full or watermark is None:
+            updated, deleted = _full_sync(admin, db)
+            kind = "full"
+            since = 0
+        else:
+            since = int(watermark) - _WATERMARK_OVERLAP_MS
+            updated, deleted = _incremental_sync(admin, db, since)
+            kind = "incremental"
+        logins = _sync_logins(admin, db, since)
+        _set_meta(db, "watermark", now_ms)
+    total = db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    db.close()
+    admin.close()
+
+    if not quiet:
+        print(f"User index synced ({kind}) in {time.monotonic() - start:.1f}s: "
+              f"{updated} updated, {deleted} deleted, {logins} logins, {total} users indexed")
+    return True
+
+
+def ensure(root_dir, refresh=False):
+    """Open the index, syncing first if asked to or if it was never synced."""
+    db = open_index(root_dir)
+    if refresh or _meta(db, "watermark") is None:
+        db.close()
+        if not sync(root_dir):
+            return None
+        db = open_index(root_dir)
+    return db
+
+
+def synced_at(db):
+    """Epoch ms of the last sync, or None."""
+    value = _meta(db, "watermark")
+    return int(value) if value else None
+
+
+def events_since(db):
+    """Epoch ms since which login events are recorded (None: before the first sync)."""
+    value = _meta(db, "events_since")
+    return int(value) if value else None
+
+
+def _as_user(row):
+    user = json.loads(row["data"])
+    if row["last_login_ts"]:
+        user["lastLoginTimestamp"] = row["last_login_ts"]
+    return user
+
+
+def query(db, search=None, enabled=None, created_since=None):
+    """Yield users matching the same filters as `user list`."""
+    sql, args = "SELECT * FROM users WHERE 1 = 1", []
+    if search:
+        sql += " AND (username LIKE ? OR email LIKE ? OR first_name LIKE ? OR last_name LIKE ?)"
+        args += [f"%{search}%"] * 4
+    if enabled is not None:
+        sql += " AND enabled = ?"
+        args.append(1 if enabled else 0)
+    if created_since:
+        sql += " AND created_ts >= ?"
+        args.append(created_since)
+    for row in db.execute(sql + " ORDER BY username", args):
+        yield _as_user(row)
+
+
+def find(db, email):
+    """Return the indexed user with this email or username, or None."""
+    email = email.strip().lower()
+    row = db.execute(
+        "SELECT * FROM users WHERE email = ? OR username = ? LIMIT 1", (email, email),
+    ).fetchone()
+    return _as_user(row) if row else None
+
+
+def inactive(db, days):
+    """Yield users with no recorded login in the last `days` days."""
+    cutoff = int((time.time() - days * 86400) * 1000)
+    for row in db.execute(
+        "SELECT * FROM users WHERE COALESCE(last_login_ts, 0) < ? AND COALESCE(created_ts, 0) < ?"
+        " ORDER BY COALESCE(last_login_ts, 0), username",
+        (cutoff, cutoff),
+    ):
+        yield _as_user(row)
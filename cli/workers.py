@@ -0,0 +1,81 @@
+"""Bounded thread pools for I/O-bound bulk work (API calls, docker commands)."""
+
+import concurrent.futures
+import itertools
+import random
+import threading
+import time
+
+
+def batched(iterable, size):
+    """Yield lists of up to `size` items from iterable, lazily."""
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def imap_unordered(fn, items, workers=8, window=None):
+    """Apply fn to items on a thread pool, yielding (item, result, error).
+
+    Results are yielded as they complete. Items are consumed lazily and at
+    most `window` calls (default: 2 * workers) are in flight, so huge inputs
+    can be streamed without loading them in memory. `error` is the exception
+    raised by fn, or None.
+    """
+    window = window or 2 * workers
+    it = iter(items)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for item in itertools.islice(it, window):
+            pending[pool.submit(fn, item)] = item
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+            for item in itertools.islice(it, len(done)):
+                pending[pool.submit(fn, item)] = item
+
+
+class RateLimiter:
+    """Thread-safe token bucket: at most `rate` acquisitions per second."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry(fn, attempts=4, backoff=0.5, retryable=lambda e: True):
+    """Call fn(), retrying with exponential backoff and jitter on retryable errors."""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not retryable(e):
+                raise
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
@@ -0,0 +1,32 @@
+#!/bin/bash
+# Entrypoint of postgres-replica: on first start, clones the primary with
+# pg_basebackup through a physical replication slot (created if missing),
+# then hands over to the image's entrypoint, which starts a hot standby.
+# To re-clone (e.g. after the slot was dropped), stop the service and
+# delete data/postgres-replica/.
+set -euo pipefail
+
+PRIMARY="host=${PRIMARY_HOST} port=5432 user=${PRIMARY_USER} password=${PRIMARY_PASSWORD}"
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until pg_isready -d "$PRIMARY" -q; do
+        echo "Waiting for ${PRIMARY_HOST}..."
+        sleep 2
+    done
+
+    echo "Creating replication slot '${REPLICATION_SLOT}'..."
+    psql -v ON_ERROR_STOP=1 -d "$PRIMARY dbname=${PRIMARY_USER}" <<-EOSQL
+        -- A slot invalidated by max_slot_wal_keep_size can't be reused
+        SELECT pg_drop_replication_slot(slot_name) FROM pg_replication_slots
+        WHERE slot_name = '${REPLICATION_SLOT}' AND wal_status = 'lost' AND NOT active;
+        SELECT pg_create_physical_replication_slot('${REPLICATION_SLOT}')
+        WHERE NOT EXISTS (SELECT FROM pg_replication_slots WHERE slot_name = '${REPLICATION_SLOT}');
+EOSQL
+
+    echo "Cloning ${PRIMARY_HOST}..."
+    mkdir -p "$PGDATA"
+    pg_basebackup -d "$PRIMARY" -D "$PGDATA" -S "${REPLICATION_SLOT}" -X stream -R -P
+    chmod 700 "$PGDATA"
+fi
+
+exec docker-entrypoint.sh "$@"
@@ -0,0 +1,41 @@
+#!/bin/sh
+# Entrypoint of the shared redis: converts an existing RDB-only data dir
+# to AOF, then hands over to the image's entrypoint.
+# A redis-server started with --appendonly yes and no AOF starts empty and
+# ignores dump.rdb, which would lose queued tasks and sessions of installs
+# created before AOF. The dump is loaded into a temporary server (unix
+# socket only), switched with CONFIG SET appendonly yes, which writes the
+# AOF from memory, and shut down once the rewrite is done.
+set -eu
+
+SOCKET=/tmp/redis-convert.sock
+
+if [ -f /data/dump.rdb ] && [ ! -d /data/appendonlydir ]; then
+    echo "Converting dump.rdb to AOF..."
+    docker-entrypoint.sh redis-server --port 0 --unixsocket "$SOCKET" \
+        --save "" --appendonly no --daemonize yes
+    until [ "$(redis-cli -s "$SOCKET" ping 2>/dev/null)" = "PONG" ]; do
+        sleep 1
+    done
+    redis-cli -s "$SOCKET" config set appendonly yes >/dev/null
+    # The rewrite starts (or is scheduled) within CONFIG SET
+    until redis-cli -s "$SOCKET" info persistence | grep -q "^aof_rewrite_in_progress:0" \
+        && redis-cli -s "$SOCKET" info persistence | grep -q "^aof_rewrite_scheduled:0"; do
+        sleep 1
+    done
+    if ! redis-cli -s "$SOCKET" info persistence | grep -q "^aof_last_bgrewrite_status:ok" \
+        || [ ! -d /data/appendonlydir ]; then
+        # Without appendonlydir the next start converts again
+        echo "AOF rewrite failed; dump.rdb is untouched"
+        redis-cli -s "$SOCKET" shutdown nosave >/dev/null 2>&1 || true
+        rm -rf /data/appendonlydir
+        exit 1
+    fi
+    redis-cli -s "$SOCKET" shutdown >/dev/null 2>&1 || true
+    while [ -S "$SOCKET" ]; do
+        sleep 1
+    done
+    echo "Converted; dump.rdb is kept as a backup"
+fi
+
+exec docker-entrypoint.sh "$@"
@@ -1,10 +1,28 @@
 """Local mode settings overlay for Calendars - disables HTTPS requirements."""
+import os
+
 from calendars.settings import *  # noqa: F401,F403
 from calendars.settings import Production as _Production
 
+import masuite_replica
+import masuite_settings
+
 
 class Local(_Production):
     SECURE_SSL_REDIRECT = False
     SESSION_COOKIE_SECURE = False
     CSRF_COOKIE_SECURE = False
     LOGIN_REDIRECT_URL = "/"
+
+    # Task routing to dedicated worker queues ("pattern:queue,..."), generated by setup
+    if os.environ.get("CELERY_TASK_ROUTES"):
+        CELERY_TASK_ROUTES = masuite_settings.task_routes(os.environ["CELERY_TASK_ROUTES"])
+
+    # Read-only traffic to postgres-replica (PG_REPLICA_APPS), generated by setup
+    if os.environ.get("DB_REPLICA_HOST"):
+        DATABASE_ROUTERS = [masuite_replica.ROUTER]
+
+    @classmethod
+    def post_setup(cls):
+        super().post_setup()
+        masuite_settings.post_setup(cls)
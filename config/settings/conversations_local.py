@@ -1,7 +1,12 @@
 """Local mode settings overlay for Conversations - disables HTTPS requirements."""
+import os
+
 from conversations.settings import *  # noqa: F401,F403
 from conversations.settings import Production as _Production
 
+import masuite_replica
+import masuite_settings
+
 
 class Local(_Production):
     SECURE_SSL_REDIRECT = False
@@ -9,3 +14,12 @@ class Local(_Production):
     CSRF_COOKIE_SECURE = False
     LOGIN_REDIRECT_URL = "/"
     LOGIN_REDIRECT_URL_FAILURE = "/"
+
+    # Read-only traffic to postgres-replica (PG_REPLICA_APPS), generated by setup
+    if os.environ.get("DB_REPLICA_HOST"):
+        DATABASE_ROUTERS = [masuite_replica.ROUTER]
+
+    @classmethod
+    def post_setup(cls):
+        super().post_setup()
+        masuite_settings.post_setup(cls)
@@ -0,0 +1,77 @@
+"""Read routing to postgres-replica, shared by the settings overlays.
+
+Only reads in GET/HEAD requests go to the hot standby, and only until the
+request writes anything. A client that just wrote (any other method, or a
+write during a GET) is pinned to the primary for PIN_SECONDS through a
+cookie, so it reads its own writes across redirects and follow-up
+requests. Everything outside a request (Celery tasks, management
+commands) and every read inside a transaction stays on the primary.
+"""
+import contextvars
+import os
+
+ROUTER = "masuite_replica.ReplicaRouter"
+MIDDLEWARE = "masuite_replica.ReplicaMiddleware"
+
+PIN_COOKIE = "masuite_primary"
+PIN_SECONDS = 10
+SAFE_METHODS = ("GET", "HEAD")
+
+# {"replica": bool, "wrote": bool} of the current request, None outside one
+_request = contextvars.ContextVar("masuite_replica_request", default=None)
+
+
+class ReplicaRouter:
+    """Reads in read-only requests go to the hot standby, everything else to default."""
+
+    def db_for_read(self, model, **hints):
+        from django.db import connections
+        state = _request.get()
+        if not state or not state["replica"] or state["wrote"] or connections["default"].in_atomic_block:
+            return "default"
+        return "replica"
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state:
+            state["wrote"] = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == "default"
+
+
+class ReplicaMiddleware:
+    """Marks read-only requests for the router, and pins clients that wrote to the primary."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {
+            "replica": request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES,
+            "wrote": False,
+        }
+        token = _request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        if state["wrote"] or request.method not in SAFE_METHODS:
+            response.set_cookie(PIN_COOKIE, "1", max_age=PIN_SECONDS, httponly=True, samesite="Lax")
+        return response
+
+
+def setup(settings):
+    """Add the replica database and the middleware (call from post_setup)."""
+    settings.DATABASES["replica"] = {
+        **settings.DATABASES["default"],
+        "HOST": os.environ["DB_REPLICA_HOST"],
+        "PORT": "5432",
+        "TEST": {"MIRROR": "default"},
+    }
+    # In place: the settings module holds the same list
+    settings.MIDDLEWARE.insert(0, MIDDLEWARE)
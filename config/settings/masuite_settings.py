@@ -0,0 +1,28 @@
+"""Settings generated by setup, shared by the settings overlays.
+
+Each overlay calls task_routes() in its class body and post_setup() from
+its own post_setup, so the parsing and the database tweaks live here once.
+"""
+import os
+
+import masuite_replica
+
+PGBOUNCER_HOST = "pgbouncer"
+
+
+def task_routes(value):
+    """CELERY_TASK_ROUTES from "pattern:queue,..." (CELERY_TASK_ROUTES in .env)."""
+    return {
+        pattern: {"queue": queue}
+        for pattern, queue in (route.rsplit(":", 1) for route in value.split(","))
+    }
+
+
+def post_setup(settings):
+    """Add the replica database, and adapt every database reached through PgBouncer."""
+    if os.environ.get("DB_REPLICA_HOST"):
+        masuite_replica.setup(settings)
+    for database in settings.DATABASES.values():
+        # PgBouncer transaction pooling can't keep a cursor open across transactions
+        if database.get("HOST") == PGBOUNCER_HOST:
+            database["DISABLE_SERVER_SIDE_CURSORS"] = True
@@ -1,7 +1,12 @@
 """Local mode settings overlay for Meet - disables HTTPS requirements."""
+import os
+
 from meet.settings import *  # noqa: F401,F403
 from meet.settings import Production as _Production
 
+import masuite_replica
+import masuite_settings
+
 
 class Local(_Production):
     SECURE_SSL_REDIRECT = False
@@ -9,3 +14,16 @@ class Local(_Production):
     CSRF_COOKIE_SECURE = False
     LOGIN_REDIRECT_URL = "/"
     LOGIN_REDIRECT_URL_FAILURE = "/"
+
+    # Task routing to dedicated worker queues ("pattern:queue,..."), generated by setup
+    if os.environ.get("CELERY_TASK_ROUTES"):
+        CELERY_TASK_ROUTES = masuite_settings.task_routes(os.environ["CELERY_TASK_ROUTES"])
+
+    # Read-only traffic to postgres-replica (PG_REPLICA_APPS), generated by setup
+    if os.environ.get("DB_REPLICA_HOST"):
+        DATABASE_ROUTERS = [masuite_replica.ROUTER]
+
+    @classmethod
+    def post_setup(cls):
+        super().post_setup()
+        masuite_settings.post_setup(cls)
@@ -3,6 +3,9 @@ import os
 from configurations import values
 from messages.settings import Production as _Production
 
+import masuite_replica
+import masuite_settings
+
 
 class Local(_Production):
     SECURE_SSL_REDIRECT = False
@@ -18,3 +21,16 @@ class Local(_Production):
     LOGIN_REDIRECT_URL_FAILURE = values.Value(
         "/", environ_name="LOGIN_REDIRECT_URL_FAILURE", environ_prefix=None
     )
+
+    # Task routing to dedicated worker queues ("pattern:queue,..."), generated by setup
+    if os.environ.get("CELERY_TASK_ROUTES"):
+        CELERY_TASK_ROUTES = masuite_settings.task_routes(os.environ["CELERY_TASK_ROUTES"])
+
+    # Read-only traffic to postgres-replica (PG_REPLICA_APPS), generated by setup
+    if os.environ.get("DB_REPLICA_HOST"):
+        DATABASE_ROUTERS = [masuite_replica.ROUTER]
+
+    @classmethod
+    def post_setup(cls):
+        super().post_setup()
+        masuite_settings.post_setup(cls)